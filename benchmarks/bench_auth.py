@@ -0,0 +1,38 @@
+"""Micro-benchmark: per-request cost of JWT verification with and without the token cache.
+
+Usage: uv run python -m benchmarks.bench_auth [iterations]
+"""
+import os
+import sys
+import time
+
+os.environ.setdefault("JWT_SECRET_KEY", "benchmark-secret")
+
+from services.auth_service import AuthService  # noqa: E402
+from services.token_cache import token_cache  # noqa: E402
+
+
+def time_per_call(fn, token: str, iterations: int) -> float:
+    started = time.perf_counter()
+    for _ in range(iterations):
+        if fn(token) is None:
+            raise RuntimeError("Token failed to verify")
+    return (time.perf_counter() - started) / iterations
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    token = AuthService.create_access_token({"openai_api_key": "sk-benchmark", "user_id": "benchmark-user"})
+
+    token_cache.clear()
+    uncached = time_per_call(AuthService.verify_token_uncached, token, iterations)
+    cached = time_per_call(AuthService.verify_token, token, iterations)
+
+    print(f"iterations:       {iterations}")
+    print(f"uncached verify:  {uncached * 1e6:8.2f} us/request")
+    print(f"cached verify:    {cached * 1e6:8.2f} us/request")
+    print(f"speedup:          {uncached / cached:8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""Benchmark: render a generated 100+ page markdown document to PDF.
+
+Usage: uv run python -m benchmarks.bench_pdf_render [sections]
+"""
+import re
+import sys
+import tempfile
+import time
+from pathlib import Path
+from custom_tools.markdown_pdf import render_markdown_file
+
+SECTION = """
+## Section {index}: Ünïcödé — “quoted” text…
+
+This paragraph has **bold**, *italic*, `inline code` and a [link](https://example.com/{index}).
+{filler}
+
+- First bullet with enough words to wrap onto a second line {filler_short}
+  - Nested bullet
+- Second bullet
+1. Numbered item
+2. Another numbered item
+
+```python
+def example_{index}():
+    return {index}
+```
+
+---
+"""
+
+
+def build_markdown(sections: int) -> str:
+    filler = "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 12
+    body = "".join(SECTION.format(index=index, filler=filler, filler_short=filler[:120]) for index in range(sections))
+    return f"# Benchmark Document\n\nIntroduction.\n{body}"
+
+
+def main():
+    sections = int(sys.argv[1]) if len(sys.argv) > 1 else 260
+    with tempfile.TemporaryDirectory() as directory:
+        source = Path(directory) / "benchmark_documentation.markdown"
+        destination = source.with_suffix(".pdf")
+        source.write_text(build_markdown(sections), encoding="utf-8")
+
+        started = time.perf_counter()
+        render_markdown_file(source, destination)
+        elapsed = time.perf_counter() - started
+
+        markdown_size = source.stat().st_size
+        data = destination.read_bytes()
+        pages = len(re.findall(rb"/Type\s*/Page\b", data))
+
+    print(f"markdown size: {markdown_size} bytes")
+    print(f"pages:         {pages}")
+    print(f"render time:   {elapsed:.2f} s ({elapsed / max(pages, 1) * 1000:.1f} ms/page)")
+    print(f"pdf size:      {len(data)} bytes")
+
+
+if __name__ == "__main__":
+    main()
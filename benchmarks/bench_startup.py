@@ -0,0 +1,109 @@
+"""Benchmark: cold-start cost, broken down by module.
+
+Reports what importing the app costs (per top-level package, from ``python -X importtime``),
+what the background warm-up imports afterwards, and for a real server process the time
+until /health answers and until the warm-up finishes.
+
+Usage: uv run python -m benchmarks.bench_startup [--top 15] [--no-server] [--port 8766]
+"""
+import argparse
+import os
+import re
+import subprocess
+import sys
+import time
+from collections import defaultdict
+import httpx
+
+IMPORT_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+STARTUP_TIMEOUT_SECONDS = 120
+
+
+def import_times(code: str) -> list[tuple[str, int, int, int]]:
+    """Run ``code`` in a fresh interpreter and return (module, self_us, cumulative_us, depth) rows."""
+    env = {**os.environ, "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "benchmark-secret")}
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", code], capture_output=True, text=True, env=env)
+    if result.returncode != 0:
+        raise SystemExit(result.stderr.strip().splitlines()[-1])
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            rows.append((module, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def by_package(rows: list[tuple[str, int, int, int]]) -> dict[str, int]:
+    totals: dict[str, int] = defaultdict(int)
+    for module, self_us, _, _ in rows:
+        totals[module.split(".")[0]] += self_us
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def print_packages(title: str, rows: list[tuple[str, int, int, int]], top: int):
+    totals = by_package(rows)
+    print(f"\n{title}: {sum(totals.values()) / 1000:.1f} ms in {len(rows)} modules")
+    for package, self_us in list(totals.items())[:top]:
+        print(f"  {package:<30}{self_us / 1000:>9.1f} ms")
+
+
+def time_server(port: int) -> tuple[float, float | None]:
+    env = {**os.environ, "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "benchmark-secret")}
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"], env=env
+    )
+    healthy = warmed = None
+    try:
+        while time.perf_counter() - started < STARTUP_TIMEOUT_SECONDS and process.poll() is None:
+            try:
+                health = httpx.get(f"http://127.0.0.1:{port}/health", timeout=1.0).json()
+            except httpx.HTTPError:
+                time.sleep(0.02)
+                continue
+            if healthy is None:
+                healthy = time.perf_counter() - started
+            if health["warmup"]["state"] not in ("pending", "running"):
+                warmed = time.perf_counter() - started
+                print(f"\nwarm-up {health['warmup']['state']}: {health['warmup']}")
+                break
+            time.sleep(0.02)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+    if healthy is None:
+        raise SystemExit("Server did not answer /health")
+    return healthy, warmed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report cold-start import cost by module.")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--no-server", action="store_true", help="Skip timing a real server process")
+    parser.add_argument("--port", type=int, default=8766)
+    args = parser.parse_args()
+
+    app_rows = import_times("import main")
+    print_packages("Importing the app", app_rows, args.top)
+
+    from services.warmup import WARMUP_MODULES
+
+    # Everything the warm-up imports beyond what the app already loaded
+    deferred_rows = import_times(
+        f"import importlib, main\nfor name in {WARMUP_MODULES!r}:\n"
+        "    try:\n        importlib.import_module(name)\n    except Exception as e:\n        print(name, e)"
+    )
+    app_modules = {module for module, *_ in app_rows}
+    deferred = [row for row in deferred_rows if row[0] not in app_modules]
+    print_packages("Deferred to the warm-up", deferred, args.top)
+
+    if not args.no_server:
+        healthy, warmed = time_server(args.port)
+        print(f"\nprocess start -> /health answering: {healthy * 1000:.0f} ms")
+        if warmed is not None:
+            print(f"process start -> warm-up finished: {warmed * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
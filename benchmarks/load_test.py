@@ -0,0 +1,344 @@
+"""Load test: drive the API at fixed concurrency and report throughput and latency percentiles.
+
+With --spawn the upstream stubs (benchmarks.stubs) and the app are started locally, with
+all state in a temporary directory, so the run needs no network or real API keys.
+Results are saved as JSON; --compare reports and fails on regressions against a saved run.
+
+Usage:
+    uv run python -m benchmarks.load_test --spawn [--scenarios login,send-email,generate-docs,download-docs]
+        [--concurrency 8] [--requests 50] [--users 4] [--latency openai=800:200] [--fail tavily=0.05]
+        [--label NAME] [--compare latest|PATH] [--threshold 0.2]
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+import httpx
+from benchmarks.stubs import add_fault_arguments
+
+SCENARIOS = ("login", "send-email", "generate-docs", "download-docs")
+RESULTS_DIR = Path(os.getenv("BENCH_RESULTS_DIR", "benchmarks/results"))
+DOWNLOAD_FILE = "benchmark_download.markdown"
+READY_TIMEOUT_SECONDS = 60
+
+
+def percentile(sorted_values: list[float], q: float) -> float:
+    """Linearly interpolated percentile of already sorted values."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(sorted_values) - 1)
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * (position - lower)
+
+
+def summarize(latencies: list[float], outcomes: Counter, elapsed: float) -> dict:
+    values = sorted(latencies)
+    total = sum(outcomes.values())
+    return {
+        "requests": total,
+        "ok": outcomes.get("ok", 0),
+        "outcomes": dict(outcomes),
+        "elapsed_seconds": elapsed,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "mean_ms": sum(values) / len(values) * 1000 if values else 0.0,
+        "p50_ms": percentile(values, 0.50) * 1000,
+        "p95_ms": percentile(values, 0.95) * 1000,
+        "p99_ms": percentile(values, 0.99) * 1000,
+        "max_ms": values[-1] * 1000 if values else 0.0,
+    }
+
+
+def outcome(response: httpx.Response) -> str:
+    if response.status_code >= 300:
+        return str(response.status_code)
+    if response.headers.get("content-type", "").startswith("application/json"):
+        # Plan failures come back as 200 with success: false
+        body = response.json()
+        if isinstance(body, dict) and body.get("success") is False:
+            return "failed"
+    return "ok"
+
+
+class LoadTest:
+    def __init__(self, client: httpx.AsyncClient, users: int, docs_dir: Path | None):
+        self.client = client
+        self.users = users
+        self.docs_dir = docs_dir
+        self.sessions: list[dict] = []
+        self.generated_files: list[tuple[dict, str]] = []
+        self.downloads: list[tuple[dict, str]] = []
+
+    async def login(self, index: int) -> httpx.Response:
+        return await self.client.post("/auth/login", json={"openai_api_key": f"sk-benchmark-{index % self.users}"})
+
+    def _session(self, index: int) -> dict:
+        return self.sessions[index % len(self.sessions)]
+
+    async def send_email(self, index: int) -> httpx.Response:
+        session = self._session(index)
+        return await self.client.post(
+            "/api/send-email",
+            headers=session["headers"],
+            json={"to": f"recipient{index}@example.com", "subject": f"Benchmark update {index % 10}"},
+        )
+
+    async def generate_docs(self, index: int) -> httpx.Response:
+        session = self._session(index)
+        response = await self.client.post(
+            "/api/generate-docs",
+            headers=session["headers"],
+            json={
+                "topic": f"Benchmark Topic {index % 5}",
+                "urls": [f"https://docs.example.com/guide-{index % 5}"],
+                "output_format": "markdown",
+            },
+        )
+        if response.status_code == 200 and response.json().get("file_path"):
+            self.generated_files.append((session, Path(response.json()["file_path"]).name))
+        return response
+
+    async def download_docs(self, index: int) -> httpx.Response:
+        session, filename = self.downloads[index % len(self.downloads)]
+        return await self.client.get(f"/api/download-docs/{filename}", headers={**session["headers"], "Accept-Encoding": "gzip"})
+
+    async def setup(self, scenarios: list[str]):
+        if any(name != "login" for name in scenarios):
+            for index in range(self.users):
+                response = await self.login(index)
+                response.raise_for_status()
+                body = response.json()
+                self.sessions.append({"user_id": body["user_id"], "headers": {"Authorization": f"Bearer {body['access_token']}"}})
+
+    def prepare_downloads(self):
+        self.downloads = list(self.generated_files)
+        if self.downloads:
+            return
+        if self.docs_dir is None:
+            raise SystemExit("download-docs needs generated files from generate-docs, or --spawn to seed one")
+        # Login user ids are UUIDs, so each user's directory is named after the id itself
+        content = ("# Benchmark download\n\n" + "Generated documentation body text. " * 2000).encode()
+        for session in self.sessions:
+            user_dir = self.docs_dir / session["user_id"]
+            user_dir.mkdir(parents=True, exist_ok=True)
+            (user_dir / DOWNLOAD_FILE).write_bytes(content)
+            self.downloads.append((session, DOWNLOAD_FILE))
+
+    async def run_scenario(self, name: str, requests: int, concurrency: int) -> dict:
+        if name == "download-docs":
+            self.prepare_downloads()
+        call = getattr(self, name.replace("-", "_"))
+        latencies: list[float] = []
+        outcomes: Counter = Counter()
+        counter = iter(range(requests))
+
+        async def worker():
+            for index in counter:
+                started = time.perf_counter()
+                try:
+                    response = await call(index)
+                    result = outcome(response)
+                except httpx.HTTPError as e:
+                    result = type(e).__name__
+                latencies.append(time.perf_counter() - started)
+                outcomes[result] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        return summarize(latencies, outcomes, time.perf_counter() - started)
+
+
+def wait_ready(url: str, process: subprocess.Popen):
+    deadline = time.monotonic() + READY_TIMEOUT_SECONDS
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"Process serving {url} exited with code {process.returncode}")
+        try:
+            if httpx.get(url, timeout=1.0).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise SystemExit(f"Timed out waiting for {url}")
+
+
+@contextmanager
+def spawned_servers(args, state_dir: Path):
+    stub_url = f"http://127.0.0.1:{args.stub_port}"
+    stub_command = [sys.executable, "-m", "benchmarks.stubs", "--port", str(args.stub_port),
+                    "--failure-status", str(args.failure_status), "--pages-per-crawl", str(args.pages_per_crawl)]
+    for value in args.latency:
+        stub_command += ["--latency", value]
+    for value in args.fail:
+        stub_command += ["--fail", value]
+
+    env = {
+        **os.environ,
+        "JWT_SECRET_KEY": os.getenv("JWT_SECRET_KEY", "benchmark-secret"),
+        "OPENAI_API_BASE": f"{stub_url}/openai/v1",
+        "OPENAI_BASE_URL": f"{stub_url}/openai/v1",
+        "TAVILY_API_URL": f"{stub_url}/tavily",
+        "TAVILY_API_KEY": "tvly-benchmark",
+        "PORTIA_API_ENDPOINT": f"{stub_url}/portia",
+        "PORTIA_API_KEY": "portia-benchmark",
+        "DOCS_DIR": str(state_dir / "docs"),
+        "DOCS_INDEX_PATH": str(state_dir / "docs_index.sqlite3"),
+        "JOB_STORE_PATH": str(state_dir / "jobs.sqlite3"),
+        "RENDER_CACHE_DIR": str(state_dir / "render"),
+        "EXTRACT_CACHE_DIR": str(state_dir / "extract"),
+        "CRAWL_STORE_PATH": str(state_dir / "crawl.sqlite3"),
+        "PLAN_CACHE_PATH": str(state_dir / "plans.json"),
+    }
+    app_command = [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.app_port), "--log-level", "warning"]
+
+    processes = []
+    try:
+        processes.append(subprocess.Popen(stub_command))
+        wait_ready(f"{stub_url}/stats", processes[-1])
+        processes.append(subprocess.Popen(app_command, env=env))
+        wait_ready(f"http://127.0.0.1:{args.app_port}/health", processes[-1])
+        yield f"http://127.0.0.1:{args.app_port}", stub_url
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_report(results: dict):
+    print(f"\n{'scenario':<15}{'reqs':>6}{'ok':>6}{'rps':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}  outcomes")
+    for name, stats in results["scenarios"].items():
+        print(
+            f"{name:<15}{stats['requests']:>6}{stats['ok']:>6}{stats['throughput_rps']:>9.1f}"
+            f"{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}  {stats['outcomes']}"
+        )
+    if results.get("upstreams"):
+        print(f"\nupstream requests: {results['upstreams']}")
+
+
+def load_baseline(compare: str, current: Path | None) -> dict | None:
+    if compare != "latest":
+        return json.loads(Path(compare).read_text())
+    previous = sorted(path for path in RESULTS_DIR.glob("*.json") if path != current)
+    return json.loads(previous[-1].read_text()) if previous else None
+
+
+def compare_results(baseline: dict, results: dict, threshold: float) -> list[str]:
+    """Return a description of each metric that regressed by more than ``threshold``."""
+    regressions = []
+    print(f"\nCompared with {baseline.get('label')} ({baseline.get('revision')}, {baseline.get('timestamp')}):")
+    for name, stats in results["scenarios"].items():
+        before = baseline.get("scenarios", {}).get(name)
+        if not before:
+            continue
+        for metric, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True), ("throughput_rps", False)):
+            old, new = before[metric], stats[metric]
+            if not old:
+                continue
+            change = (new - old) / old
+            worse = change > threshold if higher_is_worse else change < -threshold
+            marker = "  REGRESSION" if worse else ""
+            print(f"  {name:<15}{metric:<16}{old:>10.1f} -> {new:>10.1f} ({change:+.1%}){marker}")
+            if worse:
+                regressions.append(f"{name} {metric} {change:+.1%}")
+        if stats["ok"] < before["ok"] * (1 - threshold):
+            regressions.append(f"{name} ok {before['ok']} -> {stats['ok']}")
+    return regressions
+
+
+async def run(args, base_url: str, stub_url: str | None, docs_dir: Path | None) -> dict:
+    scenarios = [name.strip() for name in args.scenarios.split(",") if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+
+    limits = httpx.Limits(max_connections=args.concurrency * 2, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        load_test = LoadTest(client, args.users, docs_dir)
+        await load_test.setup(scenarios)
+        results = {}
+        for name in scenarios:
+            print(f"Running {name}: {args.requests} requests at concurrency {args.concurrency}")
+            results[name] = await load_test.run_scenario(name, args.requests, args.concurrency)
+        upstreams = (await client.get(f"{stub_url}/stats")).json() if stub_url else None
+
+    return {
+        "label": args.label,
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "revision": git_revision(),
+        "settings": {
+            "concurrency": args.concurrency,
+            "requests": args.requests,
+            "users": args.users,
+            "latency": args.latency,
+            "fail": args.fail,
+        },
+        "scenarios": results,
+        "upstreams": upstreams,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load test the API and record latency percentiles.")
+    parser.add_argument("--base-url", default="http://127.0.0.1:8000", help="App to test when not using --spawn")
+    parser.add_argument("--spawn", action="store_true", help="Start the stubs and the app locally")
+    parser.add_argument("--app-port", type=int, default=8765)
+    parser.add_argument("--stub-port", type=int, default=9100)
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per scenario")
+    parser.add_argument("--users", type=int, default=4, help="Distinct logged-in users to spread requests over")
+    parser.add_argument("--timeout", type=float, default=300.0)
+    parser.add_argument("--label", default="run")
+    parser.add_argument("--no-save", action="store_true")
+    parser.add_argument("--compare", metavar="latest|PATH", help="Baseline results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="Allowed fractional slowdown before failing")
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="portia-bench-") as state_dir:
+        if args.spawn:
+            with spawned_servers(args, Path(state_dir)) as (base_url, stub_url):
+                results = asyncio.run(run(args, base_url, stub_url, Path(state_dir) / "docs"))
+        else:
+            results = asyncio.run(run(args, args.base_url, None, None))
+
+    print_report(results)
+    saved = None
+    if not args.no_save:
+        RESULTS_DIR.mkdir(parents=True, exist_ok=True)
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        saved = RESULTS_DIR / f"{stamp}-{args.label}.json"
+        saved.write_text(json.dumps(results, indent=2))
+        print(f"\nSaved {saved}")
+
+    if args.compare:
+        baseline = load_baseline(args.compare, saved)
+        if baseline is None:
+            print("\nNo earlier results to compare with")
+            return
+        regressions = compare_results(baseline, results, args.threshold)
+        if regressions:
+            print(f"\nPerformance regressions: {'; '.join(regressions)}")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
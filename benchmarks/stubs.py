@@ -0,0 +1,250 @@
+"""Local stand-ins for OpenAI, Tavily and the Portia tool backend, for offline load tests.
+
+Each upstream is mounted under its own prefix on one server:
+    /openai/v1   GET /models, POST /chat/completions
+    /tavily      POST /extract, /crawl, /map
+    /portia      any path (GET returns [], other methods {})
+
+Latency and failures are injected per upstream, e.g.
+    --latency openai=800:200 --latency tavily=300 --fail tavily=0.05
+
+Usage: uv run python -m benchmarks.stubs [--port 9100] [--latency NAME=MS[:JITTER]] [--fail NAME=RATE]
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+from dataclasses import dataclass, field
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+UPSTREAMS = ("openai", "tavily", "portia")
+DEFAULT_PORT = 9100
+
+PAGE_TEXT = """# {title}
+
+## Overview
+
+{title} covers installation, configuration and common usage patterns. This page
+is synthetic content served by the benchmark stubs, sized like a typical docs page.
+
+## Details
+
+""" + "Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor. " * 40
+
+EMAIL_BODY = "Hello,\n\nThis is a benchmark email body written by the stub model.\n\nBest regards"
+
+
+@dataclass
+class Fault:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    failure_rate: float = 0.0
+    failure_status: int = 503
+
+    async def apply(self) -> JSONResponse | None:
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if delay:
+            await asyncio.sleep(delay)
+        if self.failure_rate and random.random() < self.failure_rate:
+            return JSONResponse(status_code=self.failure_status, content={"error": "injected failure"})
+        return None
+
+
+@dataclass
+class StubStats:
+    requests: dict[str, int] = field(default_factory=dict)
+    failures: dict[str, int] = field(default_factory=dict)
+
+    def record(self, name: str, failed: bool):
+        self.requests[name] = self.requests.get(name, 0) + 1
+        if failed:
+            self.failures[name] = self.failures.get(name, 0) + 1
+
+
+def sample_from_schema(schema: dict, defs: dict = None, depth: int = 0):
+    """Build a minimal value that validates against a JSON schema (for structured outputs)."""
+    defs = defs if defs is not None else schema.get("$defs", schema.get("definitions", {}))
+    if "$ref" in schema:
+        return sample_from_schema(defs.get(schema["$ref"].split("/")[-1], {}), defs, depth + 1)
+    if "const" in schema:
+        return schema["const"]
+    if schema.get("enum"):
+        return schema["enum"][0]
+    if "default" in schema:
+        return schema["default"]
+    for combinator in ("anyOf", "oneOf", "allOf"):
+        if schema.get(combinator):
+            options = [option for option in schema[combinator] if option.get("type") != "null"] or schema[combinator]
+            return sample_from_schema(options[0], defs, depth + 1)
+
+    kind = schema.get("type")
+    if isinstance(kind, list):
+        kind = next((k for k in kind if k != "null"), "null")
+    if kind == "object" or "properties" in schema:
+        if depth > 8:
+            return {}
+        properties = schema.get("properties", {})
+        return {name: sample_from_schema(properties[name], defs, depth + 1) for name in schema.get("required", properties)}
+    if kind == "array":
+        return []
+    if kind == "integer":
+        return 0
+    if kind == "number":
+        return 0.0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    return "stub"
+
+
+def chat_completion(payload: dict) -> dict:
+    message: dict = {"role": "assistant", "content": EMAIL_BODY}
+    finish_reason = "stop"
+
+    response_format = payload.get("response_format") or {}
+    tools = payload.get("tools") or []
+    if response_format.get("type") == "json_schema":
+        schema = response_format.get("json_schema", {}).get("schema", {})
+        message["content"] = json.dumps(sample_from_schema(schema))
+    elif response_format.get("type") == "json_object":
+        message["content"] = "{}"
+    elif tools:
+        # Structured output via function calling: answer with the requested (or first) function
+        choice = payload.get("tool_choice")
+        name = choice.get("function", {}).get("name") if isinstance(choice, dict) else None
+        function = next((tool["function"] for tool in tools if tool["function"]["name"] == name), tools[0]["function"])
+        message = {
+            "role": "assistant",
+            "content": None,
+            "tool_calls": [{
+                "id": f"call_{random.getrandbits(48):012x}",
+                "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(sample_from_schema(function.get("parameters", {})))},
+            }],
+        }
+        finish_reason = "tool_calls"
+
+    prompt_chars = sum(len(str(m.get("content") or "")) for m in payload.get("messages", []))
+    completion_chars = len(message.get("content") or "")
+    return {
+        "id": f"chatcmpl-{random.getrandbits(64):016x}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": payload.get("model", "stub"),
+        "choices": [{"index": 0, "message": message, "finish_reason": finish_reason, "logprobs": None}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": completion_chars // 4,
+            "total_tokens": (prompt_chars + completion_chars) // 4,
+        },
+    }
+
+
+def page(url: str) -> dict:
+    title = url.rstrip("/").rsplit("/", 1)[-1].replace("-", " ").title() or "Home"
+    return {"url": url, "raw_content": PAGE_TEXT.format(title=title)}
+
+
+def site_urls(url: str, limit: int) -> list[str]:
+    base = url.rstrip("/")
+    return [base] + [f"{base}/page-{index}" for index in range(1, limit)]
+
+
+def create_app(faults: dict[str, Fault] = None, pages_per_crawl: int = 20) -> FastAPI:
+    faults = {name: (faults or {}).get(name, Fault()) for name in UPSTREAMS}
+    stats = StubStats()
+    app = FastAPI(title="Benchmark upstream stubs")
+    app.state.stats = stats
+
+    async def inject(name: str) -> JSONResponse | None:
+        failure = await faults[name].apply()
+        stats.record(name, failure is not None)
+        return failure
+
+    @app.get("/openai/v1/models")
+    async def openai_models():
+        return await inject("openai") or {"object": "list", "data": [{"id": "gpt-4o-mini", "object": "model"}]}
+
+    @app.post("/openai/v1/chat/completions")
+    async def openai_chat(request: Request):
+        payload = await request.json()
+        return await inject("openai") or chat_completion(payload)
+
+    @app.post("/tavily/extract")
+    async def tavily_extract(request: Request):
+        payload = await request.json()
+        urls = payload.get("urls", [])
+        urls = [urls] if isinstance(urls, str) else urls
+        return await inject("tavily") or {"results": [page(url) for url in urls], "failed_results": []}
+
+    @app.post("/tavily/crawl")
+    async def tavily_crawl(request: Request):
+        payload = await request.json()
+        urls = site_urls(payload["url"], min(payload.get("limit", pages_per_crawl), pages_per_crawl))
+        return await inject("tavily") or {"base_url": payload["url"], "results": [page(url) for url in urls]}
+
+    @app.post("/tavily/map")
+    async def tavily_map(request: Request):
+        payload = await request.json()
+        urls = site_urls(payload["url"], min(payload.get("limit", pages_per_crawl), pages_per_crawl))
+        return await inject("tavily") or {"base_url": payload["url"], "results": urls}
+
+    @app.api_route("/portia/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE"])
+    async def portia_backend(path: str, request: Request):
+        return await inject("portia") or ([] if request.method == "GET" else {})
+
+    @app.get("/stats")
+    async def stub_stats():
+        return {"requests": stats.requests, "failures": stats.failures}
+
+    return app
+
+
+def parse_upstream_settings(values: list[str], option: str) -> dict[str, str]:
+    settings = {}
+    for value in values:
+        name, _, setting = value.partition("=")
+        if name not in UPSTREAMS or not setting:
+            raise argparse.ArgumentTypeError(f"{option} expects NAME=VALUE with NAME in {', '.join(UPSTREAMS)}: {value}")
+        settings[name] = setting
+    return settings
+
+
+def build_faults(latency: list[str], fail: list[str], failure_status: int) -> dict[str, Fault]:
+    faults = {name: Fault(failure_status=failure_status) for name in UPSTREAMS}
+    for name, setting in parse_upstream_settings(latency, "--latency").items():
+        mean, _, jitter = setting.partition(":")
+        faults[name].latency_ms = float(mean)
+        faults[name].jitter_ms = float(jitter or 0)
+    for name, setting in parse_upstream_settings(fail, "--fail").items():
+        faults[name].failure_rate = float(setting)
+    return faults
+
+
+def add_fault_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument("--latency", action="append", default=[], metavar="NAME=MS[:JITTER]",
+                        help="Added latency per upstream (openai, tavily, portia)")
+    parser.add_argument("--fail", action="append", default=[], metavar="NAME=RATE",
+                        help="Fraction of upstream requests that fail")
+    parser.add_argument("--failure-status", type=int, default=503, help="HTTP status of injected failures")
+    parser.add_argument("--pages-per-crawl", type=int, default=20, help="Pages returned by each crawl")
+
+
+def main():
+    import uvicorn
+
+    parser = argparse.ArgumentParser(description="Serve local upstream stubs for benchmarks.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    add_fault_arguments(parser)
+    args = parser.parse_args()
+
+    faults = build_faults(args.latency, args.fail, args.failure_status)
+    uvicorn.run(create_app(faults, args.pages_per_crawl), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
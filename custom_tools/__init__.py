@@ -1,3 +1,11 @@
-from .registry import custom_tool_registry
+def __getattr__(name):
+    # The registry imports Portia and every tool; loading it on first use keeps
+    # helper modules such as the content cache importable on their own
+    if name == "custom_tool_registry":
+        from .registry import custom_tool_registry
 
-__all__ = ["custom_tool_registry"]
\ No newline at end of file
+        return custom_tool_registry
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+__all__ = ["custom_tool_registry"]
@@ -0,0 +1,182 @@
+"""Content-addressed, disk-backed cache for tool results."""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from services.shared_state import connect_sqlite
+
+
+class ContentCache:
+    """Stores JSON values on disk under the SHA-256 of their content.
+
+    A SQLite index maps lookup keys to content digests, so identical results
+    reached through different keys are stored once. Entries expire after
+    ``ttl_seconds`` and are dropped when next read; once the stored content
+    exceeds ``max_bytes``, expired and then least recently used entries are
+    evicted. The stored byte total is kept in the index as entries change.
+    """
+
+    def __init__(self, root: str | Path, ttl_seconds: float, max_bytes: int):
+        self.root = Path(root)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened lazily so the cache can be created at import time without touching disk
+        if self._conn is None:
+            (self.root / "objects").mkdir(parents=True, exist_ok=True)
+            self._conn = connect_sqlite(self.root / "index.sqlite3")
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS entries (
+                    key TEXT PRIMARY KEY,
+                    digest TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS entries_digest ON entries (digest);
+                CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+                CREATE INDEX IF NOT EXISTS entries_created_at ON entries (created_at);
+                CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL);
+                """
+            )
+            # Indexes written before the total was tracked are measured once
+            self._conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) "
+                "SELECT 'stored_bytes', COALESCE(SUM(size), 0) FROM (SELECT DISTINCT digest, size FROM entries)"
+            )
+        return self._conn
+
+    def _transaction(self, fn):
+        """Run ``fn(conn)`` in a write transaction; other worker processes share the index."""
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = fn(conn)
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+        return result
+
+    def _object_path(self, digest: str) -> Path:
+        return self.root / "objects" / digest[:2] / f"{digest}.json"
+
+    @property
+    def enabled(self) -> bool:
+        return self.ttl_seconds > 0 and self.max_bytes > 0
+
+    def get(self, key: str) -> Any | None:
+        if not self.enabled:
+            return None
+
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT digest, created_at FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None or now - row[1] > self.ttl_seconds:
+                if row is not None:
+                    self._transaction(lambda conn: self._delete_keys(conn, [key]))
+                self.misses += 1
+                return None
+
+            try:
+                value = json.loads(self._object_path(row[0]).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                self._transaction(lambda conn: self._delete_keys(conn, [key]))
+                self.misses += 1
+                return None
+
+            conn.execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Any):
+        if not self.enabled:
+            return
+
+        data = json.dumps(value, sort_keys=True).encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self._object_path(digest)
+        now = time.time()
+
+        def store(conn: sqlite3.Connection):
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                # Unique per process and thread, so concurrent writers never share a temp file
+                with tempfile.NamedTemporaryFile(dir=path.parent, suffix=".tmp", delete=False) as tmp:
+                    tmp.write(data)
+                Path(tmp.name).replace(path)
+
+            previous = conn.execute("SELECT digest, size FROM entries WHERE key = ?", (key,)).fetchone()
+            if previous is not None and previous[0] == digest:
+                conn.execute("UPDATE entries SET created_at = ?, accessed_at = ? WHERE key = ?", (now, now, key))
+                return
+            if conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+                self._add_bytes(conn, len(data))
+            conn.execute(
+                "INSERT OR REPLACE INTO entries (key, digest, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+                (key, digest, len(data), now, now),
+            )
+            if previous is not None:
+                self._remove_orphan(conn, previous[0], previous[1])
+            if self._stored_bytes(conn) > self.max_bytes:
+                self._evict(conn)
+
+        with self._lock:
+            self._transaction(store)
+
+    def _add_bytes(self, conn: sqlite3.Connection, size: int):
+        conn.execute("UPDATE meta SET value = value + ? WHERE key = 'stored_bytes'", (size,))
+
+    def _delete_keys(self, conn: sqlite3.Connection, keys: list[str]):
+        for key in keys:
+            row = conn.execute("SELECT digest, size FROM entries WHERE key = ?", (key,)).fetchone()
+            conn.execute("DELETE FROM entries WHERE key = ?", (key,))
+            if row is not None:
+                self._remove_orphan(conn, row[0], row[1])
+
+    def _remove_orphan(self, conn: sqlite3.Connection, digest: str, size: int):
+        if conn.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone() is None:
+            self._object_path(digest).unlink(missing_ok=True)
+            self._add_bytes(conn, -size)
+
+    def _stored_bytes(self, conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT value FROM meta WHERE key = 'stored_bytes'").fetchone()[0]
+
+    def _evict(self, conn: sqlite3.Connection):
+        """Free space: expired entries first, then the least recently used."""
+        expired = [row[0] for row in conn.execute("SELECT key FROM entries WHERE created_at < ?", (time.time() - self.ttl_seconds,))]
+        self._delete_keys(conn, expired)
+        self.evictions += len(expired)
+
+        while self._stored_bytes(conn) > self.max_bytes:
+            oldest = conn.execute("SELECT key FROM entries ORDER BY accessed_at LIMIT 16").fetchall()
+            if not oldest:
+                break
+            self._delete_keys(conn, [row[0] for row in oldest])
+            self.evictions += len(oldest)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stored_bytes = self._stored_bytes(self._connect()) if self.enabled else 0
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "stored_bytes": stored_bytes,
+                "max_bytes": self.max_bytes,
+            }
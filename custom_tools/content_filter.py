@@ -0,0 +1,208 @@
+"""Trims crawled pages before they reach the LLM: shared boilerplate, near-duplicates and a token budget."""
+from __future__ import annotations
+import hashlib
+import os
+import re
+import threading
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+CRAWL_TOKEN_BUDGET = int(os.getenv("CRAWL_TOKEN_BUDGET", "24000"))
+# Pages whose fair share of the budget is below this are listed by URL only
+CRAWL_MIN_PAGE_TOKENS = int(os.getenv("CRAWL_MIN_PAGE_TOKENS", "200"))
+# Pages whose 64-bit SimHashes differ in at most this many bits are near-duplicates
+CRAWL_SIMHASH_DISTANCE = int(os.getenv("CRAWL_SIMHASH_DISTANCE", "3"))
+# A paragraph on at least this many pages, and this share of them, is boilerplate
+CRAWL_BOILERPLATE_MIN_PAGES = int(os.getenv("CRAWL_BOILERPLATE_MIN_PAGES", "3"))
+CRAWL_BOILERPLATE_FRACTION = float(os.getenv("CRAWL_BOILERPLATE_FRACTION", "0.3"))
+
+# Rough size of a token in English prose and markdown; no tokenizer is needed for a budget
+CHARS_PER_TOKEN = 4
+SHINGLE_WORDS = 3
+
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_WHITESPACE = re.compile(r"\s+")
+_WORD = re.compile(r"\w+")
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _fingerprint(text: str) -> int:
+    return int.from_bytes(hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash over word shingles; similar texts get hashes a few bits apart.
+
+    Shingles are hashed with BLAKE2b, so hashes do not depend on PYTHONHASHSEED and every
+    worker drops the same near-duplicates.
+    """
+    words = _WORD.findall(text.casefold())
+    if len(words) < SHINGLE_WORDS:
+        features = [" ".join(words)]
+    else:
+        features = [" ".join(words[i:i + SHINGLE_WORDS]) for i in range(len(words) - SHINGLE_WORDS + 1)]
+    packed = b"".join(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest() for feature in features)
+    # Count set bits column by column: one Counter per byte position instead of a loop per bit
+    ones = [0] * 64
+    for byte in range(8):
+        for value, count in Counter(packed[byte::8]).items():
+            for bit in range(8):
+                if value >> bit & 1:
+                    ones[byte * 8 + bit] += count
+    return sum(1 << bit for bit, count in enumerate(ones) if 2 * count > len(features))
+
+
+def split_paragraphs(text: str) -> list[str]:
+    return [paragraph.strip() for paragraph in _PARAGRAPH_BREAK.split(text) if paragraph.strip()]
+
+
+def truncate_to_tokens(text: str, tokens: int) -> str:
+    """Cut ``text`` to about ``tokens``, at a paragraph or line break when one is close."""
+    limit = tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind("\n", 0, limit)
+    if cut < limit // 2:
+        cut = limit
+    return text[:cut].rstrip() + "\n[truncated]"
+
+
+def allocate_budget(sizes: list[int], budget: int) -> list[int]:
+    """Split ``budget`` so small items get all they need and large ones share the rest evenly."""
+    shares = [0] * len(sizes)
+    remaining = budget
+    pending = sorted(range(len(sizes)), key=lambda i: sizes[i])
+    while pending:
+        share = remaining // len(pending)
+        index = pending[0]
+        if sizes[index] > share:
+            for index in pending:
+                shares[index] = share
+            break
+        shares[index] = sizes[index]
+        remaining -= sizes[index]
+        pending.pop(0)
+    return shares
+
+
+@dataclass
+class FilteredPages:
+    pages: list[dict[str, Any]]
+    # Near-duplicate URL -> URL of the page kept in its place
+    duplicates: dict[str, str] = field(default_factory=dict)
+    # URLs left out entirely to stay inside the budget
+    omitted: list[str] = field(default_factory=list)
+    boilerplate_paragraphs: int = 0
+    truncated: int = 0
+    tokens_in: int = 0
+    tokens_out: int = 0
+
+
+class ContentFilter:
+    """Filters one crawl's pages, in crawl order, into a prompt-sized set.
+
+    Paragraphs repeated across many pages (navigation, footers, cookie notices)
+    are kept on the first page only. Pages whose remaining text is a near
+    duplicate of an earlier page (versioned docs, print views) are dropped.
+    What is left is fitted into ``token_budget``.
+    """
+
+    def __init__(self, token_budget: int = CRAWL_TOKEN_BUDGET, min_page_tokens: int = CRAWL_MIN_PAGE_TOKENS,
+                 max_distance: int = CRAWL_SIMHASH_DISTANCE):
+        self.token_budget = token_budget
+        self.min_page_tokens = min_page_tokens
+        self.max_distance = max_distance
+        self._lock = threading.Lock()
+        self.runs = 0
+        self.duplicates = 0
+        self.omitted = 0
+        self.tokens_in = 0
+        self.tokens_out = 0
+
+    def _boilerplate(self, pages: list[list[str]]) -> set[int]:
+        counts: Counter[int] = Counter()
+        for paragraphs in pages:
+            counts.update({_fingerprint(_WHITESPACE.sub(" ", paragraph)) for paragraph in paragraphs})
+        min_pages = max(CRAWL_BOILERPLATE_MIN_PAGES, CRAWL_BOILERPLATE_FRACTION * len(pages))
+        return {fingerprint for fingerprint, count in counts.items() if count >= min_pages}
+
+    def filter(self, results: list[dict[str, Any]], fit: bool = True) -> FilteredPages:
+        """Drop boilerplate and near-duplicates, then fit the budget unless ``fit`` is false."""
+        split = [split_paragraphs(result.get("raw_content") or "") for result in results]
+        boilerplate = self._boilerplate(split)
+        filtered = FilteredPages(pages=[])
+
+        seen: set[int] = set()
+        kept: list[tuple[int, str]] = []
+        for result, paragraphs in zip(results, split):
+            url = result.get("url", "N/A")
+            filtered.tokens_in += estimate_tokens(result.get("raw_content") or "")
+            body = []
+            # Pages are compared without any boilerplate, including the copy kept on the first page
+            unique = []
+            for paragraph in paragraphs:
+                fingerprint = _fingerprint(_WHITESPACE.sub(" ", paragraph))
+                if fingerprint not in boilerplate:
+                    unique.append(paragraph)
+                elif fingerprint in seen:
+                    filtered.boilerplate_paragraphs += 1
+                    continue
+                else:
+                    seen.add(fingerprint)
+                body.append(paragraph)
+            content = "\n\n".join(body)
+
+            signature = simhash("\n\n".join(unique))
+            original = next(
+                (kept_url for kept_hash, kept_url in kept if (signature ^ kept_hash).bit_count() <= self.max_distance),
+                None,
+            )
+            if original is not None:
+                filtered.duplicates[url] = original
+                continue
+            kept.append((signature, url))
+            filtered.pages.append({**result, "raw_content": content})
+
+        if fit:
+            self.fit(filtered)
+        else:
+            filtered.tokens_out = sum(estimate_tokens(page["raw_content"]) for page in filtered.pages)
+        with self._lock:
+            self.runs += 1
+            self.duplicates += len(filtered.duplicates)
+            self.omitted += len(filtered.omitted)
+            self.tokens_in += filtered.tokens_in
+            self.tokens_out += filtered.tokens_out
+        return filtered
+
+    def fit(self, filtered: FilteredPages):
+        """Fit ``filtered.pages`` into the budget, in crawl order, as many as can each get a useful share."""
+        max_pages = max(1, self.token_budget // max(self.min_page_tokens, 1))
+        filtered.omitted = [page.get("url", "N/A") for page in filtered.pages[max_pages:]]
+        filtered.pages = filtered.pages[:max_pages]
+
+        sizes = [estimate_tokens(page["raw_content"]) for page in filtered.pages]
+        filtered.tokens_out = 0
+        for page, size, share in zip(filtered.pages, sizes, allocate_budget(sizes, self.token_budget)):
+            if size > share:
+                page["raw_content"] = truncate_to_tokens(page["raw_content"], share)
+                filtered.truncated += 1
+            filtered.tokens_out += estimate_tokens(page["raw_content"])
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "token_budget": self.token_budget,
+                "runs": self.runs,
+                "duplicates_dropped": self.duplicates,
+                "pages_omitted": self.omitted,
+                "tokens_in": self.tokens_in,
+                "tokens_out": self.tokens_out,
+            }
+
+
+content_filter = ContentFilter()
@@ -0,0 +1,201 @@
+"""SQLite store remembering the pages found by previous crawls."""
+from __future__ import annotations
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any
+from services.shared_state import connect_sqlite
+from .url_utils import canonicalize_url
+
+# Bytes of stored page content for the crawl in the enclosing ``crawls`` row
+_CRAWL_SIZE = "SELECT COALESCE(SUM(LENGTH(CAST(raw_content AS BLOB))), 0) FROM pages WHERE crawl_key = crawls.key"
+
+
+def crawl_key(payload: dict[str, Any]) -> str:
+    """Identify a crawl by its canonical root URL and every other crawl setting."""
+    settings = {name: value for name, value in payload.items() if name != "url"}
+    material = json.dumps({"url": canonicalize_url(payload["url"]), "settings": settings}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def content_hash(content: str | None) -> str:
+    return hashlib.sha256((content or "").encode("utf-8")).hexdigest()
+
+
+class CrawlStore:
+    """Pages of previous crawls, for answering repeats and recrawling only the delta.
+
+    A crawl and its pages are dropped once the crawl is older than ``ttl_seconds``; once
+    the stored page content exceeds ``max_bytes``, expired and then least recently used
+    crawls are evicted.
+    """
+
+    def __init__(self, path: str | Path, ttl_seconds: float = 604800, max_bytes: int = 256 * 1024 * 1024):
+        self.path = Path(path)
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = None
+        self.evictions = 0
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            self._conn = connect_sqlite(self.path)
+            self._conn.row_factory = sqlite3.Row
+            self._conn.executescript(
+                """
+                CREATE TABLE IF NOT EXISTS crawls (
+                    key TEXT PRIMARY KEY,
+                    root_url TEXT NOT NULL,
+                    settings TEXT NOT NULL,
+                    crawled_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL DEFAULT 0,
+                    size INTEGER NOT NULL DEFAULT 0
+                );
+                CREATE TABLE IF NOT EXISTS pages (
+                    crawl_key TEXT NOT NULL,
+                    url TEXT NOT NULL,
+                    raw_content TEXT,
+                    content_hash TEXT NOT NULL,
+                    etag TEXT,
+                    last_modified TEXT,
+                    fetched_at REAL NOT NULL,
+                    position INTEGER NOT NULL,
+                    PRIMARY KEY (crawl_key, url)
+                );
+                """
+            )
+            columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(crawls)")}
+            if "size" not in columns:
+                # Stores written before crawls were bounded are measured once
+                self._conn.execute("ALTER TABLE crawls ADD COLUMN accessed_at REAL NOT NULL DEFAULT 0")
+                self._conn.execute("ALTER TABLE crawls ADD COLUMN size INTEGER NOT NULL DEFAULT 0")
+                self._conn.execute(f"UPDATE crawls SET accessed_at = crawled_at, size = ({_CRAWL_SIZE})")
+        return self._conn
+
+
+    def get_crawl(self, key: str) -> dict[str, Any] | None:
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            row = conn.execute("SELECT * FROM crawls WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if now - row["crawled_at"] > self.ttl_seconds:
+                self._transaction(conn, lambda: self._delete_crawls(conn, [key]))
+                return None
+            conn.execute("UPDATE crawls SET accessed_at = ? WHERE key = ?", (now, key))
+        return dict(row)
+
+    def get_pages(self, key: str) -> list[dict[str, Any]]:
+        with self._lock:
+            rows = self._connect().execute(
+                "SELECT * FROM pages WHERE crawl_key = ? ORDER BY position", (key,)
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def replace_crawl(self, key: str, payload: dict[str, Any], results: list[dict[str, Any]]):
+        """Store the result of a full crawl, forgetting earlier pages."""
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                conn.execute("DELETE FROM pages WHERE crawl_key = ?", (key,))
+                for position, result in enumerate(results):
+                    conn.execute(
+                        "INSERT OR REPLACE INTO pages (crawl_key, url, raw_content, content_hash, fetched_at, position) VALUES (?, ?, ?, ?, ?, ?)",
+                        (key, result.get("url", ""), result.get("raw_content"), content_hash(result.get("raw_content")), now, position),
+                    )
+                self._touch(conn, key, payload, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def apply_delta(
+        self,
+        key: str,
+        payload: dict[str, Any],
+        ordered_urls: list[str],
+        fetched: dict[str, dict[str, Any]],
+        validators: dict[str, tuple[str | None, str | None]],
+    ):
+        """Record a delta recrawl.
+
+        ``ordered_urls`` is the current page list; stored pages not in it are
+        dropped. ``fetched`` maps URLs to freshly extracted results and
+        ``validators`` maps URLs to their latest (ETag, Last-Modified).
+        """
+        now = time.time()
+        with self._lock:
+            conn = self._connect()
+            conn.execute("BEGIN")
+            try:
+                placeholders = ",".join("?" for _ in ordered_urls)
+                conn.execute(
+                    f"DELETE FROM pages WHERE crawl_key = ? AND url NOT IN ({placeholders})",
+                    (key, *ordered_urls),
+                )
+                for position, url in enumerate(ordered_urls):
+                    etag, last_modified = validators.get(url, (None, None))
+                    result = fetched.get(url)
+                    if result is not None:
+                        conn.execute(
+                            "INSERT OR REPLACE INTO pages (crawl_key, url, raw_content, content_hash, etag, last_modified, fetched_at, position) VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                            (key, url, result.get("raw_content"), content_hash(result.get("raw_content")), etag, last_modified, now, position),
+                        )
+                    else:
+                        conn.execute(
+                            "UPDATE pages SET position = ?, etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified) WHERE crawl_key = ? AND url = ?",
+                            (position, etag, last_modified, key, url),
+                        )
+                self._touch(conn, key, payload, now)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _touch(self, conn: sqlite3.Connection, key: str, payload: dict[str, Any], now: float):
+        settings = {name: value for name, value in payload.items() if name != "url"}
+        conn.execute(
+            "INSERT OR REPLACE INTO crawls (key, root_url, settings, crawled_at, accessed_at, size) VALUES (?, ?, ?, ?, ?, 0)",
+            (key, payload["url"], json.dumps(settings, sort_keys=True), now, now),
+        )
+        conn.execute(f"UPDATE crawls SET size = ({_CRAWL_SIZE}) WHERE key = ?", (key,))
+        self._evict(conn, key, now)
+
+    def _transaction(self, conn: sqlite3.Connection, fn):
+        conn.execute("BEGIN")
+        try:
+            fn()
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _delete_crawls(self, conn: sqlite3.Connection, keys: list[str]):
+        for key in keys:
+            conn.execute("DELETE FROM pages WHERE crawl_key = ?", (key,))
+            conn.execute("DELETE FROM crawls WHERE key = ?", (key,))
+
+    def _evict(self, conn: sqlite3.Connection, keep: str, now: float):
+        """Free space: expired crawls first, then the least recently used, never ``keep``."""
+        expired = [row[0] for row in conn.execute(
+            "SELECT key FROM crawls WHERE crawled_at < ? AND key != ?", (now - self.ttl_seconds, keep)
+        )]
+        self._delete_crawls(conn, expired)
+        self.evictions += len(expired)
+
+        while conn.execute("SELECT COALESCE(SUM(size), 0) FROM crawls").fetchone()[0] > self.max_bytes:
+            oldest = conn.execute(
+                "SELECT key FROM crawls WHERE key != ? ORDER BY accessed_at LIMIT 1", (keep,)
+            ).fetchall()
+            if not oldest:
+                break
+            self._delete_crawls(conn, [row[0] for row in oldest])
+            self.evictions += len(oldest)
@@ -1,17 +1,88 @@
 """Tool to crawl websites."""
 from __future__ import annotations
+import asyncio
+import ipaddress
 import os
-from typing import Any, NoReturn
+import re
+import socket
+import time
+from collections.abc import Generator
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass, field
+from typing import Any, NoReturn, TypeVar
 import httpx
 from pydantic import BaseModel, Field
 from portia.errors import ToolHardError, ToolSoftError
 from portia.tool import Tool, ToolRunContext
+from services.http_client import http_clients
+from services.metrics import stage_timer
+from .content_filter import content_filter
+from .passage_index import relevant_pages, wants_ranking
+from .crawl_store import CrawlStore, crawl_key
+from .url_utils import canonicalize_url
 
 # Constants for default values
 DEFAULT_MAX_DEPTH = 1
 DEFAULT_MAX_BREADTH = 20
 DEFAULT_LIMIT = 50
 
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+
+# Repeat crawls inside this window are answered from the store
+CRAWL_FRESHNESS_SECONDS = float(os.getenv("CRAWL_FRESHNESS_SECONDS", "21600"))
+# Stored pages without HTTP validators are refetched once older than this
+CRAWL_PAGE_MAX_AGE_SECONDS = float(os.getenv("CRAWL_PAGE_MAX_AGE_SECONDS", "604800"))
+CRAWL_CHECK_WORKERS = 16
+EXTRACT_BATCH_SIZE = 20
+# Map accepts the same settings as crawl, minus the content-extraction options
+MAP_FIELDS = {
+    "url", "instructions", "max_depth", "max_breadth", "limit", "select_paths",
+    "select_domains", "exclude_paths", "exclude_domains", "allow_external",
+}
+
+crawl_store = CrawlStore(
+    os.getenv("CRAWL_STORE_PATH", ".cache/crawl.sqlite3"),
+    ttl_seconds=float(os.getenv("CRAWL_STORE_TTL_SECONDS", "604800")),
+    max_bytes=int(os.getenv("CRAWL_STORE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+
+@dataclass
+class HttpRequest:
+    """One HTTP call made on behalf of a crawl step, by the sync or the async driver."""
+    method: str
+    url: str
+    options: dict[str, Any] = field(default_factory=dict)
+    # Timed as this stage in the metrics
+    stage: str | None = None
+    # Only sent when the host resolves to public addresses (for URLs that come from a crawled site)
+    public_only: bool = False
+
+
+def _public_host(host: str) -> bool:
+    """Whether every address ``host`` resolves to is public: not private, loopback, link-local or reserved."""
+    try:
+        infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    except (OSError, UnicodeError):
+        return False
+    addresses = [ipaddress.ip_address(info[4][0].split("%", 1)[0]) for info in infos]
+    return bool(addresses) and all(
+        (address.ipv4_mapped or address).is_global if address.version == 6 else address.is_global
+        for address in addresses
+    )
+
+
+def _blocked(request: HttpRequest) -> PermissionError:
+    return PermissionError(f"Not sending {request.method} to {request.url}: not a public address")
+
+
+T = TypeVar("T")
+# The crawl logic is written once as generators: each yields a list of requests, is sent
+# back their responses (or the exceptions raised) in order, and returns its result. run()
+# and arun() only differ in the driver that makes the requests.
+Steps = Generator[list[HttpRequest], list[Any], T]
+
 class CrawlToolSchema(BaseModel):
     """Input for CrawlTool."""
     url: str = Field(..., description="The root URL to begin the crawl (e.g., 'https://docs.tavily.com')")
@@ -71,6 +142,14 @@ class CrawlToolSchema(BaseModel):
         ),
     )
     allow_external: bool = Field(default=False, description="Whether to allow following links that go to external domains")
+    query: str | None = Field(
+        default=None,
+        description=(
+            "The documentation topic, optionally followed by section headings separated by ';' "
+            "(e.g., 'FastAPI dependency injection; Introduction; Examples'). When given, only the "
+            "passages most relevant to it are returned"
+        ),
+    )
 
 class CrawlTool(Tool[str]):
     """Crawls websites using graph-based traversal tool."""
@@ -100,12 +179,40 @@ class CrawlTool(Tool[str]):
         exclude_paths: list[str] | None = None,
         exclude_domains: list[str] | None = None,
         allow_external: bool = False,
+        query: str | None = None,
     ) -> str:
         """Run the crawl tool."""
-        api_key = os.getenv("TAVILY_API_KEY")
-        if not api_key or api_key == "":
-            raise ToolHardError("TAVILY_API_KEY is required to use crawl")
+        payload = self._build_payload(
+            url=url,
+            instructions=instructions,
+            max_depth=max_depth,
+            max_breadth=max_breadth,
+            limit=limit,
+            select_paths=select_paths,
+            select_domains=select_domains,
+            exclude_paths=exclude_paths,
+            exclude_domains=exclude_domains,
+            allow_external=allow_external,
+        )
 
+        return self._drive(self._crawl_with_store(self._get_api_key(), payload, query))
+
+    async def arun(
+        self,
+        _: ToolRunContext,
+        url: str,
+        instructions: str | None = None,
+        max_depth: int = DEFAULT_MAX_DEPTH,
+        max_breadth: int = DEFAULT_MAX_BREADTH,
+        limit: int = DEFAULT_LIMIT,
+        select_paths: list[str] | None = None,
+        select_domains: list[str] | None = None,
+        exclude_paths: list[str] | None = None,
+        exclude_domains: list[str] | None = None,
+        allow_external: bool = False,
+        query: str | None = None,
+    ) -> str:
+        """Run the crawl tool on the shared async HTTP client."""
         payload = self._build_payload(
             url=url,
             instructions=instructions,
@@ -119,7 +226,234 @@ class CrawlTool(Tool[str]):
             allow_external=allow_external,
         )
 
-        return self._make_api_request(api_key, payload)
+        return await self._adrive(self._crawl_with_store(self._get_api_key(), payload, query))
+
+    def _get_api_key(self) -> str:
+        api_key = os.getenv("TAVILY_API_KEY")
+        if not api_key or api_key == "":
+            raise ToolHardError("TAVILY_API_KEY is required to use crawl")
+        return api_key
+
+    def _drive(self, steps: Steps[T]) -> T:
+        """Run ``steps`` on the shared sync client, sending each list of requests concurrently."""
+        client = http_clients.sync_client()
+
+        def send(request: HttpRequest) -> httpx.Response | Exception:
+            if request.public_only and not _public_host(httpx.URL(request.url).host):
+                return _blocked(request)
+            try:
+                with stage_timer(request.stage) if request.stage else nullcontext():
+                    return client.request(request.method, request.url, **request.options)
+            except Exception as e:  # noqa: BLE001
+                return e
+
+        try:
+            requests = next(steps)
+            while True:
+                if len(requests) > 1:
+                    with ThreadPoolExecutor(max_workers=min(CRAWL_CHECK_WORKERS, len(requests))) as pool:
+                        responses = list(pool.map(send, requests))
+                else:
+                    responses = [send(request) for request in requests]
+                requests = steps.send(responses)
+        except StopIteration as done:
+            return done.value
+
+    async def _adrive(self, steps: Steps[T]) -> T:
+        """Run ``steps`` on the shared async client, sending each list of requests concurrently."""
+        client = http_clients.async_client()
+        semaphore = asyncio.Semaphore(CRAWL_CHECK_WORKERS)
+
+        async def send(request: HttpRequest) -> httpx.Response | Exception:
+            async with semaphore:
+                if request.public_only and not await asyncio.to_thread(_public_host, httpx.URL(request.url).host):
+                    return _blocked(request)
+                try:
+                    with stage_timer(request.stage) if request.stage else nullcontext():
+                        return await client.request(request.method, request.url, **request.options)
+                except Exception as e:  # noqa: BLE001
+                    return e
+
+        try:
+            requests = next(steps)
+            while True:
+                requests = steps.send(list(await asyncio.gather(*(send(request) for request in requests))))
+        except StopIteration as done:
+            return done.value
+
+    def _crawl_with_store(self, api_key: str, payload: dict[str, Any], query: str | None = None) -> Steps[str]:
+        """Answer from the crawl store when fresh, recrawl only the delta when stale."""
+        key = crawl_key(payload)
+        crawl = crawl_store.get_crawl(key)
+
+        if crawl is not None and time.time() - crawl["crawled_at"] <= CRAWL_FRESHNESS_SECONDS:
+            return self._format_results(crawl_store.get_pages(key), query)
+
+        if crawl is not None:
+            try:
+                yield from self._delta_recrawl(api_key, key, payload)
+                return self._format_results(crawl_store.get_pages(key), query)
+            except ToolSoftError:
+                # Fall back to a full crawl if the delta could not be computed
+                pass
+
+        results = yield from self._crawl(api_key, payload)
+        crawl_store.replace_crawl(key, payload, results)
+        return self._format_results(results, query)
+
+    def _delta_recrawl(self, api_key: str, key: str, payload: dict[str, Any]) -> Steps[None]:
+        """Fetch only pages that are new or changed since the stored crawl.
+
+        Raises ToolSoftError when the page list or the changed pages cannot be
+        fetched, so the stored crawl is not marked fresh with stale pages.
+        """
+        current_urls = yield from self._map(api_key, self._map_payload(payload))
+        ordered_urls, to_fetch, to_check = self._split_delta(key, current_urls)
+
+        validators: dict[str, tuple[str | None, str | None]] = {}
+        changed_urls: list[str] = []
+        checkable = [page for page in to_check if self._may_check(page["url"], payload)]
+        responses = yield [self._check_request(page) for page in checkable]
+        checked = dict(zip((page["url"] for page in checkable), responses))
+        for page in to_check:
+            if page["url"] in checked:
+                changed, etag, last_modified = self._interpret_check(page, checked[page["url"]])
+            else:
+                # Pages on other hosts are never contacted directly; Tavily refetches them once old
+                changed, etag, last_modified = self._too_old(page), page.get("etag"), page.get("last_modified")
+            validators[page["url"]] = (etag, last_modified)
+            if changed:
+                changed_urls.append(page["url"])
+        to_fetch.extend(changed_urls)
+
+        fetched: dict[str, dict[str, Any]] = {}
+        for batch in self._batches(to_fetch):
+            fetched.update(self._match_fetched(batch, (yield from self._extract(api_key, batch))))
+
+        for url in changed_urls:
+            if url not in fetched:
+                # Keep the old validators so the next recrawl checks this page again
+                del validators[url]
+        # Changed pages that could not be refetched keep their stored content
+        crawl_store.apply_delta(key, payload, ordered_urls, fetched, validators)
+
+    def _map_payload(self, payload: dict[str, Any]) -> dict[str, Any]:
+        return {name: value for name, value in payload.items() if name in MAP_FIELDS}
+
+    def _split_delta(self, key: str, current_urls: list[str]) -> tuple[list[str], list[str], list[dict[str, Any]]]:
+        """Split the current page list into (ordered URLs, new URLs to fetch, stored pages to check)."""
+        known = {canonicalize_url(page["url"]): page for page in crawl_store.get_pages(key)}
+
+        ordered_urls: list[str] = []
+        to_fetch: list[str] = []
+        to_check: list[dict[str, Any]] = []
+        for url in current_urls:
+            page = known.get(canonicalize_url(url))
+            if page is None:
+                ordered_urls.append(url)
+                to_fetch.append(url)
+            else:
+                ordered_urls.append(page["url"])
+                to_check.append(page)
+        return ordered_urls, to_fetch, to_check
+
+    def _batches(self, urls: list[str]) -> list[list[str]]:
+        return [urls[start:start + EXTRACT_BATCH_SIZE] for start in range(0, len(urls), EXTRACT_BATCH_SIZE)]
+
+    def _match_fetched(self, batch: list[str], results: list[dict[str, Any]]) -> dict[str, dict[str, Any]]:
+        by_canonical_url = {canonicalize_url(url): url for url in batch}
+        fetched = {}
+        for result in results:
+            url = by_canonical_url.get(canonicalize_url(result.get("url", "")))
+            if url is not None:
+                fetched[url] = result
+        return fetched
+
+    def _check_headers(self, page: dict[str, Any]) -> dict[str, str]:
+        headers = {}
+        if page.get("etag"):
+            headers["If-None-Match"] = page["etag"]
+        if page.get("last_modified"):
+            headers["If-Modified-Since"] = page["last_modified"]
+        return headers
+
+    def _may_check(self, url: str, payload: dict[str, Any]) -> bool:
+        """Whether the server itself may HEAD ``url``: only on the crawl root's host or in select_domains."""
+        root = payload["url"] if "://" in payload["url"] else f"https://{payload['url']}"
+        try:
+            parsed, root_host = httpx.URL(url), httpx.URL(root).host.lower()
+        except httpx.InvalidURL:
+            return False
+        if parsed.scheme not in ("http", "https") or not parsed.host:
+            return False
+        host = parsed.host.lower()
+        if host == root_host:
+            return True
+        for pattern in payload.get("select_domains") or []:
+            try:
+                if re.fullmatch(pattern, host):
+                    return True
+            except re.error:
+                continue
+        return False
+
+    def _check_request(self, page: dict[str, Any]) -> HttpRequest:
+        """A conditional HEAD for a stored page; redirects are not followed off the checked host."""
+        return HttpRequest(
+            "HEAD", page["url"], {"headers": self._check_headers(page), "timeout": 10.0, "follow_redirects": False},
+            public_only=True,
+        )
+
+    def _too_old(self, page: dict[str, Any]) -> bool:
+        return time.time() - page["fetched_at"] > CRAWL_PAGE_MAX_AGE_SECONDS
+
+    def _interpret_check(self, page: dict[str, Any], response: httpx.Response | Exception) -> tuple[bool, str | None, str | None]:
+        """Return (changed, etag, last_modified) for a stored page from its HEAD response."""
+        if isinstance(response, Exception):
+            return False, None, None
+        etag = response.headers.get("etag")
+        last_modified = response.headers.get("last-modified")
+        if response.status_code == 304:
+            return False, etag, last_modified
+        if self._check_headers(page):
+            changed = (etag or None) != page.get("etag") or (last_modified or None) != page.get("last_modified")
+            return changed, etag, last_modified
+
+        # No validators recorded yet: trust the stored copy until it is too old
+        return self._too_old(page), etag, last_modified
+
+    def _headers(self, api_key: str) -> dict[str, str]:
+        return {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
+
+    def _tavily_request(self, api_key: str, endpoint: str, payload: dict[str, Any]) -> HttpRequest:
+        return HttpRequest(
+            "POST", f"{TAVILY_API_URL}/{endpoint}", {"headers": self._headers(api_key), "json": payload, "timeout": 60.0},
+            stage=f"tavily_{endpoint}",
+        )
+
+    def _map(self, api_key: str, payload: dict[str, Any]) -> Steps[list[str]]:
+        """List the site's current pages without extracting their content."""
+        (response,) = yield [self._tavily_request(api_key, "map", payload)]
+        try:
+            if isinstance(response, Exception):
+                raise response
+            response.raise_for_status()
+            json_response = response.json()
+        except (httpx.HTTPError, ValueError) as e:
+            raise ToolSoftError(f"Map request failed: {e!s}") from e
+        if "results" not in json_response:
+            raise ToolSoftError(f"Failed to map website: {json_response}")
+        return json_response["results"]
+
+    def _extract(self, api_key: str, urls: list[str]) -> Steps[list[dict[str, Any]]]:
+        (response,) = yield [self._tavily_request(api_key, "extract", {"urls": urls, "extract_depth": "basic", "format": "markdown"})]
+        try:
+            if isinstance(response, Exception):
+                raise response
+            response.raise_for_status()
+            return response.json().get("results", [])
+        except (httpx.HTTPError, ValueError) as e:
+            raise ToolSoftError(f"Extract request failed: {e!s}") from e
 
     def _build_payload(
         self,
@@ -159,37 +493,65 @@ class CrawlTool(Tool[str]):
 
         return payload
 
-    def _make_api_request(self, api_key: str, payload: dict[str, Any]) -> str:
-        """Make the API request and process the response."""
-        api_url = "https://api.tavily.com/crawl"
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
-
+    def _crawl(self, api_key: str, payload: dict[str, Any]) -> Steps[list[Any]]:
+        """Make the crawl API request and return the raw page results."""
+        (response,) = yield [self._tavily_request(api_key, "crawl", payload)]
         try:
-            response = httpx.post(api_url, headers=headers, json=payload, timeout=60.0)
-            response.raise_for_status()
-            json_response = response.json()
+            if isinstance(response, Exception):
+                raise response
+            return self._parse_crawl_response(response)
+        except Exception as e:
+            self._handle_crawl_exception(e)
+
+    def _parse_crawl_response(self, response: httpx.Response) -> list[Any]:
+        response.raise_for_status()
+        json_response = response.json()
 
-            if "results" in json_response:
-                return self._format_results(json_response["results"])
+        if "results" in json_response:
+            return json_response["results"]
 
-            self._raise_crawl_error(json_response)
+        self._raise_crawl_error(json_response)
 
-        except httpx.HTTPStatusError as e:
+    def _handle_crawl_exception(self, e: Exception) -> NoReturn:
+        if isinstance(e, ToolSoftError):
+            raise e
+        if isinstance(e, httpx.HTTPStatusError):
             self._handle_http_error(e)
-        except httpx.TimeoutException as e:
+        if isinstance(e, httpx.TimeoutException):
             raise ToolSoftError("Crawl request timed out") from e
-        except Exception as e:
-            raise ToolSoftError(f"Crawl request failed: {e!s}") from e
+        raise ToolSoftError(f"Crawl request failed: {e!s}") from e
+
+    def _format_results(self, results: list[Any], query: str | None = None) -> str:
+        """Format the crawl results into a readable string, without boilerplate or near-duplicates and within the token budget.
 
-    def _format_results(self, results: list[Any]) -> str:
-        """Format the crawl results into a readable string."""
+        With a ``query``, large crawls are cut down to the passages most relevant to it.
+        """
+        ranked = wants_ranking(results, query)
+        filtered = content_filter.filter(results, fit=not ranked)
+        if ranked:
+            with stage_timer("passage_rank"):
+                relevant = relevant_pages(filtered.pages, query)
+            if relevant:
+                filtered.pages = relevant
+            else:
+                # Nothing matches the query's words; show the pages themselves rather than nothing
+                ranked = False
+                content_filter.fit(filtered)
         formatted_results = []
-        for result in results:
+        for result in filtered.pages:
             url_info = f"URL: {result.get('url', 'N/A')}"
             content_preview = result.get("raw_content", "")
             formatted_results.append(f"{url_info}\nContent: {content_preview}\n")
 
-        return f"Crawled {len(results)} pages:\n\n" + "\n---\n".join(formatted_results)
+        header = f"Crawled {len(results)} pages"
+        if filtered.duplicates:
+            header += f" ({len(filtered.duplicates)} near-duplicates left out)"
+        if ranked:
+            header += f", showing passages from {len(filtered.pages)} pages relevant to: {query}"
+        output = f"{header}:\n\n" + "\n---\n".join(formatted_results)
+        if filtered.omitted:
+            output += "\n---\nNot shown to stay within the token budget:\n" + "\n".join(filtered.omitted) + "\n"
+        return output
 
     def _raise_crawl_error(self, json_response: dict[str, Any]) -> NoReturn:
         """Raise a ToolSoftError for crawl failures."""
@@ -1,10 +1,38 @@
 """Tool to extract web page content from one or more URLs."""
 from __future__ import annotations
+import asyncio
+import hashlib
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any
 import httpx
 from pydantic import BaseModel, Field
 from portia.errors import ToolHardError, ToolSoftError
 from portia.tool import Tool, ToolRunContext
+from services.http_client import http_clients
+from services.metrics import stage_timer
+from .content_cache import ContentCache
+from .content_filter import FilteredPages, content_filter
+from .passage_index import relevant_pages, wants_ranking
+from .url_utils import canonicalize_url
+
+TAVILY_API_URL = os.getenv("TAVILY_API_URL", "https://api.tavily.com")
+# Tavily Extract accepts at most 20 URLs per request
+EXTRACT_BATCH_SIZE = int(os.getenv("EXTRACT_BATCH_SIZE", "20"))
+EXTRACT_MAX_CONCURRENCY = int(os.getenv("EXTRACT_MAX_CONCURRENCY", "4"))
+
+extract_cache = ContentCache(
+    root=os.getenv("EXTRACT_CACHE_DIR", ".cache/extract"),
+    ttl_seconds=float(os.getenv("EXTRACT_CACHE_TTL_SECONDS", "86400")),
+    max_bytes=int(os.getenv("EXTRACT_CACHE_MAX_BYTES", str(256 * 1024 * 1024))),
+)
+
+
+def extract_cache_key(url: str, options: dict[str, Any]) -> str:
+    """Cache key for one URL extracted with the given request options."""
+    material = json.dumps({"url": canonicalize_url(url), **options}, sort_keys=True)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
 
 class ExtractToolSchema(BaseModel):
     """Input for ExtractTool."""
@@ -21,6 +49,14 @@ class ExtractToolSchema(BaseModel):
         ),
     )
     format: str = Field(default="markdown", description="Output format: 'markdown' or 'text'")
+    query: str | None = Field(
+        default=None,
+        description=(
+            "The documentation topic, optionally followed by section headings separated by ';' "
+            "(e.g., 'FastAPI dependency injection; Introduction; Examples'). When given, only the "
+            "passages most relevant to it are returned"
+        ),
+    )
 
 class ExtractTool(Tool[str]):
     """Extracts the web page content from one or more URLs provided."""
@@ -44,27 +80,183 @@ class ExtractTool(Tool[str]):
         include_favicon: bool = True,
         extract_depth: str = "basic",
         format: str = "markdown",  # noqa: A002, API requires 'format' field name
+        query: str | None = None,
     ) -> str:
         """Run the extract tool."""
+        api_key = self._get_api_key()
+        options = self._build_options(include_images, include_favicon, extract_depth, format)
+
+        canonical_urls = self._dedupe(urls)
+        results, missing = self._split_cached(canonical_urls, options)
+
+        if missing:
+            batches = self._batches(missing)
+            with ThreadPoolExecutor(max_workers=min(EXTRACT_MAX_CONCURRENCY, len(batches))) as pool:
+                futures = {pool.submit(self._fetch, api_key, batch, options): batch for batch in batches}
+                for future in as_completed(futures):
+                    self._collect_batch(futures[future], options, results, future.exception() or future.result())
+
+        return self._select_passages(self._ordered_results(canonical_urls, results), query)
+
+    async def arun(
+        self,
+        _: ToolRunContext,
+        urls: list[str],
+        include_images: bool = True,
+        include_favicon: bool = True,
+        extract_depth: str = "basic",
+        format: str = "markdown",  # noqa: A002, API requires 'format' field name
+        query: str | None = None,
+    ) -> str:
+        """Run the extract tool on the shared async HTTP client."""
+        api_key = self._get_api_key()
+        options = self._build_options(include_images, include_favicon, extract_depth, format)
+
+        canonical_urls = self._dedupe(urls)
+        results, missing = self._split_cached(canonical_urls, options)
+
+        if missing:
+            semaphore = asyncio.Semaphore(EXTRACT_MAX_CONCURRENCY)
+
+            async def fetch_batch(batch: list[str]):
+                async with semaphore:
+                    try:
+                        return batch, await self._afetch(api_key, batch, options)
+                    except Exception as e:  # noqa: BLE001
+                        return batch, e
+
+            for finished in asyncio.as_completed([fetch_batch(batch) for batch in self._batches(missing)]):
+                batch, outcome = await finished
+                self._collect_batch(batch, options, results, outcome)
+
+        return self._select_passages(self._ordered_results(canonical_urls, results), query)
+
+    def _get_api_key(self) -> str:
         api_key = os.getenv("TAVILY_API_KEY")
         if not api_key or api_key == "":
             raise ToolHardError("TAVILY_API_KEY is required to use extract")
+        return api_key
 
-        url = "https://api.tavily.com/extract"
-        payload = {
-            "urls": urls,
+    def _build_options(self, include_images: bool, include_favicon: bool, extract_depth: str, format: str) -> dict[str, Any]:  # noqa: A002
+        return {
             "include_images": include_images,
             "include_favicon": include_favicon,
             "extract_depth": extract_depth,
             "format": format,
         }
-        headers = {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"}
 
-        response = httpx.post(url, headers=headers, json=payload, timeout=60.0)
+    def _dedupe(self, urls: list[str]) -> dict[str, str]:
+        """Map each distinct canonical URL to the first spelling the caller used."""
+        canonical_urls: dict[str, str] = {}
+        for url in urls:
+            canonical_urls.setdefault(canonicalize_url(url), url)
+        return canonical_urls
+
+    def _batches(self, urls: list[str]) -> list[list[str]]:
+        return [urls[start:start + EXTRACT_BATCH_SIZE] for start in range(0, len(urls), EXTRACT_BATCH_SIZE)]
+
+    def _split_cached(self, canonical_urls: dict[str, str], options: dict[str, Any]) -> tuple[dict[str, Any], list[str]]:
+        """Serve what we can from the cache and return the canonical URLs that must go upstream."""
+        results: dict[str, Any] = {}
+        missing: list[str] = []
+        for canonical_url in canonical_urls:
+            cached = extract_cache.get(extract_cache_key(canonical_url, options))
+            if cached is not None:
+                results[canonical_url] = cached
+            else:
+                missing.append(canonical_url)
+        return results, missing
+
+    def _collect_batch(
+        self,
+        batch: list[str],
+        options: dict[str, Any],
+        results: dict[str, Any],
+        outcome: dict[str, Any] | BaseException,
+    ):
+        """Record one finished batch, caching successes and keeping per-URL errors."""
+        if isinstance(outcome, BaseException):
+            for canonical_url in batch:
+                results[canonical_url] = {"url": canonical_url, "error": self._describe_error(outcome)}
+            return
+
+        for result in outcome.get("results", []):
+            canonical_url = canonicalize_url(result.get("url", ""))
+            results[canonical_url] = result
+            if canonical_url in batch:
+                extract_cache.put(extract_cache_key(canonical_url, options), result)
+
+        for failure in outcome.get("failed_results", []):
+            canonical_url = canonicalize_url(failure.get("url", ""))
+            results.setdefault(canonical_url, {"url": failure.get("url", ""), "error": failure.get("error", "Extraction failed")})
+
+        for canonical_url in batch:
+            results.setdefault(canonical_url, {"url": canonical_url, "error": "No content returned"})
+
+    def _describe_error(self, error: BaseException) -> str:
+        if isinstance(error, httpx.HTTPStatusError):
+            return f"HTTP {error.response.status_code}: {error.response.text}"
+        if isinstance(error, httpx.TimeoutException):
+            return "Extract request timed out"
+        return str(error)
+
+    def _ordered_results(self, canonical_urls: dict[str, str], results: dict[str, Any]) -> list[Any]:
+        """Return results in request order, then any the upstream returned under another URL.
+
+        Failed URLs are reported as ``{"url", "error"}`` entries; only a call where
+        every URL failed raises.
+        """
+        if results and all(self._is_error(result) for result in results.values()):
+            raise ToolSoftError(f"Failed to extract content: {list(results.values())}")
+
+        ordered = []
+        for canonical_url, url in canonical_urls.items():
+            result = results.pop(canonical_url, None)
+            if result is not None:
+                ordered.append({**result, "url": url} if self._is_error(result) else result)
+        return ordered + list(results.values())
+
+    def _select_passages(self, results: list[Any], query: str | None) -> list[Any]:
+        """Cut page content down to the passages most relevant to ``query``, keeping error entries."""
+        pages = [result for result in results if not self._is_error(result)]
+        if not wants_ranking(pages, query):
+            return results
+        with stage_timer("passage_rank"):
+            relevant = relevant_pages(pages, query)
+        if not relevant:
+            # Nothing matches the query's words; return the pages themselves, fitted to the budget
+            filtered = FilteredPages(pages=[dict(page) for page in pages])
+            content_filter.fit(filtered)
+            relevant = filtered.pages
+        return relevant + [result for result in results if self._is_error(result)]
+
+    def _is_error(self, result: dict[str, Any]) -> bool:
+        return "error" in result and "raw_content" not in result
+
+    def _request_args(self, api_key: str, urls: list[str], options: dict[str, Any]) -> dict[str, Any]:
+        return {
+            "url": f"{TAVILY_API_URL}/extract",
+            "headers": {"Content-Type": "application/json", "Authorization": f"Bearer {api_key}"},
+            "json": {"urls": urls, **options},
+            "timeout": 60.0,
+        }
+
+    def _parse_response(self, response: httpx.Response) -> dict[str, Any]:
         response.raise_for_status()
         json_response = response.json()
 
         if "results" in json_response:
-            return json_response["results"]
+            return json_response
+
+        raise ToolSoftError(f"Failed to extract content: {json_response}")
+
+    def _fetch(self, api_key: str, urls: list[str], options: dict[str, Any]) -> dict[str, Any]:
+        """Extract one batch of ``urls`` with a single Tavily request."""
+        with stage_timer("tavily_extract"):
+            response = http_clients.sync_client().post(**self._request_args(api_key, urls, options))
+        return self._parse_response(response)
 
-        raise ToolSoftError(f"Failed to extract content: {json_response}")
\ No newline at end of file
+    async def _afetch(self, api_key: str, urls: list[str], options: dict[str, Any]) -> dict[str, Any]:
+        with stage_timer("tavily_extract"):
+            response = await http_clients.async_client().post(**self._request_args(api_key, urls, options))
+        return self._parse_response(response)
@@ -1,19 +1,29 @@
-from pathlib import Path
 from typing import Annotated
-from portia import tool
+from portia import ToolRunContext, tool
+from portia.errors import ToolSoftError
+from services.docs_sweeper import get_docs_sweeper, user_file_path
+from services.metrics import stage_timer
 
 @tool
 def file_writer_tool(
+    ctx: ToolRunContext,
     filename: Annotated[str, "The location where the file should be written to"],
     content: Annotated[str, "The content to write to the file"]
 ) -> str:
     """Writes content to a local file on disk."""
-    file_path = Path(filename)
+    # Only the requesting user's directory is writable, whatever path the model asked for
+    try:
+        file_path = user_file_path(ctx.end_user.external_id, filename)
+    except ValueError as e:
+        raise ToolSoftError(str(e)) from e
     
-    # Create parent directories if they don't exist
-    file_path.parent.mkdir(parents=True, exist_ok=True)
+    with stage_timer("file_write"):
+        # Create parent directories if they don't exist
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        
+        # Write content to file
+        file_path.write_text(content, encoding="utf-8")
     
-    # Write content to file
-    file_path.write_text(content, encoding="utf-8")
+    get_docs_sweeper().register(file_path)
     
-    return f"Successfully wrote content to {filename}"
\ No newline at end of file
+    return f"Successfully wrote content to {file_path}"
\ No newline at end of file
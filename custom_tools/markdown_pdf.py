@@ -0,0 +1,321 @@
+"""Markdown to PDF rendering with fpdf2, shared by the PDF tool and the render pool.
+
+Markdown is tokenized in a single pass over the source lines, inline markup is
+resolved with one compiled regex per block, and inline runs are laid out by a
+greedy word wrapper that measures words once and hard-breaks any word wider
+than the line (long URLs in link lists). A Unicode TTF font is used when one
+is available so non-ASCII text survives; otherwise text is mapped to Latin-1
+in a single translate pass.
+"""
+from __future__ import annotations
+import os
+import re
+import tempfile
+from dataclasses import dataclass, field
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, Iterator
+from fpdf import FPDF
+from fpdf.enums import XPos, YPos
+
+FONT_SEARCH_DIRS = (
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/usr/share/fonts/TTF",
+    "/Library/Fonts",
+    "C:/Windows/Fonts",
+)
+# Missing styles fall back along these chains, ending at the regular face
+FONT_FALLBACKS = {"": [""], "B": ["B", ""], "I": ["I", ""], "BI": ["BI", "B", ""], "mono": ["mono", ""]}
+FONT_FILES = {
+    "": "DejaVuSans.ttf",
+    "B": "DejaVuSans-Bold.ttf",
+    "I": "DejaVuSans-Oblique.ttf",
+    "BI": "DejaVuSans-BoldOblique.ttf",
+    "mono": "DejaVuSansMono.ttf",
+}
+
+HEADING_SIZES = {1: 16, 2: 14, 3: 12, 4: 11, 5: 11, 6: 11}
+BODY_SIZE = 10
+CODE_SIZE = 9
+LINE_HEIGHT = 5.5
+LIST_INDENT = 6
+
+HEADING_RE = re.compile(r"^(#{1,6})\s+(.*)$")
+BULLET_RE = re.compile(r"^(\s*)[-*+•]\s+(.*)$")
+NUMBERED_RE = re.compile(r"^(\s*)(\d+)[.)]\s+(.*)$")
+RULE_RE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+# One alternation for all inline markup: **bold**, *italic*/_italic_, `code`, [text](url)
+INLINE_RE = re.compile(
+    r"\*\*(?P<bold>.+?)\*\*"
+    r"|(?<![\w*])\*(?P<italic>[^*\s][^*]*?)\*(?!\*)"
+    r"|(?<!\w)_(?P<underscore>[^_\s][^_]*?)_(?!\w)"
+    r"|`(?P<code>[^`]+)`"
+    r"|\[(?P<link_text>[^\]]+)\]\((?P<link_url>[^)\s]+)\)"
+)
+
+# Words with their leading whitespace, so wrapping can drop it at line starts
+WORD_RE = re.compile(r"\s*\S+|\s+$")
+
+# Used only with the Latin-1 core fonts when no Unicode font is installed
+LATIN1_FALLBACKS = str.maketrans({
+    "•": "-", "●": "-", "◦": "-", "‣": "-", "⁃": "-", "–": "-", "—": "-",
+    "‘": "'", "’": "'", "“": '"', "”": '"', "…": "...",
+})
+
+
+@dataclass
+class Block:
+    kind: str  # heading, paragraph, bullet, numbered, code, rule
+    text: str = ""
+    level: int = 0
+    marker: str = ""
+    lines: list[str] = field(default_factory=list)
+
+
+def tokenize_markdown(lines: Iterable[str]) -> Iterator[Block]:
+    """Turn markdown lines into blocks in a single pass."""
+    paragraph: list[str] = []
+    code: list[str] | None = None
+
+    for raw_line in lines:
+        line = raw_line.rstrip("\r\n")
+
+        if code is not None:
+            if line.lstrip().startswith("```"):
+                yield Block("code", lines=code)
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if paragraph:
+                yield Block("paragraph", text=" ".join(paragraph))
+                paragraph = []
+            code = []
+            continue
+
+        if not stripped:
+            if paragraph:
+                yield Block("paragraph", text=" ".join(paragraph))
+                paragraph = []
+            continue
+
+        if RULE_RE.match(line):
+            block = Block("rule")
+        elif match := HEADING_RE.match(stripped):
+            block = Block("heading", text=match.group(2).strip().rstrip("#").strip(), level=len(match.group(1)))
+        elif match := BULLET_RE.match(line):
+            block = Block("bullet", text=match.group(2), level=len(match.group(1).expandtabs(4)) // 2)
+        elif match := NUMBERED_RE.match(line):
+            block = Block("numbered", text=match.group(3), level=len(match.group(1).expandtabs(4)) // 2, marker=f"{match.group(2)}.")
+        else:
+            paragraph.append(stripped)
+            continue
+
+        if paragraph:
+            yield Block("paragraph", text=" ".join(paragraph))
+            paragraph = []
+        yield block
+
+    if code is not None:
+        yield Block("code", lines=code)
+    if paragraph:
+        yield Block("paragraph", text=" ".join(paragraph))
+
+
+def inline_runs(text: str) -> Iterator[tuple[str, str]]:
+    """Split text into (style, text) runs, where style is "", "B", "I" or "code"."""
+    position = 0
+    for match in INLINE_RE.finditer(text):
+        if match.start() > position:
+            yield "", text[position:match.start()]
+        if match.group("bold") is not None:
+            yield "B", match.group("bold")
+        elif match.group("italic") is not None:
+            yield "I", match.group("italic")
+        elif match.group("underscore") is not None:
+            yield "I", match.group("underscore")
+        elif match.group("code") is not None:
+            yield "code", match.group("code")
+        else:
+            yield "", f"{match.group('link_text')} ({match.group('link_url')})"
+        position = match.end()
+    if position < len(text):
+        yield "", text[position:]
+
+
+@lru_cache(maxsize=1)
+def find_unicode_fonts() -> dict[str, str]:
+    """Locate DejaVu TTF files once per process (PDF_FONT_DIR overrides the search)."""
+    search_dirs = [os.getenv("PDF_FONT_DIR")] if os.getenv("PDF_FONT_DIR") else FONT_SEARCH_DIRS
+    for directory in search_dirs:
+        available = {style: Path(directory) / name for style, name in FONT_FILES.items()}
+        available = {style: str(path) for style, path in available.items() if path.exists()}
+        if "" in available:
+            return {
+                style: next(available[candidate] for candidate in chain if candidate in available)
+                for style, chain in FONT_FALLBACKS.items()
+            }
+    return {}
+
+
+class MarkdownPDF(FPDF):
+    def __init__(self, title: str):
+        super().__init__()
+        self.set_title(title)
+        self.set_auto_page_break(auto=True, margin=15)
+        fonts = find_unicode_fonts()
+        if fonts:
+            for style in ("", "B", "I", "BI"):
+                self.add_font("DocSans", style, fonts[style])
+            self.add_font("DocMono", "", fonts["mono"])
+            self.body_family, self.mono_family, self.unicode = "DocSans", "DocMono", True
+        else:
+            self.body_family, self.mono_family, self.unicode = "Helvetica", "Courier", False
+        self._widths: dict[tuple, float] = {}
+
+    def clean(self, text: str) -> str:
+        if self.unicode:
+            return text
+        return text.translate(LATIN1_FALLBACKS).encode("latin-1", "replace").decode("latin-1")
+
+    def footer(self):
+        self.set_y(-12)
+        self.set_font(self.body_family, "", 8)
+        self.cell(0, 6, str(self.page_no()), align="C")
+
+    def text_width(self, font: tuple[str, str, int], text: str) -> float:
+        # Documents repeat the same words constantly, so widths are memoized
+        key = (font, text)
+        width = self._widths.get(key)
+        if width is None:
+            self.set_font(*font)
+            width = self._widths[key] = self.get_string_width(text)
+        return width
+
+    def fitting_prefix(self, font: tuple[str, str, int], word: str, available: float) -> str:
+        """The longest start of ``word`` that fits in ``available`` (at least one character)."""
+        self.set_font(*font)
+        low, high = 1, len(word)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if self.get_string_width(word[:middle]) <= available:
+                low = middle
+            else:
+                high = middle - 1
+        return word[:low]
+
+    def write_runs(self, text: str, size: int = BODY_SIZE):
+        """Lay out inline runs with greedy word wrapping, one cell per font change per line."""
+        right = self.w - self.r_margin
+        line: list[tuple[tuple[str, str, int], str]] = []
+        x = self.get_x()
+
+        def flush():
+            for font, segment in line:
+                self.set_font(*font)
+                self.cell(self.text_width(font, segment), LINE_HEIGHT, segment)
+            line.clear()
+            self.ln(LINE_HEIGHT)
+
+        for style, run in inline_runs(text):
+            font = (self.mono_family, "", size - 1) if style == "code" else (self.body_family, style, size)
+            for word in WORD_RE.findall(self.clean(run)):
+                if not line and x <= self.l_margin + 0.01:
+                    word = word.lstrip()
+                    if not word:
+                        continue
+                width = self.text_width(font, word)
+                while x + width > right and word:
+                    if line:
+                        flush()
+                        x = self.get_x()
+                        word = word.lstrip()
+                    else:
+                        # Wider than a whole line: hard-break it
+                        head = self.fitting_prefix(font, word, right - x)
+                        line.append((font, head))
+                        flush()
+                        x = self.get_x()
+                        word = word[len(head):]
+                    width = self.text_width(font, word)
+                if not word:
+                    continue
+                if line and line[-1][0] == font:
+                    line[-1] = (font, line[-1][1] + word)
+                else:
+                    line.append((font, word))
+                x += width
+        flush()
+
+    def render_block(self, block: Block):
+        if block.kind == "heading":
+            self.ln(3)
+            self.set_font(self.body_family, "B", HEADING_SIZES[block.level])
+            self.multi_cell(0, HEADING_SIZES[block.level] * 0.5, self.clean(block.text), new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self.ln(1)
+        elif block.kind == "paragraph":
+            self.write_runs(block.text)
+            self.ln(2)
+        elif block.kind in ("bullet", "numbered"):
+            marker = block.marker if block.kind == "numbered" else ("•" if self.unicode else "-")
+            indent = self.l_margin + LIST_INDENT * (block.level + 1)
+            self.set_x(indent - LIST_INDENT + 1)
+            self.set_font(self.body_family, "", BODY_SIZE)
+            self.cell(LIST_INDENT - 1, LINE_HEIGHT, marker)
+            # Wrapped lines of the item align with its first line
+            left_margin = self.l_margin
+            self.set_left_margin(indent)
+            self.write_runs(block.text)
+            self.set_left_margin(left_margin)
+            self.set_x(left_margin)
+            self.ln(1)
+        elif block.kind == "code":
+            self.set_font(self.mono_family, "", CODE_SIZE)
+            self.set_fill_color(244, 244, 244)
+            self.multi_cell(0, LINE_HEIGHT - 1, self.clean("\n".join(block.lines)), fill=True, new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+            self.ln(2)
+        elif block.kind == "rule":
+            self.ln(2)
+            self.line(self.l_margin, self.get_y(), self.w - self.r_margin, self.get_y())
+            self.ln(3)
+
+
+def render_blocks(blocks: Iterable[Block], destination: str | Path, title: str, show_title: bool = False) -> Path:
+    """Render blocks to ``destination``, consuming them as they are produced.
+
+    The PDF is written to a temporary file and moved into place, so readers
+    never see a partial document.
+    """
+    destination = Path(destination)
+    destination.parent.mkdir(parents=True, exist_ok=True)
+
+    pdf = MarkdownPDF(title)
+    pdf.add_page()
+    if show_title:
+        pdf.set_font(pdf.body_family, "B", 18)
+        pdf.multi_cell(0, 10, pdf.clean(title), align="C", new_x=XPos.LMARGIN, new_y=YPos.NEXT)
+        pdf.ln(4)
+    for block in blocks:
+        pdf.render_block(block)
+
+    data = pdf.output()
+    # Unique per process and thread, so concurrent renders of one destination never share a temp file
+    with tempfile.NamedTemporaryFile(dir=destination.parent, suffix=".tmp", delete=False) as tmp:
+        tmp.write(data)
+    os.replace(tmp.name, destination)
+    return destination
+
+
+def render_markdown_file(source: str | Path, destination: str | Path, title: str | None = None) -> Path:
+    """Render a markdown file to PDF, reading the source lazily line by line."""
+    source = Path(source)
+    with source.open(encoding="utf-8") as lines:
+        return render_blocks(tokenize_markdown(lines), destination, title or source.stem.replace("_", " ").title())
+
+
+def render_markdown(markdown_content: str, destination: str | Path, title: str) -> Path:
+    return render_blocks(tokenize_markdown(markdown_content.splitlines()), destination, title, show_title=True)
@@ -0,0 +1,189 @@
+"""In-memory BM25 index over the passages of fetched pages, so only content relevant to the topic reaches the LLM."""
+from __future__ import annotations
+import os
+import re
+from collections import Counter
+from dataclasses import dataclass
+from typing import Any
+from .content_filter import estimate_tokens
+
+PASSAGE_WORDS = int(os.getenv("PASSAGE_WORDS", "120"))
+PASSAGE_TOP_K = int(os.getenv("PASSAGE_TOP_K", "24"))
+# Content smaller than this goes to the LLM whole; ranking it would save little
+PASSAGE_MIN_TOKENS = int(os.getenv("PASSAGE_MIN_TOKENS", "4000"))
+PASSAGE_TOKEN_BUDGET = int(os.getenv("PASSAGE_TOKEN_BUDGET", "12000"))
+BM25_K1 = 1.5
+BM25_B = 0.75
+# Separates the topic from the section headings in a tool's ``query``
+QUERY_SEPARATOR = ";"
+
+_WORD = re.compile(r"\w+")
+_HEADING = re.compile(r"^\s{0,3}#{1,6}\s+(.*?)\s*#*\s*$")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD.findall(text.casefold())
+
+
+@dataclass
+class Passage:
+    url: str
+    heading: str | None
+    text: str
+    # Position in the crawl: (page, passage within the page)
+    order: tuple[int, int]
+
+
+def chunk_page(url: str, content: str, page_index: int = 0, max_words: int = PASSAGE_WORDS) -> list[Passage]:
+    """Split markdown into passages of about ``max_words``, starting a new one at each heading."""
+    passages: list[Passage] = []
+    heading: str | None = None
+    parts: list[str] = []
+    words = 0
+
+    def flush():
+        nonlocal parts, words
+        if parts:
+            passages.append(Passage(url, heading, "\n\n".join(parts), (page_index, len(passages))))
+        parts, words = [], 0
+
+    for block in _PARAGRAPH_BREAK.split(content):
+        block = block.strip()
+        if not block:
+            continue
+        match = _HEADING.match(block.splitlines()[0])
+        if match:
+            flush()
+            heading = match.group(1)
+            block = "\n".join(block.splitlines()[1:]).strip()
+            if not block:
+                continue
+        block_words = block.split()
+        if len(block_words) > max_words:
+            # One oversized paragraph (often a whole page without breaks) becomes several passages
+            flush()
+            for start in range(0, len(block_words), max_words):
+                parts, words = [" ".join(block_words[start:start + max_words])], max_words
+                flush()
+            continue
+        if words + len(block_words) > max_words:
+            flush()
+        parts.append(block)
+        words += len(block_words)
+    flush()
+    return passages
+
+
+def parse_query(query: str) -> list[str]:
+    """Turn "topic; heading; heading" into the topic query followed by one query per heading."""
+    topic, *headings = [part.strip() for part in query.split(QUERY_SEPARATOR)]
+    return [topic] + [f"{topic} {heading}" for heading in headings if heading]
+
+
+class PassageIndex:
+    """BM25 over a sparse term-frequency matrix, scored with numpy.
+
+    Built per tool call, so the index only holds what that job fetched.
+    """
+
+    def __init__(self, passages: list[Passage], k1: float = BM25_K1, b: float = BM25_B):
+        import numpy as np
+
+        self.passages = passages
+        self.k1 = k1
+        self.b = b
+        self.vocabulary: dict[str, int] = {}
+        rows: list[int] = []
+        columns: list[int] = []
+        counts: list[int] = []
+        lengths: list[int] = []
+        for row, passage in enumerate(passages):
+            # Headings count as passage text, so section queries find their sections
+            tokens = tokenize(f"{passage.heading or ''} {passage.text}")
+            lengths.append(len(tokens))
+            for term, count in Counter(tokens).items():
+                rows.append(row)
+                columns.append(self.vocabulary.setdefault(term, len(self.vocabulary)))
+                counts.append(count)
+
+        # Coordinate form of the passage x term matrix; only nonzero entries are stored
+        self._rows = np.asarray(rows, dtype=np.int64)
+        self._columns = np.asarray(columns, dtype=np.int64)
+        self._counts = np.asarray(counts, dtype=np.float64)
+        self._lengths = np.asarray(lengths, dtype=np.float64)
+        document_frequency = np.bincount(self._columns, minlength=len(self.vocabulary))
+        total = len(passages)
+        self._idf = np.log(1 + (total - document_frequency + 0.5) / (document_frequency + 0.5))
+        self._average_length = float(self._lengths.mean()) if total else 0.0
+
+    def scores(self, query: str):
+        import numpy as np
+
+        terms = [self.vocabulary[term] for term in set(tokenize(query)) if term in self.vocabulary]
+        if not terms:
+            return np.zeros(len(self.passages))
+        mask = np.isin(self._columns, terms)
+        rows, columns, tf = self._rows[mask], self._columns[mask], self._counts[mask]
+        norm = self.k1 * (1 - self.b + self.b * self._lengths[rows] / max(self._average_length, 1.0))
+        weights = self._idf[columns] * tf * (self.k1 + 1) / (tf + norm)
+        return np.bincount(rows, weights=weights, minlength=len(self.passages))
+
+    def search(self, query: str, k: int) -> list[int]:
+        """Indexes of the ``k`` best passages for ``query``, best first, leaving out non-matches."""
+        import numpy as np
+
+        scores = self.scores(query)
+        ranked = np.argsort(-scores, kind="stable")[:k]
+        return [int(index) for index in ranked if scores[index] > 0]
+
+    def select(self, query: str, k: int = PASSAGE_TOP_K, token_budget: int | None = None) -> list[Passage]:
+        """Top passages for the topic and each section heading in ``query``, in crawl order.
+
+        The queries take turns, so every section gets some of its best passages
+        before any gets its weaker ones.
+        """
+        rankings = [self.search(part, k) for part in parse_query(query)]
+        chosen: dict[int, None] = {}
+        tokens = 0
+        for rank in range(k):
+            for ranking in rankings:
+                if rank >= len(ranking) or ranking[rank] in chosen or len(chosen) >= k:
+                    continue
+                size = estimate_tokens(self.passages[ranking[rank]].text)
+                if token_budget is not None and chosen and tokens + size > token_budget:
+                    continue
+                chosen[ranking[rank]] = None
+                tokens += size
+        return sorted((self.passages[index] for index in chosen), key=lambda passage: passage.order)
+
+
+def index_pages(pages: list[dict[str, Any]]) -> PassageIndex:
+    passages = []
+    for page_index, page in enumerate(pages):
+        passages.extend(chunk_page(page.get("url", "N/A"), page.get("raw_content") or "", page_index))
+    return PassageIndex(passages)
+
+
+def wants_ranking(pages: list[dict[str, Any]], query: str | None) -> bool:
+    return bool(query and query.strip()) and sum(estimate_tokens(page.get("raw_content") or "") for page in pages) >= PASSAGE_MIN_TOKENS
+
+
+def relevant_pages(pages: list[dict[str, Any]], query: str, k: int = PASSAGE_TOP_K,
+                   token_budget: int | None = PASSAGE_TOKEN_BUDGET) -> list[dict[str, Any]]:
+    """``pages`` with each ``raw_content`` cut down to its passages selected for ``query``.
+
+    Pages without a selected passage are left out, so nothing is returned when
+    no passage matches the query at all.
+    """
+    selected: dict[int, list[str]] = {}
+    previous: Passage | None = None
+    for passage in index_pages(pages).select(query, k, token_budget):
+        parts = selected.setdefault(passage.order[0], [])
+        # Repeat a heading only where its section resumes after a gap
+        adjacent = previous is not None and previous.order == (passage.order[0], passage.order[1] - 1)
+        if passage.heading and not (adjacent and previous.heading == passage.heading):
+            parts.append(f"## {passage.heading}")
+        parts.append(passage.text)
+        previous = passage
+    return [{**pages[page_index], "raw_content": "\n\n".join(parts)} for page_index, parts in selected.items()]
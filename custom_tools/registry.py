@@ -4,6 +4,7 @@ from portia import ToolRegistry
 from .extract_tool import ExtractTool
 from .crawl_tool import CrawlTool
 from .file_writer_tool import file_writer_tool
+from .pdf_generator_tool import pdf_generator_tool
 
 # Create instances of the tools
 extract_tool = ExtractTool()
@@ -14,4 +15,5 @@ custom_tool_registry = ToolRegistry([
     extract_tool,
     crawl_tool,
     file_writer_tool(),
+    pdf_generator_tool(),
 ])
\ No newline at end of file
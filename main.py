@@ -1,11 +1,43 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
-from routes import auth_routes, gmail_routes, document_routes
+from routes import auth_routes, gmail_routes, document_routes, job_routes
+from services.admission import AdmissionRejected, admission
+from services.docs_sweeper import get_docs_sweeper
+from services.download_service import download_service
+from services.email_writer import email_writer
+from services.executor import executor_stats, shutdown_executors
+from services.http_client import http_clients
+from services.job_service import cancel_jobs, recover_jobs
+from services.key_validator import key_validator
+from services.metrics import METRICS_CONTENT_TYPE, METRICS_ENABLED, Gauge, metrics_authorized, MetricsMiddleware, registry, render_metrics
+from services.plan_cache import plan_cache
+from services.portia_factory import portia_factory
+from services.profiling import PROFILING_ENABLED, ProfilingMiddleware, profiler
+from services.token_cache import token_cache
+from services.render_service import render_service
+from services.shared_state import get_shared_state, worker_count
+from services.warmup import warmup
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    recover_jobs()
+    # Heavy imports and pools are built in the background; /health answers meanwhile
+    warmup.start()
+    await get_docs_sweeper().start()
+    yield
+    await warmup.stop()
+    await get_docs_sweeper().stop()
+    await cancel_jobs()
+    shutdown_executors()
+    await http_clients.aclose()
 
 app = FastAPI(
     title="Portia AI Backend",
     description="JWT-based Portia AI services with Gmail integration",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 app.add_middleware(
@@ -16,17 +48,72 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+if METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
+registry.register(Gauge(
+    "executor_pending", "Jobs queued or running in each worker pool.", ("pool",),
+    callback=lambda: {(stats["name"],): stats["pending"] for stats in executor_stats()},
+))
+registry.register(Gauge(
+    "admission_slots", "Plan runs admitted and waiting for a slot.", ("state",),
+    callback=lambda: {("active",): admission.stats()["active"], ("queued",): admission.stats()["queued"]},
+))
+
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
 app.include_router(auth_routes.router, prefix="/auth", tags=["auth"])
 app.include_router(gmail_routes.router, prefix="/api", tags=["gmail"])
 app.include_router(document_routes.router, prefix="/api", tags=["documents"])
+app.include_router(job_routes.router, prefix="/api", tags=["jobs"])
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy", "service": "portia-backend"}
+    return {
+        "status": "healthy",
+        "service": "portia-backend",
+        "portia_setup": portia_factory.stats(),
+        "plan_cache": plan_cache.stats(),
+        "http": http_clients.stats(),
+        "key_validation": key_validator.stats(),
+        "token_cache": token_cache.stats(),
+        "render": render_service.stats(),
+        "docs_sweeper": get_docs_sweeper().stats(),
+        "downloads": download_service.stats(),
+        "email_bodies": email_writer.stats(),
+        "admission": admission.stats(),
+        "profiling": profiler.stats(),
+        "warmup": warmup.stats(),
+        "shared_state": shared.stats() if (shared := get_shared_state()) is not None else {"enabled": False},
+    }
+
+if METRICS_ENABLED:
+    @app.get("/metrics")
+    async def metrics(request: Request):
+        if not metrics_authorized(request.headers.get("authorization", "")):
+            return JSONResponse(status_code=401, content={"detail": "Invalid metrics token"})
+        return Response(render_metrics(), media_type=METRICS_CONTENT_TYPE)
 
 if __name__ == "__main__":
     import uvicorn
     import os
     
     port = int(os.environ.get("PORT", 8000))
-    uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
+    # One worker per core unless WEB_CONCURRENCY gives a count
+    workers = worker_count(os.environ.get("WEB_CONCURRENCY") or "auto")
+    if workers > 1:
+        # Workers re-import this module and size shared state from WEB_CONCURRENCY;
+        # "auto" makes them resolve the same count when it was not set
+        os.environ.setdefault("WEB_CONCURRENCY", "auto")
+        uvicorn.run("main:app", host="0.0.0.0", port=port, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=port)
\ No newline at end of file
@@ -16,4 +16,17 @@ class GenerateDocumentResponse(BaseModel):
     needs_authentication: bool = False
     oauth_url: Optional[str] = None
     needs_input: bool = False
-    file_path: Optional[str] = None
\ No newline at end of file
+    file_path: Optional[str] = None
+
+    @classmethod
+    def from_result(cls, result: dict) -> "GenerateDocumentResponse":
+        return cls(
+            success=result["success"],
+            result=result.get("result"),
+            error=result.get("error"),
+            user_id=result["user_id"],
+            needs_authentication=result.get("needs_oauth", False),
+            oauth_url=result.get("oauth_url"),
+            needs_input=result.get("needs_input", False),
+            file_path=result.get("file_path")
+        )
\ No newline at end of file
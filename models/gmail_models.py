@@ -1,5 +1,6 @@
-from pydantic import BaseModel, EmailStr
-from typing import Optional
+from pydantic import BaseModel, EmailStr, model_validator
+from typing import List, Optional
+import os
 
 class SendEmailRequest(BaseModel):
     to: EmailStr
@@ -18,4 +19,40 @@ class SendEmailResponse(BaseModel):
     service: str = "gmail"
     action: str = "send_email"
     needs_authentication: bool = False
-    oauth_url: Optional[str] = None
\ No newline at end of file
+    oauth_url: Optional[str] = None
+
+BULK_EMAIL_MAX_RECIPIENTS = int(os.getenv("BULK_EMAIL_MAX_RECIPIENTS", "500"))
+
+class BatchEmailRequest(BaseModel):
+    # Either one subject for many recipients, or explicit recipient/subject pairs
+    recipients: List[EmailStr] = []
+    subject: Optional[str] = None
+    messages: List[AutomatedEmailRequest] = []
+
+    @model_validator(mode="after")
+    def check_recipients(self) -> "BatchEmailRequest":
+        if self.recipients and not self.subject:
+            raise ValueError("subject is required when recipients are given")
+        total = len(self.recipients) + len(self.messages)
+        if total == 0:
+            raise ValueError("at least one recipient or message is required")
+        if total > BULK_EMAIL_MAX_RECIPIENTS:
+            raise ValueError(f"at most {BULK_EMAIL_MAX_RECIPIENTS} emails per batch")
+        return self
+
+    def to_requests(self) -> List[AutomatedEmailRequest]:
+        return [AutomatedEmailRequest(to=to, subject=self.subject) for to in self.recipients] + list(self.messages)
+
+class BatchEmailResult(SendEmailResponse):
+    to: str
+    subject: str
+    skipped: bool = False
+
+class BatchEmailResponse(BaseModel):
+    success: bool
+    user_id: str
+    total: int
+    sent: int
+    failed: int
+    skipped: int
+    results: List[BatchEmailResult]
@@ -0,0 +1,18 @@
+from pydantic import BaseModel
+from typing import Optional
+from models.document_models import GenerateDocumentResponse
+
+class JobSubmitResponse(BaseModel):
+    job_id: str
+    status: str
+    user_id: str
+
+class JobStatusResponse(BaseModel):
+    job_id: str
+    status: str
+    kind: str
+    user_id: str
+    created_at: str
+    updated_at: str
+    result: Optional[GenerateDocumentResponse] = None
+    error: Optional[str] = None
@@ -22,6 +22,16 @@ async def login(request: LoginRequest):
             detail=f"Login failed: {str(e)}"
         )
 
+@router.post("/logout")
+async def logout(credentials: HTTPAuthorizationCredentials = Depends(security)):
+    if not AuthService.revoke_token(credentials.credentials):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Invalid token",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    return {"message": "Logged out"}
+
 def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
     token_data = AuthService.verify_token(credentials.credentials)
     if token_data is None:
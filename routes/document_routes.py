@@ -1,80 +1,80 @@
-from fastapi import APIRouter, Depends
-from fastapi.responses import FileResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from models.document_models import GenerateDocumentRequest, GenerateDocumentResponse
 from services.document_service import DocumentService
+from services.docs_sweeper import get_docs_sweeper
+from services.download_service import download_service
+from services.executor import ClientDisconnectedError, QueueFullError
+from services.progress import SSE_HEADERS, ProgressChannel
+from services.admission import admission, admission_key
+from starlette.background import BackgroundTask
 from routes.auth_routes import get_current_user
-import os
-from pathlib import Path
-from datetime import datetime, timedelta
+import asyncio
 
 router = APIRouter()
 
-def cleanup_old_files():
-    """Delete files older than 24 hours"""
-    docs_dir = Path("docs")
-    if not docs_dir.exists():
-        return
-    
-    cutoff_time = datetime.now() - timedelta(hours=24)
-    deleted_count = 0
-    
-    for file_path in docs_dir.iterdir():
-        if file_path.is_file():
-            file_time = datetime.fromtimestamp(file_path.stat().st_mtime)
-            if file_time < cutoff_time:
-                try:
-                    file_path.unlink()  # Delete file
-                    deleted_count += 1
-                except Exception as e:
-                    print(f"Error deleting {file_path}: {e}")
-    
-    if deleted_count > 0:
-        print(f"Cleaned up {deleted_count} old files from docs directory")
-
 @router.post("/generate-docs", response_model=GenerateDocumentResponse)
 async def generate_documentation(
     request: GenerateDocumentRequest, 
+    http_request: Request,
     token_data: dict = Depends(get_current_user)
 ):
-    # Clean up old files before generating new ones
-    cleanup_old_files()
+    service = DocumentService(token_data["openai_api_key"], token_data["user_id"])
+    try:
+        async with admission.admit(admission_key(token_data["openai_api_key"])):
+            result = await service.generate_documentation(
+                topic=request.topic,
+                urls=request.urls,
+                output_format=request.output_format,
+                is_disconnected=http_request.is_disconnected
+            )
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
     
+    return GenerateDocumentResponse.from_result(result)
+
+@router.post("/generate-docs/stream")
+async def stream_documentation(
+    request: GenerateDocumentRequest,
+    http_request: Request,
+    token_data: dict = Depends(get_current_user)
+):
+    """Generate documentation, streaming plan progress as Server-Sent Events."""
     service = DocumentService(token_data["openai_api_key"], token_data["user_id"])
-    result = await service.generate_documentation(
+    ticket = await admission.acquire(admission_key(token_data["openai_api_key"]))
+    progress = ProgressChannel()
+    job = admission.hold(ticket, service.generate_documentation(
         topic=request.topic,
         urls=request.urls,
-        output_format=request.output_format
-    )
-    
-    return GenerateDocumentResponse(
-        success=result["success"],
-        result=result.get("result"),
-        error=result.get("error"),
-        user_id=result["user_id"],
-        needs_authentication=result.get("needs_oauth", False),
-        oauth_url=result.get("oauth_url"),
-        needs_input=result.get("needs_input", False),
-        file_path=result.get("file_path")
+        output_format=request.output_format,
+        is_disconnected=http_request.is_disconnected,
+        progress=progress
+    ))
+    return StreamingResponse(
+        progress.stream(job, lambda result: GenerateDocumentResponse.from_result(result).model_dump()),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        # Frees the slot even if the stream never started
+        background=BackgroundTask(ticket.release)
     )
 
 @router.get("/download-docs/{filename}")
 async def download_documentation(
     filename: str,
+    request: Request,
     token_data: dict = Depends(get_current_user)
 ):
-    file_path = Path("docs") / filename
+    file_path = download_service.resolve(token_data["user_id"], filename)
     
-    if not file_path.exists():
-        return {"error": "File not found or expired"}
+    if file_path is None:
+        return JSONResponse(status_code=status.HTTP_404_NOT_FOUND, content={"error": "File not found or expired"})
     
-    return FileResponse(
-        path=str(file_path),
-        filename=filename,
-        media_type='application/octet-stream'
-    )
+    return await download_service.file_response(file_path, request)
 
 @router.post("/cleanup-docs")
 async def manual_cleanup(token_data: dict = Depends(get_current_user)):
     """Manual cleanup endpoint for testing/admin use"""
-    cleanup_old_files()
-    return {"message": "Cleanup completed"}
\ No newline at end of file
+    deleted = await asyncio.to_thread(get_docs_sweeper().sweep)
+    return {"message": "Cleanup completed", "deleted": deleted}
\ No newline at end of file
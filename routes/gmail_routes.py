@@ -1,11 +1,48 @@
-from fastapi import APIRouter, Depends
-from models.gmail_models import SendEmailRequest, SendEmailResponse,AutomatedEmailRequest
+from fastapi import APIRouter, Depends, HTTPException, Request, status
+from fastapi.responses import StreamingResponse
+from models.gmail_models import SendEmailRequest, SendEmailResponse,AutomatedEmailRequest, BatchEmailRequest, BatchEmailResponse
 from services.gmail_service import GmailService
+from services.executor import ClientDisconnectedError, QueueFullError
+from services.progress import SSE_HEADERS, ProgressChannel
+from services.admission import admission, admission_key
+from starlette.background import BackgroundTask
 from routes.auth_routes import get_current_user
 
 router = APIRouter()
 
 @router.post("/send-email", response_model=SendEmailResponse)
-async def send_email(request: AutomatedEmailRequest, token_data: dict = Depends(get_current_user)):
+async def send_email(request: AutomatedEmailRequest, http_request: Request, token_data: dict = Depends(get_current_user)):
     service = GmailService(token_data["openai_api_key"], token_data["user_id"])
-    return await service.send_automated_email(request)
\ No newline at end of file
+    try:
+        async with admission.admit(admission_key(token_data["openai_api_key"])):
+            return await service.send_automated_email(request, is_disconnected=http_request.is_disconnected)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+
+@router.post("/send-email/batch", response_model=BatchEmailResponse)
+async def send_email_batch(request: BatchEmailRequest, http_request: Request, token_data: dict = Depends(get_current_user)):
+    service = GmailService(token_data["openai_api_key"], token_data["user_id"])
+    try:
+        # A batch takes one slot; its own fan-out is capped by BULK_EMAIL_CONCURRENCY
+        async with admission.admit(admission_key(token_data["openai_api_key"])):
+            return await service.send_batch(request, is_disconnected=http_request.is_disconnected)
+    except QueueFullError as e:
+        raise HTTPException(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, detail=str(e))
+    except ClientDisconnectedError as e:
+        raise HTTPException(status_code=499, detail=str(e))
+
+@router.post("/send-email/stream")
+async def stream_email(request: AutomatedEmailRequest, http_request: Request, token_data: dict = Depends(get_current_user)):
+    """Send an email, streaming plan progress as Server-Sent Events."""
+    service = GmailService(token_data["openai_api_key"], token_data["user_id"])
+    ticket = await admission.acquire(admission_key(token_data["openai_api_key"]))
+    progress = ProgressChannel()
+    job = admission.hold(ticket, service.send_automated_email(request, is_disconnected=http_request.is_disconnected, progress=progress))
+    return StreamingResponse(
+        progress.stream(job, lambda response: response.model_dump()),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS,
+        background=BackgroundTask(ticket.release)
+    )
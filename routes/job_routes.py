@@ -0,0 +1,32 @@
+from fastapi import APIRouter, Depends, HTTPException, status
+from models.document_models import GenerateDocumentRequest, GenerateDocumentResponse
+from models.job_models import JobStatusResponse, JobSubmitResponse
+from services.job_service import JobService
+from routes.auth_routes import get_current_user
+
+router = APIRouter()
+
+@router.post("/generate-docs/jobs", response_model=JobSubmitResponse, status_code=status.HTTP_202_ACCEPTED)
+async def submit_documentation_job(
+    request: GenerateDocumentRequest,
+    token_data: dict = Depends(get_current_user)
+):
+    job = await JobService.submit_documentation_job(request, token_data["openai_api_key"], token_data["user_id"])
+    return JobSubmitResponse(job_id=job["id"], status=job["status"], user_id=job["user_id"])
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, token_data: dict = Depends(get_current_user)):
+    job = await JobService.get_job(job_id, token_data["user_id"])
+    if job is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Job not found")
+
+    return JobStatusResponse(
+        job_id=job["id"],
+        status=job["status"],
+        kind=job["kind"],
+        user_id=job["user_id"],
+        created_at=job["created_at"],
+        updated_at=job["updated_at"],
+        result=GenerateDocumentResponse.from_result(job["result"]) if job["result"] else None,
+        error=job["error"]
+    )
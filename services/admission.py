@@ -0,0 +1,330 @@
+"""Per-user and global admission control for plan runs, with a bounded wait queue."""
+import asyncio
+import math
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from services.key_validator import key_validator
+from services.shared_state import get_shared_state
+
+ADMISSION_GLOBAL_LIMIT = int(os.getenv("ADMISSION_GLOBAL_LIMIT", "16"))
+ADMISSION_PER_USER_LIMIT = int(os.getenv("ADMISSION_PER_USER_LIMIT", "2"))
+ADMISSION_QUEUE_DEPTH = int(os.getenv("ADMISSION_QUEUE_DEPTH", "32"))
+ADMISSION_PER_USER_QUEUE = int(os.getenv("ADMISSION_PER_USER_QUEUE", "4"))
+ADMISSION_MAX_WAIT_SECONDS = float(os.getenv("ADMISSION_MAX_WAIT_SECONDS", "30"))
+ADMISSION_MAX_PENDING_JOBS = int(os.getenv("ADMISSION_MAX_PENDING_JOBS", "10"))
+# With shared state, waiters re-check this often for slots freed by other workers
+ADMISSION_SHARED_POLL_SECONDS = float(os.getenv("ADMISSION_SHARED_POLL_SECONDS", "0.25"))
+# Seed for the average run time used in Retry-After, until real runs are measured
+INITIAL_HOLD_SECONDS = 10.0
+
+
+def admission_key(openai_api_key: str) -> str:
+    """The identity per-user limits count against.
+
+    Every login mints a new JWT user_id, so limits keyed on it could be dodged by
+    logging in again; the API key stays the same.
+    """
+    return key_validator.key_digest(openai_api_key)
+
+
+async def _shared_call(fn, *args, undo):
+    """Run a shared store call on a worker thread, as its transaction can wait on other workers.
+
+    If the caller is cancelled the call still completes; a lease it took is then
+    given back with ``undo``.
+    """
+    task = asyncio.ensure_future(asyncio.to_thread(fn, *args))
+    try:
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        def give_back(done: asyncio.Task):
+            if not done.cancelled() and done.exception() is None and done.result() is not None:
+                asyncio.ensure_future(asyncio.to_thread(undo, done.result()))
+
+        task.add_done_callback(give_back)
+        raise
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted; maps to 429 with Retry-After."""
+
+    def __init__(self, message: str, retry_after: int):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+@dataclass
+class _Waiter:
+    user_id: str
+    future: asyncio.Future
+    background: bool
+    queued_at: float = field(default_factory=time.monotonic)
+
+
+class AdmissionTicket:
+    """A granted slot; ``release`` may be called more than once."""
+
+    def __init__(self, controller: "AdmissionController", user_id: str, lease_id: str | None = None):
+        self._controller = controller
+        self.user_id = user_id
+        self.lease_id = lease_id
+        self.started = time.monotonic()
+        self.released = False
+        self._loop = asyncio.get_running_loop()
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            try:
+                on_loop = asyncio.get_running_loop() is self._loop
+            except RuntimeError:
+                on_loop = False
+            if on_loop:
+                self._controller._release(self)
+            else:
+                # Starlette runs sync background tasks in its thread pool
+                self._loop.call_soon_threadsafe(self._controller._release, self)
+
+
+class AdmissionController:
+    """Admits work while the user and the process are under their limits.
+
+    With several workers the limits are held in the shared state store, so
+    they apply to the whole host rather than to each worker.
+
+    Requests over a limit wait in a FIFO queue; when the queue (overall or for
+    that user) is full, or the wait is too long, they are rejected straight
+    away so clients can back off. Background jobs may wait without counting
+    against the interactive queue.
+    """
+
+    def __init__(self, global_limit: int = ADMISSION_GLOBAL_LIMIT, per_user_limit: int = ADMISSION_PER_USER_LIMIT,
+                 queue_depth: int = ADMISSION_QUEUE_DEPTH, per_user_queue: int = ADMISSION_PER_USER_QUEUE):
+        self.global_limit = global_limit
+        self.per_user_limit = per_user_limit
+        self.queue_depth = queue_depth
+        self.per_user_queue = per_user_queue
+        self._active: Counter[str] = Counter()
+        self._active_total = 0
+        self._waiters: deque[_Waiter] = deque()
+        self._queued: Counter[str] = Counter()
+        self._queued_total = 0
+        self._pending_jobs: Counter[str] = Counter()
+        self._hold_seconds = INITIAL_HOLD_SECONDS
+        self.admitted = 0
+        self.waited = 0
+        self.wait_seconds = 0.0
+        self.max_queue_seen = 0
+        self.rejected: Counter[str] = Counter()
+        self._dispatching = False
+        self._dispatch_again = False
+        # Strong references to scheduled dispatches, so they are not garbage collected mid-flight
+        self._tasks: set[asyncio.Task] = set()
+
+    def _can_run(self, user_id: str) -> bool:
+        return self._active_total < self.global_limit and self._active[user_id] < self.per_user_limit
+
+    def retry_after(self) -> int:
+        # Time for the work ahead of a new request to drain through the global slots
+        backlog = len(self._waiters) + 1
+        return max(1, math.ceil(self._hold_seconds * backlog / max(self.global_limit, 1)))
+
+    def _reject(self, reason: str, message: str):
+        self.rejected[reason] += 1
+        raise AdmissionRejected(message, self.retry_after())
+
+    def _take(self, user_id: str):
+        self._active[user_id] += 1
+        self._active_total += 1
+
+    def _untake(self, user_id: str):
+        self._active[user_id] -= 1
+        self._active_total -= 1
+        if not self._active[user_id]:
+            del self._active[user_id]
+
+    async def _try_grant(self, user_id: str) -> AdmissionTicket | None:
+        if not self._can_run(user_id):
+            return None
+        # Counted here before the store is asked, so grants awaiting it cannot overshoot the local limits
+        self._take(user_id)
+        lease_id = None
+        shared = get_shared_state()
+        if shared is not None:
+            try:
+                lease_id = await _shared_call(
+                    shared.acquire_lease, "run", user_id, self.global_limit, self.per_user_limit,
+                    undo=shared.release_lease,
+                )
+            except BaseException:
+                self._untake(user_id)
+                raise
+            if lease_id is None:
+                self._untake(user_id)
+                return None
+        self.admitted += 1
+        return AdmissionTicket(self, user_id, lease_id)
+
+    async def acquire(self, user_id: str, max_wait: float = ADMISSION_MAX_WAIT_SECONDS, background: bool = False) -> AdmissionTicket:
+        ticket = await self._try_grant(user_id)
+        if ticket is not None:
+            return ticket
+
+        if not background:
+            if self._queued[user_id] >= self.per_user_queue:
+                self._reject("user_queue_full", "Too many requests in progress for this user")
+            if self._queued_total >= self.queue_depth:
+                self._reject("queue_full", "Server is busy, try again later")
+
+        waiter = _Waiter(user_id, asyncio.get_running_loop().create_future(), background)
+        self._waiters.append(waiter)
+        if not background:
+            self._queued[user_id] += 1
+            self._queued_total += 1
+            self.max_queue_seen = max(self.max_queue_seen, self._queued_total)
+
+        deadline = waiter.queued_at + max_wait
+        shared = get_shared_state() is not None
+        try:
+            while not waiter.future.done():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._dequeue(waiter)
+                    self._reject("timeout", "Timed out waiting for capacity")
+                try:
+                    await asyncio.wait_for(
+                        asyncio.shield(waiter.future), min(remaining, ADMISSION_SHARED_POLL_SECONDS) if shared else remaining
+                    )
+                except asyncio.TimeoutError:
+                    if shared:
+                        # Releases in other workers do not wake this one
+                        self._dispatch_soon()
+        except asyncio.CancelledError:
+            if waiter.future.done():
+                waiter.future.result().release()
+            else:
+                self._dequeue(waiter)
+            raise
+
+        self.waited += 1
+        self.wait_seconds += time.monotonic() - waiter.queued_at
+        return waiter.future.result()
+
+    def _dequeue(self, waiter: _Waiter):
+        self._waiters.remove(waiter)
+        if not waiter.background:
+            self._queued[waiter.user_id] -= 1
+            self._queued_total -= 1
+            if not self._queued[waiter.user_id]:
+                del self._queued[waiter.user_id]
+
+    def _release(self, ticket: AdmissionTicket):
+        self._untake(ticket.user_id)
+        self._hold_seconds = 0.8 * self._hold_seconds + 0.2 * (time.monotonic() - ticket.started)
+        self._dispatch_soon(ticket.lease_id)
+
+    def _dispatch_soon(self, released_lease: str | None = None):
+        """Hand freed slots to waiters in a task, so callers never wait on the shared store."""
+        task = asyncio.get_running_loop().create_task(self._dispatch(released_lease))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _dispatch(self, released_lease: str | None = None):
+        if released_lease is not None:
+            await asyncio.to_thread(get_shared_state().release_lease, released_lease)
+        if self._dispatching:
+            # The running dispatch goes round again rather than two asking the store at once
+            self._dispatch_again = True
+            return
+        self._dispatching = True
+        try:
+            while True:
+                self._dispatch_again = False
+                # Oldest first, skipping waiters whose user is still at their own limit
+                for waiter in list(self._waiters):
+                    if self._active_total >= self.global_limit:
+                        break
+                    if waiter not in self._waiters:
+                        continue
+                    ticket = await self._try_grant(waiter.user_id)
+                    if ticket is None:
+                        continue
+                    if waiter not in self._waiters:
+                        # Timed out or cancelled while the shared store was asked
+                        ticket.release()
+                        continue
+                    self._dequeue(waiter)
+                    waiter.future.set_result(ticket)
+                if not self._dispatch_again:
+                    break
+        finally:
+            self._dispatching = False
+
+    @asynccontextmanager
+    async def admit(self, user_id: str, **kwargs):
+        ticket = await self.acquire(user_id, **kwargs)
+        try:
+            yield ticket
+        finally:
+            ticket.release()
+
+    async def hold(self, ticket: AdmissionTicket, job):
+        """Await ``job`` and release ``ticket`` afterwards (for streamed responses)."""
+        try:
+            return await job
+        finally:
+            ticket.release()
+
+    async def reserve_job(self, user_id: str):
+        """Count a background job against the user's pending job limit."""
+        if self._pending_jobs[user_id] >= ADMISSION_MAX_PENDING_JOBS:
+            self._reject("jobs_full", "Too many pending jobs for this user")
+        self._pending_jobs[user_id] += 1
+        shared = get_shared_state()
+        if shared is not None:
+            try:
+                lease_id = await _shared_call(
+                    shared.acquire_lease, "job", user_id, None, ADMISSION_MAX_PENDING_JOBS, undo=shared.release_lease
+                )
+            except BaseException:
+                self._finish_local_job(user_id)
+                raise
+            if lease_id is None:
+                self._finish_local_job(user_id)
+                self._reject("jobs_full", "Too many pending jobs for this user")
+
+    async def finish_job(self, user_id: str):
+        shared = get_shared_state()
+        if shared is not None:
+            await asyncio.to_thread(shared.release_user_lease, "job", user_id)
+        self._finish_local_job(user_id)
+
+    def _finish_local_job(self, user_id: str):
+        self._pending_jobs[user_id] -= 1
+        if not self._pending_jobs[user_id]:
+            del self._pending_jobs[user_id]
+
+    def stats(self) -> dict:
+        return {
+            "global_limit": self.global_limit,
+            "per_user_limit": self.per_user_limit,
+            "queue_depth_limit": self.queue_depth,
+            "active": self._active_total,
+            "active_users": len(self._active),
+            "queued": self._queued_total,
+            "queued_background": len(self._waiters) - self._queued_total,
+            "max_queue_seen": self.max_queue_seen,
+            "pending_jobs": sum(self._pending_jobs.values()),
+            "admitted": self.admitted,
+            "waited": self.waited,
+            "avg_wait_seconds": self.wait_seconds / self.waited if self.waited else 0.0,
+            "avg_run_seconds": self._hold_seconds,
+            "rejected": dict(self.rejected),
+            "shared_leases": shared.lease_counts() if (shared := get_shared_state()) is not None else None,
+        }
+
+
+admission = AdmissionController()
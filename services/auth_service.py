@@ -1,10 +1,11 @@
-from datetime import datetime, timedelta
-from jose import JWTError, jwt
+from datetime import datetime, timedelta, timezone
 import os
 from models.auth_models import LoginRequest, LoginResponse
 from services.portia_client import PortiaClient
+from services.key_validator import key_validator
+from services.metrics import stage_timer
+from services.token_cache import token_cache, token_digest
 import uuid
-import aiohttp
 
 SECRET_KEY = os.getenv("JWT_SECRET_KEY")
 ALGORITHM = "HS256"
@@ -15,16 +16,45 @@ class AuthService:
     def create_access_token(data: dict, expires_delta: timedelta = None):
         to_encode = data.copy()
         if expires_delta:
-            expire = datetime.utcnow() + expires_delta
+            expire = datetime.now(timezone.utc) + expires_delta
         else:
-            expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+            expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         
         to_encode.update({"exp": expire})
+        from jose import jwt
+
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
     @staticmethod
     def verify_token(token: str):
+        digest = token_digest(token)
+        if token_cache.is_revoked(digest):
+            return None
+        
+        token_data = token_cache.get(digest)
+        if token_data is not None:
+            return token_data
+        
+        with stage_timer("jwt_verify"):
+            decoded = AuthService._decode_token(token)
+        if decoded is None:
+            return None
+        
+        token_data, exp = decoded
+        token_cache.put(digest, token_data, exp)
+        return token_data
+    
+    @staticmethod
+    def verify_token_uncached(token: str):
+        decoded = AuthService._decode_token(token)
+        return decoded[0] if decoded is not None else None
+    
+    @staticmethod
+    def _decode_token(token: str):
+        """Fully verify a token, returning (token_data, exp) or None."""
+        from jose import JWTError, jwt
+
         try:
             payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
             openai_api_key: str = payload.get("openai_api_key")
@@ -33,10 +63,19 @@ class AuthService:
             if openai_api_key is None or user_id is None:
                 return None
             
-            return {"openai_api_key": openai_api_key, "user_id": user_id}
-        except JWTError:
+            return {"openai_api_key": openai_api_key, "user_id": user_id}, float(payload["exp"])
+        except (JWTError, KeyError):
             return None
     
+    @staticmethod
+    def revoke_token(token: str) -> bool:
+        decoded = AuthService._decode_token(token)
+        if decoded is None:
+            return False
+        
+        token_cache.revoke(token_digest(token), decoded[1])
+        return True
+    
     @staticmethod
     async def login(request: LoginRequest) -> LoginResponse:
         is_valid = await AuthService.test_openai_key_fast(request.openai_api_key)
@@ -61,26 +100,4 @@ class AuthService:
 
     @staticmethod
     async def test_openai_key_fast(openai_api_key: str) -> bool:
-        try:
-            async with aiohttp.ClientSession() as session:
-                headers = {
-                    "Authorization": f"Bearer {openai_api_key}",
-                    "Content-Type": "application/json"
-                }
-                
-                data = {
-                    "model": "gpt-3.5-turbo",
-                    "messages": [{"role": "user", "content": "Hello"}],
-                    "max_tokens": 5
-                }
-                
-                async with session.post(
-                    "https://api.openai.com/v1/chat/completions",
-                    headers=headers,
-                    json=data,
-                    timeout=5
-                ) as response:
-                    return response.status == 200
-                    
-        except Exception:
-            return False
\ No newline at end of file
+        return await key_validator.validate(openai_api_key)
\ No newline at end of file
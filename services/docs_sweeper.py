@@ -0,0 +1,176 @@
+"""Expiry index and background sweeper for generated files in ``docs/``."""
+import asyncio
+import os
+import re
+import threading
+import time
+from pathlib import Path
+from services.metrics import stage_timer
+from services.shared_state import connect_sqlite
+
+DOCS_DIR = os.getenv("DOCS_DIR", "docs")
+DOCS_TTL_SECONDS = float(os.getenv("DOCS_TTL_SECONDS", "86400"))
+DOCS_SWEEP_INTERVAL_SECONDS = float(os.getenv("DOCS_SWEEP_INTERVAL_SECONDS", "300"))
+DOCS_SWEEP_BATCH = int(os.getenv("DOCS_SWEEP_BATCH", "500"))
+DOCS_INDEX_PATH = os.getenv("DOCS_INDEX_PATH", "data/docs_index.sqlite3")
+VARIANT_SUFFIXES = (".br", ".gz")
+
+_UNSAFE_CHARS = re.compile(r"[^A-Za-z0-9_-]")
+
+
+def user_docs_dir(user_id: str) -> Path:
+    """Directory holding one user's generated files."""
+    return Path(DOCS_DIR) / (_UNSAFE_CHARS.sub("_", user_id) or "_")
+
+
+def safe_filename(name: str, default: str = "document") -> str:
+    """A plain file name built from ``name`` (e.g. one chosen by the LLM), with no directory parts."""
+    return _UNSAFE_CHARS.sub("_", Path(name).name).strip("_")[:100] or default
+
+
+def user_file_path(user_id: str, filename: str) -> Path:
+    """Where ``filename`` (chosen by the LLM) is written for ``user_id``.
+
+    A bare name, or a path inside the user's directory, maps to a sanitized name in that
+    directory; any other path raises ValueError.
+    """
+    directory = user_docs_dir(user_id)
+    path = Path(filename)
+    if path.parent != Path(".") and path.parent.resolve() != directory.resolve():
+        raise ValueError(f"Files can only be written to {directory}")
+    extension = _UNSAFE_CHARS.sub("", path.suffix)[:10]
+    name = safe_filename(path.stem if extension else path.name)
+    return directory / (f"{name}.{extension}" if extension else name)
+
+
+class DocsSweeper:
+    def __init__(self, path: str = DOCS_INDEX_PATH, docs_dir: str = DOCS_DIR, ttl_seconds: float = DOCS_TTL_SECONDS):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.docs_dir = Path(docs_dir)
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS files (
+                path TEXT PRIMARY KEY,
+                owner TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS files_expires_at ON files (expires_at)")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        self._task: asyncio.Task | None = None
+        self.swept = 0
+        self.sweeps = 0
+        self.last_sweep_seconds = 0.0
+
+    def _owner(self, path: Path) -> str:
+        # docs/<user>/<file> belongs to <user>; files directly in docs/ are shared
+        try:
+            parts = path.relative_to(self.docs_dir).parts
+        except ValueError:
+            return ""
+        return parts[0] if len(parts) > 1 else ""
+
+    def register(self, path: str | Path, ttl_seconds: float = None, now: float = None):
+        """Record that ``path`` expires ``ttl_seconds`` from now (re-registering extends it)."""
+        path = Path(path)
+        expires_at = (time.time() if now is None else now) + (self.ttl_seconds if ttl_seconds is None else ttl_seconds)
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO files (path, owner, expires_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(path) DO UPDATE SET expires_at = excluded.expires_at",
+                (str(path), self._owner(path), expires_at),
+            )
+
+    def sweep(self, now: float = None) -> int:
+        """Delete expired files, touching only rows past their expiry."""
+        started = time.perf_counter()
+        now = time.time() if now is None else now
+        deleted = 0
+        with stage_timer("docs_sweep"):
+            while True:
+                # Held per batch so a file re-registered mid-sweep is not deleted
+                with self._lock:
+                    rows = self._conn.execute(
+                        "SELECT path FROM files WHERE expires_at <= ? ORDER BY expires_at LIMIT ?",
+                        (now, DOCS_SWEEP_BATCH),
+                    ).fetchall()
+                    for (path,) in rows:
+                        try:
+                            Path(path).unlink(missing_ok=True)
+                            # Precompressed copies made by the download path
+                            for suffix in VARIANT_SUFFIXES:
+                                Path(path + suffix).unlink(missing_ok=True)
+                            deleted += 1
+                        except Exception as e:
+                            print(f"Error deleting {path}: {e}")
+                    self._conn.execute("BEGIN")
+                    self._conn.executemany("DELETE FROM files WHERE path = ?", rows)
+                    self._conn.execute("COMMIT")
+                if len(rows) < DOCS_SWEEP_BATCH:
+                    break
+
+        self.sweeps += 1
+        self.swept += deleted
+        self.last_sweep_seconds = time.perf_counter() - started
+        if deleted:
+            print(f"Cleaned up {deleted} expired files from {self.docs_dir}")
+        return deleted
+
+    def scan_existing(self):
+        """Index files written before the index existed, once."""
+        with self._lock:
+            if self._conn.execute("SELECT 1 FROM meta WHERE key = 'scanned'").fetchone():
+                return
+        if self.docs_dir.exists():
+            for file_path in self.docs_dir.rglob("*"):
+                if file_path.is_file() and not file_path.name.endswith(VARIANT_SUFFIXES):
+                    self.register(file_path, now=file_path.stat().st_mtime)
+        with self._lock:
+            self._conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('scanned', ?)", (str(time.time()),))
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.to_thread(self.sweep)
+            except Exception as e:
+                print(f"Docs sweep failed: {e}")
+            await asyncio.sleep(DOCS_SWEEP_INTERVAL_SECONDS)
+
+    async def start(self):
+        await asyncio.to_thread(self.scan_existing)
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def stats(self) -> dict:
+        with self._lock:
+            tracked, next_expiry = self._conn.execute("SELECT COUNT(*), MIN(expires_at) FROM files").fetchone()
+        return {
+            "tracked": tracked,
+            "next_expiry_in_seconds": max(next_expiry - time.time(), 0.0) if next_expiry else None,
+            "sweeps": self.sweeps,
+            "swept": self.swept,
+            "last_sweep_seconds": self.last_sweep_seconds,
+        }
+
+
+_docs_sweeper: DocsSweeper | None = None
+
+
+def get_docs_sweeper() -> DocsSweeper:
+    global _docs_sweeper
+    if _docs_sweeper is None:
+        _docs_sweeper = DocsSweeper()
+    return _docs_sweeper
@@ -1,41 +1,15 @@
-from portia import (
-    ActionClarification,
-    InputClarification,
-    MultipleChoiceClarification,
-    PlanRunState,
-    Portia,
-    PortiaToolRegistry,
-    default_config,
-)
-from custom_tools import custom_tool_registry
-import os
+import asyncio
+from services.docs_sweeper import get_docs_sweeper, safe_filename, user_docs_dir
+from services.executor import ClientDisconnectedError, QueueFullError, get_executor
+from services.key_validator import is_key_rejected, key_validator
+from services.metrics import clarifications
+from services.plan_cache import PlanTemplate, plan_cache
+from services.portia_factory import DOCUMENT_TOOLS, portia_factory
+from services.progress import ProgressChannel
+from services.render_service import render_service
+from pathlib import Path
 
-class DocumentService:
-    def __init__(self, openai_api_key: str, user_id: str):
-        self.openai_api_key = openai_api_key
-        self.user_id = user_id
-        os.environ["OPENAI_API_KEY"] = openai_api_key
-        if os.getenv("PORTIA_API_KEY"):
-            os.environ["PORTIA_API_KEY"] = os.getenv("PORTIA_API_KEY")
-    
-    def create_portia_instance(self):
-        # Combine default tools with custom tools
-        complete_tool_registry = PortiaToolRegistry(default_config()) + custom_tool_registry
-        return Portia(tools=complete_tool_registry)
-    
-    async def generate_documentation(self, topic: str, urls: list[str] = None, output_format: str = "markdown"):
-        try:
-            portia = self.create_portia_instance()
-            
-            # Build the task based on whether URLs are provided
-            if urls:
-                urls_str = ", ".join(urls[:3])  # Limit to 3 URLs max
-                task = f"""
-                Create comprehensive documentation about '{topic}' by:
-                1. Extracting key information from these URLs: {urls_str}
-                2. Finding additional relevant resources (YouTube videos, blog posts, tutorials)
-                3. Writing a structured markdown document to 'docs/{topic.replace(' ', '_').lower()}_documentation.markdown'
-                
+DOCUMENT_SECTIONS = """
                 Include these sections:
                 - Brief introduction (2-3 sentences)
                 - 3-4 main content sections with key points
@@ -49,37 +23,127 @@ class DocumentService:
                 - Short conclusion
                 
                 Format all links properly in markdown: [Link Title](URL)
+
+                When using the extract or crawl tools, set their query to the topic in $topic
+                followed by the section names above, separated by ';' (for example
+                "<topic>; Introduction; Examples; Resources; Conclusion"), so they return only
+                the relevant passages.
                 """
-            else:
-                task = f"""
-                Create comprehensive documentation about '{topic}' by:
+
+DOCS_FROM_URLS_TEMPLATE = PlanTemplate(
+    id="generate_documentation_from_urls",
+    task="""
+                Create comprehensive documentation about the topic in $topic by:
+                1. Extracting key information from the URLs listed in $urls
+                2. Finding additional relevant resources (YouTube videos, blog posts, tutorials)
+                3. Writing a structured markdown document to the file path in $output_path
+                """ + DOCUMENT_SECTIONS,
+    inputs=(
+        ("$topic", "Topic of the documentation"),
+        ("$urls", "Comma-separated URLs to extract information from"),
+        ("$output_path", "Path of the markdown file to write"),
+    ),
+)
+
+DOCS_RESEARCH_TEMPLATE = PlanTemplate(
+    id="generate_documentation_research",
+    task="""
+                Create comprehensive documentation about the topic in $topic by:
                 1. Researching and finding reliable sources about the topic
                 2. Extracting key information and organizing it well
                 3. Finding additional learning resources (YouTube videos, blog posts, tutorials)
-                4. Writing a structured markdown document to 'docs/{topic.replace(' ', '_').lower()}_documentation.markdown'
-                
-                Include these sections:
-                - Brief introduction (2-3 sentences)
-                - 3-4 main content sections with key points
-                - Simple examples if needed
-                - Resources & References section with:
-                  * YouTube tutorial links (with titles)
-                  * Blog posts and articles (with titles and URLs)
-                  * Official documentation links
-                  * GitHub repositories
-                  * Online courses or tutorials
-                - Short conclusion
-                
-                Format all links properly in markdown: [Link Title](URL)
-                """
+                4. Writing a structured markdown document to the file path in $output_path
+                """ + DOCUMENT_SECTIONS,
+    inputs=(
+        ("$topic", "Topic of the documentation"),
+        ("$output_path", "Path of the markdown file to write"),
+    ),
+)
+
+class DocumentService:
+    def __init__(self, openai_api_key: str, user_id: str):
+        self.openai_api_key = openai_api_key
+        self.user_id = user_id
+    
+    def create_portia_instance(self, progress: ProgressChannel = None):
+        # Shared default + custom tool registry, with this user's credentials
+        if progress is None:
+            return portia_factory.create_portia(self.openai_api_key, tools=DOCUMENT_TOOLS)
+        return portia_factory.create_portia(
+            self.openai_api_key, tools=DOCUMENT_TOOLS, execution_hooks=progress.execution_hooks()
+        )
+    
+    async def generate_documentation(self, topic: str, urls: list[str] = None, output_format: str = "markdown", is_disconnected=None, progress: ProgressChannel = None):
+        try:
+            executor = get_executor("docs")
+            if executor.kind == "process":
+                # Hooks push events back to this process, so they need a thread pool
+                progress = None
+            result = await executor.submit(
+                self._generate_documentation_sync, topic, urls, progress, is_disconnected=is_disconnected
+            )
+            if result.pop("key_rejected", False):
+                # The key stopped working after login; make the next login check it again
+                await key_validator.forget(self.openai_api_key)
+            if result.get("success"):
+                markdown_path = result["file_path"]
+                result["file_path"] = await self._render_output(markdown_path, output_format, is_disconnected)
+                if result["file_path"] != markdown_path:
+                    await asyncio.to_thread(get_docs_sweeper().register, result["file_path"])
+                    if progress is not None:
+                        progress.emit("file_written", path=result["file_path"], tool="render")
+            return result
+        except (QueueFullError, ClientDisconnectedError):
+            raise
+        except Exception as e:
+            return {
+                "success": False,
+                "error": str(e),
+                "user_id": self.user_id
+            }
+    
+    async def _render_output(self, markdown_path: str, output_format: str, is_disconnected=None) -> str:
+        """Convert the written markdown to the requested format, falling back to the markdown."""
+        if not Path(markdown_path).exists():
+            return markdown_path
+        
+        try:
+            return await render_service.render(markdown_path, output_format, is_disconnected=is_disconnected)
+        except (QueueFullError, ClientDisconnectedError):
+            raise
+        except Exception as e:
+            print(f"{output_format.upper()} rendering failed for {markdown_path}: {e}")
+            return markdown_path
+    
+    def _generate_documentation_sync(self, topic: str, urls: list[str] = None, progress: ProgressChannel = None):
+        from portia import ActionClarification, InputClarification, MultipleChoiceClarification, PlanRunState
+
+        try:
+            portia = self.create_portia_instance(progress)
             
-            plan = portia.plan(task)
-            plan_run = portia.run_plan(plan, end_user=self.user_id)
+            slug = safe_filename(topic).lower()
+            output_path = str(user_docs_dir(self.user_id) / f"{slug}_documentation.markdown")
+            inputs = {"$topic": topic, "$output_path": output_path}
+            
+            # Pick the template based on whether URLs are provided
+            if urls:
+                template = DOCS_FROM_URLS_TEMPLATE
+                inputs["$urls"] = ", ".join(urls[:3])  # Limit to 3 URLs max
+            else:
+                template = DOCS_RESEARCH_TEMPLATE
+            
+            plan = plan_cache.get_or_plan(portia, template)
+            if progress is not None:
+                progress.plan_created(plan)
+            plan_run = portia.run_plan(plan, end_user=self.user_id, plan_run_inputs=template.run_inputs(inputs))
             
             # Handle clarifications if needed
             while plan_run.state == PlanRunState.NEED_CLARIFICATION:
                 for clarification in plan_run.get_outstanding_clarifications():
                     if isinstance(clarification, ActionClarification):
+                        clarifications.inc(kind="oauth")
+                        if progress is not None:
+                            progress.clarification("oauth", clarification.user_guidance, str(clarification.action_url))
                         return {
                             "success": False,
                             "error": "Authentication required",
@@ -90,6 +154,9 @@ class DocumentService:
                         }
                     
                     elif isinstance(clarification, (InputClarification, MultipleChoiceClarification)):
+                        clarifications.inc(kind="input")
+                        if progress is not None:
+                            progress.clarification("input", clarification.user_guidance)
                         return {
                             "success": False,
                             "error": "User input required",
@@ -100,16 +167,20 @@ class DocumentService:
                 
                 break
             
+            if Path(output_path).exists():
+                get_docs_sweeper().register(output_path)
+            
             return {
                 "success": True,
                 "result": str(plan_run.outputs.final_output),
                 "user_id": self.user_id,
-                "file_path": f"docs/{topic.replace(' ', '_').lower()}_documentation.markdown"
+                "file_path": output_path
             }
             
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
-                "user_id": self.user_id
+                "user_id": self.user_id,
+                "key_rejected": is_key_rejected(e)
             }
\ No newline at end of file
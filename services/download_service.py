@@ -0,0 +1,151 @@
+"""Serve generated files with validators, byte ranges and precompressed variants."""
+import asyncio
+import gzip
+import importlib.util
+import os
+import secrets
+from pathlib import Path
+from fastapi import Request
+from fastapi.responses import FileResponse, Response
+from services.docs_sweeper import VARIANT_SUFFIXES, user_docs_dir
+
+DOWNLOAD_COMPRESS_MIN_BYTES = int(os.getenv("DOWNLOAD_COMPRESS_MIN_BYTES", "1024"))
+BROTLI_AVAILABLE = importlib.util.find_spec("brotli") is not None
+MEDIA_TYPES = {
+    ".markdown": "text/markdown",
+    ".md": "text/markdown",
+    ".html": "text/html",
+    ".txt": "text/plain",
+    ".json": "application/json",
+    ".pdf": "application/pdf",
+}
+COMPRESSIBLE_SUFFIXES = {".markdown", ".md", ".html", ".txt", ".json"}
+# Preferred first; brotli needs the optional "brotli" package
+ENCODINGS = ([("br", ".br")] if BROTLI_AVAILABLE else []) + [("gzip", ".gz")]
+
+
+def file_etag(stat_result: os.stat_result) -> str:
+    # Files are replaced atomically or rewritten, so inode + mtime + size changes with content
+    return f'"{stat_result.st_ino:x}-{stat_result.st_mtime_ns:x}-{stat_result.st_size:x}"'
+
+
+def accepted_encodings(header: str) -> set[str]:
+    accepted = set()
+    for item in header.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        if coding:
+            accepted.add(coding.strip().lower())
+    return accepted
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # If-None-Match uses weak comparison
+    candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+    return "*" in candidates or etag.removeprefix("W/") in candidates
+
+
+def _compress(source: Path, variant: Path, encoding: str):
+    data = source.read_bytes()
+    if encoding == "br":
+        import brotli
+        compressed = brotli.compress(data, quality=11)
+    else:
+        compressed = gzip.compress(data, compresslevel=9, mtime=0)
+
+    tmp_path = variant.with_suffix(f".{secrets.token_hex(4)}.tmp")
+    tmp_path.write_bytes(compressed)
+    # Matching mtimes mark the variant as built from this version of the source
+    stat_result = source.stat()
+    os.utime(tmp_path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns))
+    tmp_path.replace(variant)
+
+
+class DownloadService:
+    def __init__(self):
+        self.not_modified = 0
+        self.compressed_hits = 0
+        self.variants_built = 0
+
+    @staticmethod
+    def resolve(user_id: str, filename: str) -> Path | None:
+        """Find ``filename`` in the user's directory, refusing anything that is not a plain name."""
+        if not filename or Path(filename).name != filename or filename.endswith(VARIANT_SUFFIXES):
+            return None
+        # Files left directly in docs/ have no owner, so they are never served
+        file_path = user_docs_dir(user_id) / filename
+        return file_path if file_path.is_file() else None
+
+    @staticmethod
+    def _choose_encoding(source: Path, stat_result: os.stat_result, accept_encoding: str) -> tuple[str, str] | None:
+        if source.suffix not in COMPRESSIBLE_SUFFIXES or stat_result.st_size < DOWNLOAD_COMPRESS_MIN_BYTES:
+            return None
+        accepted = accepted_encodings(accept_encoding)
+        for encoding, suffix in ENCODINGS:
+            if encoding in accepted:
+                return encoding, suffix
+        return None
+
+    async def _ensure_variant(self, source: Path, stat_result: os.stat_result, encoding: str, suffix: str) -> Path:
+        variant = source.with_name(source.name + suffix)
+        try:
+            if variant.stat().st_mtime_ns == stat_result.st_mtime_ns:
+                self.compressed_hits += 1
+                return variant
+        except FileNotFoundError:
+            pass
+        await asyncio.to_thread(_compress, source, variant, encoding)
+        self.variants_built += 1
+        return variant
+
+    async def file_response(self, file_path: Path, request: Request) -> Response:
+        stat_result = await asyncio.to_thread(file_path.stat)
+        media_type = MEDIA_TYPES.get(file_path.suffix, "application/octet-stream")
+        headers = {"cache-control": "private, no-cache"}
+        if file_path.suffix in COMPRESSIBLE_SUFFIXES:
+            headers["vary"] = "Accept-Encoding"
+
+        etag = file_etag(stat_result)
+        chosen = self._choose_encoding(file_path, stat_result, request.headers.get("accept-encoding", ""))
+        if chosen is not None:
+            headers["content-encoding"] = chosen[0]
+            # Each representation needs its own strong validator
+            etag = f'{etag[:-1]}-{chosen[0]}"'
+        headers["etag"] = etag
+
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, etag):
+            self.not_modified += 1
+            return Response(status_code=304, headers=headers)
+
+        served_path, served_stat = file_path, stat_result
+        if chosen is not None:
+            served_path = await self._ensure_variant(file_path, stat_result, *chosen)
+            served_stat = await asyncio.to_thread(served_path.stat)
+
+        # FileResponse handles Range/If-Range against our ETag and uses
+        # http.response.pathsend when the server offers it
+        return FileResponse(
+            path=str(served_path),
+            filename=file_path.name,
+            media_type=media_type,
+            headers=headers,
+            stat_result=served_stat,
+        )
+
+    def stats(self) -> dict:
+        return {
+            "brotli": BROTLI_AVAILABLE,
+            "not_modified": self.not_modified,
+            "compressed_hits": self.compressed_hits,
+            "variants_built": self.variants_built,
+        }
+
+
+download_service = DownloadService()
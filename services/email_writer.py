@@ -0,0 +1,97 @@
+"""Writes email bodies for subject lines, reusing bodies written for near-identical subjects."""
+import asyncio
+import os
+from services.http_client import http_clients
+from services.key_validator import OPENAI_API_BASE
+from services.similarity_cache import SimilarityCache, normalize_text
+
+EMAIL_BODY_MODEL = os.getenv("EMAIL_BODY_MODEL", "gpt-4o-mini")
+EMAIL_BODY_SIMILARITY_THRESHOLD = float(os.getenv("EMAIL_BODY_SIMILARITY_THRESHOLD", "0.65"))
+EMAIL_BODY_CACHE_SIZE = int(os.getenv("EMAIL_BODY_CACHE_SIZE", "2000"))
+EMAIL_BODY_CACHE_TTL_SECONDS = float(os.getenv("EMAIL_BODY_CACHE_TTL_SECONDS", "604800"))
+# Bodies are cached per user unless this is enabled
+EMAIL_BODY_CACHE_SHARED = os.getenv("EMAIL_BODY_CACHE_SHARED", "false").lower() == "true"
+
+EMAIL_BODY_PROMPT = """Write the body of a professional, engaging email for the subject line below.
+Return only the body text: no subject line, no placeholders such as [Name].
+Use a generic greeting and sign-off so the body suits any recipient.
+
+Subject: {subject}"""
+
+
+class EmailWriter:
+    def __init__(self):
+        self.cache = SimilarityCache(
+            threshold=EMAIL_BODY_SIMILARITY_THRESHOLD,
+            max_size=EMAIL_BODY_CACHE_SIZE,
+            ttl_seconds=EMAIL_BODY_CACHE_TTL_SECONDS,
+        )
+        self._inflight: dict[tuple[str, str], asyncio.Future] = {}
+        self.generated = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    async def body_for(self, subject: str, openai_api_key: str, user_id: str) -> tuple[str, float] | None:
+        """Return ``(body, similarity)``; similarity is 0.0 for a freshly written body.
+
+        Returns None when no body could be written so the caller can fall back
+        to letting the plan write it.
+        """
+        namespace = "" if EMAIL_BODY_CACHE_SHARED else user_id
+        # Hashing for the similarity lookup is CPU work; keep it off the event loop
+        cached = await asyncio.to_thread(self.cache.get, subject, namespace)
+        if cached is not None:
+            return cached
+
+        key = (namespace, normalize_text(subject))
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # The same subject is already being written (e.g. within a batch)
+            self.coalesced += 1
+            body = await asyncio.shield(inflight)
+            return (body, 1.0) if body is not None else None
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            body = await self._generate(subject, openai_api_key)
+            if body is not None:
+                await asyncio.to_thread(self.cache.put, subject, body, namespace)
+            future.set_result(body)
+        except BaseException:
+            future.set_result(None)
+            raise
+        finally:
+            del self._inflight[key]
+        return (body, 0.0) if body is not None else None
+
+    async def _generate(self, subject: str, openai_api_key: str) -> str | None:
+        try:
+            response = await http_clients.async_client().post(
+                f"{OPENAI_API_BASE}/chat/completions",
+                headers={"Authorization": f"Bearer {openai_api_key}"},
+                json={
+                    "model": EMAIL_BODY_MODEL,
+                    "messages": [{"role": "user", "content": EMAIL_BODY_PROMPT.format(subject=subject)}],
+                },
+            )
+            response.raise_for_status()
+            body = response.json()["choices"][0]["message"]["content"].strip()
+        except Exception as e:
+            self.failures += 1
+            print(f"Email body generation failed: {e}")
+            return None
+
+        self.generated += 1
+        return body or None
+
+    def stats(self) -> dict:
+        return {
+            **self.cache.stats(),
+            "generated": self.generated,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+        }
+
+
+email_writer = EmailWriter()
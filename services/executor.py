@@ -0,0 +1,151 @@
+"""Bounded worker pools for running blocking Portia plans off the event loop."""
+import asyncio
+import multiprocessing
+import os
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Awaitable, Callable
+from services.profiling import PROFILING_ENABLED, bind_profile
+
+DEFAULT_KIND = "thread"
+DEFAULT_MAX_WORKERS = 4
+DEFAULT_MAX_QUEUE = 16
+DISCONNECT_POLL_SECONDS = 0.5
+
+
+class QueueFullError(Exception):
+    """Raised when a pool already has its maximum number of pending jobs."""
+
+
+class ClientDisconnectedError(Exception):
+    """Raised when the client went away before the job finished."""
+
+
+class PlanExecutor:
+    def __init__(self, name: str, kind: str = DEFAULT_KIND, max_workers: int = DEFAULT_MAX_WORKERS, max_queue: int = DEFAULT_MAX_QUEUE):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Unknown executor kind: {kind}")
+
+        self.name = name
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._pool = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self._submitted = 0
+        self._rejected = 0
+        self._cancelled = 0
+
+    def _get_pool(self):
+        if self._pool is None:
+            if self.kind == "process":
+                # Forking a process that already runs threads can copy locks mid-update
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn"))
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=f"{self.name}-worker")
+        return self._pool
+
+    def _reserve(self):
+        with self._lock:
+            if self._pending >= self.max_workers + self.max_queue:
+                self._rejected += 1
+                raise QueueFullError(f"The {self.name} executor is at capacity, try again later")
+            self._pending += 1
+            self._submitted += 1
+
+    def _release(self, _: Future = None):
+        with self._lock:
+            self._pending -= 1
+
+    async def submit(self, fn: Callable[..., Any], *args, is_disconnected: Callable[[], Awaitable[bool]] = None, **kwargs) -> Any:
+        """Run ``fn`` in the pool and await its result.
+
+        Raises QueueFullError when the pool is saturated and ClientDisconnectedError
+        when ``is_disconnected`` reports that the caller went away.
+        """
+        if PROFILING_ENABLED and self.kind == "thread":
+            # Sample the worker thread too when this request is being profiled
+            fn = bind_profile(fn)
+        self._reserve()
+        try:
+            future = self._get_pool().submit(fn, *args, **kwargs)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+
+        wrapped = asyncio.wrap_future(future)
+        try:
+            while True:
+                done, _ = await asyncio.wait({wrapped}, timeout=DISCONNECT_POLL_SECONDS)
+                if done:
+                    return wrapped.result()
+                if is_disconnected is not None and await is_disconnected():
+                    self._cancel(future)
+                    raise ClientDisconnectedError("Client disconnected before the job finished")
+        except asyncio.CancelledError:
+            self._cancel(future)
+            raise
+
+    def _cancel(self, future: Future):
+        # Queued jobs are dropped outright; a job that already started cannot be
+        # interrupted, but its result is discarded once it finishes.
+        future.cancel()
+        with self._lock:
+            self._cancelled += 1
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "name": self.name,
+                "kind": self.kind,
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "pending": self._pending,
+                "submitted": self._submitted,
+                "rejected": self._rejected,
+                "cancelled": self._cancelled,
+            }
+
+    def shutdown(self, wait: bool = False):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+
+_executors: dict[str, PlanExecutor] = {}
+_executors_lock = threading.Lock()
+
+
+def _env_setting(name: str, setting: str, default: str, pool_default: str | None = None) -> str:
+    # Per-pool override first (e.g. DOCS_EXECUTOR_WORKERS), then the pool's own
+    # default, then the global setting
+    if pool_default is not None:
+        return os.getenv(f"{name.upper()}_EXECUTOR_{setting}", pool_default)
+    return os.getenv(f"{name.upper()}_EXECUTOR_{setting}", os.getenv(f"PLAN_EXECUTOR_{setting}", default))
+
+
+def get_executor(name: str, kind: str | None = None) -> PlanExecutor:
+    """Return the process-wide executor called ``name``, creating it from env settings."""
+    with _executors_lock:
+        if name not in _executors:
+            _executors[name] = PlanExecutor(
+                name,
+                kind=_env_setting(name, "KIND", DEFAULT_KIND, pool_default=kind),
+                max_workers=int(_env_setting(name, "WORKERS", str(DEFAULT_MAX_WORKERS))),
+                max_queue=int(_env_setting(name, "QUEUE_DEPTH", str(DEFAULT_MAX_QUEUE))),
+            )
+        return _executors[name]
+
+
+def executor_stats() -> list[dict]:
+    with _executors_lock:
+        return [executor.stats() for executor in _executors.values()]
+
+
+def shutdown_executors(wait: bool = False):
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
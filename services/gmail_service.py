@@ -1,20 +1,89 @@
-from models.gmail_models import SendEmailRequest, SendEmailResponse, AutomatedEmailRequest
+from models.gmail_models import (
+    AutomatedEmailRequest,
+    BatchEmailRequest,
+    BatchEmailResponse,
+    BatchEmailResult,
+    SendEmailRequest,
+    SendEmailResponse,
+)
+from services.admission import ADMISSION_PER_USER_LIMIT
+from services.email_writer import email_writer
 from services.portia_client import PortiaClient
+from services.executor import ClientDisconnectedError, QueueFullError, get_executor
+from services.plan_cache import PlanTemplate
+from services.progress import ProgressChannel
+from services.rate_limiter import gmail_send_limiter
+import asyncio
+import os
+
+BULK_EMAIL_CONCURRENCY = int(os.getenv("BULK_EMAIL_CONCURRENCY", "2"))
+BULK_EMAIL_QUEUE_RETRIES = int(os.getenv("BULK_EMAIL_QUEUE_RETRIES", "3"))
+
+
+def batch_concurrency(pool_workers: int) -> int:
+    """How many of one batch's sends run at once.
+
+    A batch holds a single admission slot, so it stays within the per-user
+    limit and always leaves an email pool worker for other users.
+    """
+    return max(1, min(BULK_EMAIL_CONCURRENCY, ADMISSION_PER_USER_LIMIT, pool_workers - 1))
+
+
+AUTOMATED_EMAIL_TEMPLATE = PlanTemplate(
+    id="send_automated_email",
+    task="""
+    Send an email to the recipient in $recipient with the subject line in $subject.
+    Generate appropriate professional email content based on the subject line.
+    Make the email body relevant to the subject, professional, and engaging.
+    """,
+    inputs=(
+        ("$recipient", "Email address of the recipient"),
+        ("$subject", "Subject line of the email"),
+    ),
+)
+
+# Used when the body was written (or reused) before planning
+PREPARED_EMAIL_TEMPLATE = PlanTemplate(
+    id="send_prepared_email",
+    task="""
+    Send an email to the recipient in $recipient with the subject line in $subject.
+    Use the text in $body as the email body exactly as given, without rewriting it.
+    """,
+    inputs=(
+        ("$recipient", "Email address of the recipient"),
+        ("$subject", "Subject line of the email"),
+        ("$body", "Body of the email"),
+    ),
+)
 
 class GmailService:
     def __init__(self, openai_api_key: str, user_id: str):
         self.client = PortiaClient(openai_api_key, user_id)
     
     
-    async def send_automated_email(self, request: AutomatedEmailRequest) -> SendEmailResponse:
+    async def send_automated_email(self, request: AutomatedEmailRequest, is_disconnected=None, progress: ProgressChannel = None, plan=None) -> SendEmailResponse:
+        """Send one email; ``plan`` is a prepared plan for PREPARED_EMAIL_TEMPLATE."""
         try:
-            task = f"""
-            Send an email to {request.to} with subject '{request.subject}'.
-            Generate appropriate professional email content based on the subject line.
-            Make the email body relevant to the subject, professional, and engaging.
-            """
+            template = PREPARED_EMAIL_TEMPLATE
+            inputs = {"$recipient": str(request.to), "$subject": request.subject}
+            written = await email_writer.body_for(request.subject, self.client.openai_api_key, self.client.user_id)
+            if written is None:
+                # Let the plan write the body itself
+                template, plan = AUTOMATED_EMAIL_TEMPLATE, None
+            else:
+                inputs["$body"], similarity = written
+                if progress is not None:
+                    progress.emit("email_body", cached=similarity > 0, similarity=similarity)
             
-            result = await self.client.run_task(task)
+            # Sends share the user's Gmail quota, whichever endpoint they come from
+            await gmail_send_limiter.acquire(self.client.user_id)
+            result = await self.client.run_template(
+                template,
+                inputs,
+                is_disconnected=is_disconnected,
+                progress=progress,
+                plan=plan
+            )
             
             return SendEmailResponse(
                 success=result["success"],
@@ -25,6 +94,8 @@ class GmailService:
                 oauth_url=result.get("oauth_url")
             )
 
+        except (QueueFullError, ClientDisconnectedError):
+            raise
         except Exception as e:
             return SendEmailResponse(
                 success=False,
@@ -32,6 +103,75 @@ class GmailService:
                 user_id=self.client.user_id
             )
     
+    async def send_batch(self, request: BatchEmailRequest, is_disconnected=None) -> BatchEmailResponse:
+        """Send many emails with one shared plan, a concurrency cap and quota pacing."""
+        messages = request.to_requests()
+        try:
+            plan = await self.client.prepare_template(PREPARED_EMAIL_TEMPLATE)
+        except QueueFullError:
+            raise
+        except Exception as e:
+            results = [
+                BatchEmailResult(success=False, error=str(e), user_id=self.client.user_id, to=str(message.to), subject=message.subject)
+                for message in messages
+            ]
+            return BatchEmailResponse(
+                success=False,
+                user_id=self.client.user_id,
+                total=len(results),
+                sent=0,
+                failed=len(results),
+                skipped=0,
+                results=results
+            )
+        semaphore = asyncio.Semaphore(batch_concurrency(get_executor("email").max_workers))
+        auth_required = asyncio.Event()
+        
+        async def send_one(message: AutomatedEmailRequest) -> BatchEmailResult:
+            async with semaphore:
+                if auth_required.is_set():
+                    # Every remaining send would hit the same OAuth prompt
+                    return BatchEmailResult(
+                        success=False,
+                        error="Skipped: authentication required",
+                        user_id=self.client.user_id,
+                        to=str(message.to),
+                        subject=message.subject,
+                        skipped=True
+                    )
+                response = await self._send_with_retry(message, plan, is_disconnected)
+                if response.needs_authentication:
+                    auth_required.set()
+                return BatchEmailResult(**response.model_dump(), to=str(message.to), subject=message.subject)
+        
+        try:
+            async with asyncio.TaskGroup() as group:
+                tasks = [group.create_task(send_one(message)) for message in messages]
+        except* ClientDisconnectedError as errors:
+            raise errors.exceptions[0]
+        
+        results = [task.result() for task in tasks]
+        sent = sum(result.success for result in results)
+        skipped = sum(result.skipped for result in results)
+        return BatchEmailResponse(
+            success=sent == len(results),
+            user_id=self.client.user_id,
+            total=len(results),
+            sent=sent,
+            failed=len(results) - sent - skipped,
+            skipped=skipped,
+            results=results
+        )
+    
+    async def _send_with_retry(self, message: AutomatedEmailRequest, plan, is_disconnected=None) -> SendEmailResponse:
+        for attempt in range(BULK_EMAIL_QUEUE_RETRIES + 1):
+            try:
+                return await self.send_automated_email(message, is_disconnected=is_disconnected, plan=plan)
+            except QueueFullError as e:
+                if attempt == BULK_EMAIL_QUEUE_RETRIES:
+                    return SendEmailResponse(success=False, error=str(e), user_id=self.client.user_id)
+                await asyncio.sleep(0.5 * 2 ** attempt)
+    
     async def send_automated_email_simple(self, to: str, subject: str) -> SendEmailResponse:
         request = AutomatedEmailRequest(to=to, subject=subject)
         return await self.send_automated_email(request)
\ No newline at end of file
@@ -0,0 +1,157 @@
+"""Shared, pooled HTTP clients for all outbound calls.
+
+httpx is imported when the first client is built (normally by the startup warm-up).
+"""
+from __future__ import annotations
+import importlib.util
+import os
+import threading
+from typing import TYPE_CHECKING
+
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY_SECONDS = float(os.getenv("HTTP_KEEPALIVE_EXPIRY_SECONDS", "30"))
+# HTTP/2 needs the optional "h2" package (pip install httpx[http2])
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true" and importlib.util.find_spec("h2") is not None
+# Per-host connection caps, e.g. "api.tavily.com=10,api.openai.com=20"
+HTTP_HOST_LIMITS = os.getenv("HTTP_HOST_LIMITS", "api.tavily.com=10,api.openai.com=20")
+DEFAULT_TIMEOUT_SECONDS = 60.0
+DEFAULT_CONNECT_TIMEOUT_SECONDS = 10.0
+
+if TYPE_CHECKING:
+    import httpx
+
+
+def _parse_host_limits(value: str) -> dict[str, int]:
+    limits = {}
+    for item in value.split(","):
+        if "=" in item:
+            host, limit = item.split("=", 1)
+            limits[host.strip()] = int(limit)
+    return limits
+
+
+class _ConnectionStats:
+    """Counts requests against new TCP connections and TLS handshakes via httpcore tracing."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.requests = 0
+        self.connections = 0
+        self.tls_handshakes = 0
+
+    def on_request(self):
+        with self._lock:
+            self.requests += 1
+
+    def on_trace(self, event_name: str):
+        if event_name == "connection.connect_tcp.complete":
+            with self._lock:
+                self.connections += 1
+        elif event_name == "connection.start_tls.complete":
+            with self._lock:
+                self.tls_handshakes += 1
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            reused = max(self.requests - self.connections, 0)
+            return {
+                "requests": self.requests,
+                "connections_opened": self.connections,
+                "tls_handshakes": self.tls_handshakes,
+                "connections_reused": reused,
+                "reuse_ratio": reused / self.requests if self.requests else 0.0,
+            }
+
+
+class HttpClients:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sync_client: httpx.Client | None = None
+        self._async_client: httpx.AsyncClient | None = None
+        self.sync_stats = _ConnectionStats()
+        self.async_stats = _ConnectionStats()
+
+    @staticmethod
+    def _limits(max_connections: int = HTTP_MAX_CONNECTIONS) -> httpx.Limits:
+        import httpx
+
+        return httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=min(HTTP_MAX_KEEPALIVE_CONNECTIONS, max_connections),
+            keepalive_expiry=HTTP_KEEPALIVE_EXPIRY_SECONDS,
+        )
+
+    def sync_client(self) -> httpx.Client:
+        """Client for code running in worker threads (the custom tools)."""
+        import httpx
+
+        with self._lock:
+            if self._sync_client is None:
+                stats = self.sync_stats
+
+                def on_request(request: httpx.Request):
+                    stats.on_request()
+                    request.extensions["trace"] = lambda event_name, info: stats.on_trace(event_name)
+
+                self._sync_client = httpx.Client(
+                    limits=self._limits(),
+                    http2=HTTP2_ENABLED,
+                    timeout=httpx.Timeout(DEFAULT_TIMEOUT_SECONDS, connect=DEFAULT_CONNECT_TIMEOUT_SECONDS),
+                    mounts={
+                        f"all://{host}": httpx.HTTPTransport(limits=self._limits(limit), http2=HTTP2_ENABLED)
+                        for host, limit in _parse_host_limits(HTTP_HOST_LIMITS).items()
+                    },
+                    event_hooks={"request": [on_request]},
+                )
+            return self._sync_client
+
+    def async_client(self) -> httpx.AsyncClient:
+        """Client for coroutines on the event loop."""
+        import httpx
+
+        with self._lock:
+            if self._async_client is None:
+                stats = self.async_stats
+
+                async def trace(event_name: str, info: dict):
+                    stats.on_trace(event_name)
+
+                async def on_request(request: httpx.Request):
+                    stats.on_request()
+                    request.extensions["trace"] = trace
+
+                self._async_client = httpx.AsyncClient(
+                    limits=self._limits(),
+                    http2=HTTP2_ENABLED,
+                    timeout=httpx.Timeout(DEFAULT_TIMEOUT_SECONDS, connect=DEFAULT_CONNECT_TIMEOUT_SECONDS),
+                    mounts={
+                        f"all://{host}": httpx.AsyncHTTPTransport(limits=self._limits(limit), http2=HTTP2_ENABLED)
+                        for host, limit in _parse_host_limits(HTTP_HOST_LIMITS).items()
+                    },
+                    event_hooks={"request": [on_request]},
+                )
+            return self._async_client
+
+    async def start(self):
+        self.async_client()
+        self.sync_client()
+
+    async def aclose(self):
+        with self._lock:
+            async_client, self._async_client = self._async_client, None
+            sync_client, self._sync_client = self._sync_client, None
+        if async_client is not None:
+            await async_client.aclose()
+        if sync_client is not None:
+            sync_client.close()
+
+    def stats(self) -> dict:
+        return {
+            "http2": HTTP2_ENABLED,
+            "sync": self.sync_stats.as_dict(),
+            "async": self.async_stats.as_dict(),
+        }
+
+
+http_clients = HttpClients()
@@ -0,0 +1,90 @@
+"""Runs document generation as background jobs tracked in the job store."""
+import asyncio
+from models.document_models import GenerateDocumentRequest
+from services.document_service import DocumentService
+from services.admission import admission, admission_key
+from services.executor import QueueFullError
+from services.job_store import get_job_store
+
+QUEUE_RETRY_SECONDS = 1.0
+QUEUE_TIMEOUT_SECONDS = 600.0
+
+# Strong references so running jobs are not garbage collected mid-flight
+_background_tasks: set[asyncio.Task] = set()
+
+
+class JobService:
+    @staticmethod
+    async def submit_documentation_job(request: GenerateDocumentRequest, openai_api_key: str, user_id: str) -> dict:
+        identity = admission_key(openai_api_key)
+        await admission.reserve_job(identity)
+        # The job store is SQLite shared with other workers; keep its lock waits off the event loop
+        job = await asyncio.to_thread(get_job_store().create, user_id, "generate_documentation", request.model_dump())
+
+        task = asyncio.create_task(JobService._run_documentation_job(job["id"], request, openai_api_key, user_id, identity))
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+        return job
+
+    @staticmethod
+    async def _run_documentation_job(job_id: str, request: GenerateDocumentRequest, openai_api_key: str, user_id: str, identity: str):
+        store = get_job_store()
+        service = DocumentService(openai_api_key, user_id)
+        waited = 0.0
+
+        try:
+            # Jobs queue behind the user's interactive requests without a short deadline
+            ticket = await admission.acquire(identity, max_wait=QUEUE_TIMEOUT_SECONDS, background=True)
+        except Exception as e:
+            await asyncio.to_thread(store.mark_failed, job_id, str(e))
+            await admission.finish_job(identity)
+            return
+
+        try:
+            while True:
+                try:
+                    await asyncio.to_thread(store.mark_running, job_id)
+                    result = await service.generate_documentation(
+                        topic=request.topic,
+                        urls=request.urls,
+                        output_format=request.output_format
+                    )
+                    break
+                except QueueFullError as e:
+                    # Jobs wait for pool capacity instead of failing like interactive calls
+                    if waited >= QUEUE_TIMEOUT_SECONDS:
+                        await asyncio.to_thread(store.mark_failed, job_id, str(e))
+                        return
+                    await asyncio.sleep(QUEUE_RETRY_SECONDS)
+                    waited += QUEUE_RETRY_SECONDS
+
+            await asyncio.to_thread(store.mark_finished, job_id, result)
+        except Exception as e:
+            await asyncio.to_thread(store.mark_failed, job_id, str(e))
+        finally:
+            ticket.release()
+            await admission.finish_job(identity)
+
+    @staticmethod
+    async def get_job(job_id: str, user_id: str) -> dict | None:
+        job = await asyncio.to_thread(get_job_store().get, job_id)
+        if job is None or job["user_id"] != user_id:
+            return None
+        return job
+
+
+def recover_jobs():
+    store = get_job_store()
+    count = store.fail_interrupted()
+    if count > 0:
+        print(f"Marked {count} interrupted jobs as failed")
+    pruned = store.prune()
+    if pruned > 0:
+        print(f"Deleted {pruned} jobs past their retention period")
+
+
+async def cancel_jobs():
+    for task in list(_background_tasks):
+        task.cancel()
+    if _background_tasks:
+        await asyncio.gather(*_background_tasks, return_exceptions=True)
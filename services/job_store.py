@@ -0,0 +1,142 @@
+"""SQLite-backed store for background job state."""
+import json
+import os
+import sqlite3
+import threading
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from services.shared_state import connect_sqlite, owner_alive, process_token
+
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "data/jobs.sqlite3")
+# Finished and failed jobs are deleted this long after their last update
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", "604800"))
+# Old jobs are pruned every this many new jobs, and at startup
+PRUNE_EVERY_CREATES = 100
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobStore:
+    def __init__(self, path: str = JOB_STORE_PATH, retention_seconds: float = JOB_RETENTION_SECONDS):
+        self.path = Path(path)
+        self.retention_seconds = retention_seconds
+        self._creates = 0
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                user_id TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                request TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at TEXT NOT NULL,
+                updated_at TEXT NOT NULL,
+                owner_pid INTEGER,
+                owner_token TEXT
+            )
+            """
+        )
+        columns = {row["name"] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        if "owner_pid" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_pid INTEGER")
+        if "owner_token" not in columns:
+            self._conn.execute("ALTER TABLE jobs ADD COLUMN owner_token TEXT")
+        self._token = process_token(os.getpid())
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_user_id ON jobs (user_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+
+    def create(self, user_id: str, kind: str, request: dict) -> dict:
+        now = _now().isoformat()
+        job_id = str(uuid.uuid4())
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, user_id, kind, status, request, created_at, updated_at, owner_pid, owner_token) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, user_id, kind, QUEUED, json.dumps(request), now, now, os.getpid(), self._token),
+            )
+            self._creates += 1
+            prune = self._creates % PRUNE_EVERY_CREATES == 0
+        if prune:
+            self.prune()
+        return self.get(job_id)
+
+    def get(self, job_id: str) -> dict | None:
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return None
+
+        job = dict(row)
+        job["request"] = json.loads(job["request"])
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def _update(self, job_id: str, status: str, result: dict = None, error: str = None):
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, _now().isoformat(), job_id),
+            )
+
+    def mark_running(self, job_id: str):
+        self._update(job_id, RUNNING)
+
+    def mark_finished(self, job_id: str, result: dict):
+        self._update(job_id, SUCCEEDED if result.get("success") else FAILED, result=result, error=result.get("error"))
+
+    def mark_failed(self, job_id: str, error: str):
+        self._update(job_id, FAILED, error=error)
+
+    def fail_interrupted(self) -> int:
+        """Fail jobs left queued or running by a process that has exited.
+
+        The user's API key only lives in memory, so such jobs cannot be resumed.
+        Jobs owned by other live workers are left alone.
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, owner_pid, owner_token FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)
+            ).fetchall()
+            orphaned = [
+                (row["id"],) for row in rows
+                if row["owner_pid"] is None or not owner_alive(row["owner_pid"], row["owner_token"])
+            ]
+            now = _now().isoformat()
+            self._conn.executemany(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+                [(FAILED, "Interrupted by server restart", now, job_id, QUEUED, RUNNING) for (job_id,) in orphaned],
+            )
+        return len(orphaned)
+
+    def prune(self, now: datetime | None = None) -> int:
+        """Delete finished and failed jobs not updated within the retention period."""
+        cutoff = ((now or _now()) - timedelta(seconds=self.retention_seconds)).isoformat()
+        with self._lock:
+            cursor = self._conn.execute(
+                "DELETE FROM jobs WHERE status IN (?, ?) AND updated_at < ?", (SUCCEEDED, FAILED, cutoff)
+            )
+        return cursor.rowcount
+
+
+_job_store: JobStore | None = None
+
+
+def get_job_store() -> JobStore:
+    global _job_store
+    if _job_store is None:
+        _job_store = JobStore()
+    return _job_store
@@ -0,0 +1,148 @@
+"""Cached, coalesced validation of users' OpenAI API keys."""
+import asyncio
+import hashlib
+import hmac
+import os
+import secrets
+import time
+from collections import OrderedDict
+from services.http_client import http_clients
+from services.shared_state import get_shared_state
+
+OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "https://api.openai.com/v1")
+VALID_KEY_TTL_SECONDS = float(os.getenv("VALID_KEY_TTL_SECONDS", "600"))
+INVALID_KEY_TTL_SECONDS = float(os.getenv("INVALID_KEY_TTL_SECONDS", "60"))
+KEY_CACHE_SIZE = int(os.getenv("KEY_CACHE_SIZE", "10000"))
+# Keys are never stored; only a salted HMAC of them is used as the cache key.
+# Workers sharing state also share a generated salt so their digests agree.
+KEY_CACHE_SALT = os.getenv("KEY_CACHE_SALT") or (
+    get_shared_state().secret("key_cache_salt") if get_shared_state() is not None else secrets.token_hex(16)
+)
+
+
+def is_key_rejected(error: BaseException) -> bool:
+    """Whether ``error``, or an error that led to it, is the provider rejecting the API key."""
+    while error is not None:
+        if type(error).__name__ == "AuthenticationError" or getattr(error, "status_code", None) == 401:
+            return True
+        error = error.__cause__ or error.__context__
+    return False
+
+
+class KeyValidator:
+    def __init__(self):
+        # digest -> (is_valid, expires_at)
+        self._cache: OrderedDict[str, tuple[bool, float]] = OrderedDict()
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_checks = 0
+
+    @staticmethod
+    def key_digest(openai_api_key: str) -> str:
+        return hmac.new(KEY_CACHE_SALT.encode(), openai_api_key.encode(), hashlib.sha256).hexdigest()
+
+    async def validate(self, openai_api_key: str) -> bool:
+        digest = self.key_digest(openai_api_key)
+
+        cached = self._cache.get(digest)
+        if cached is not None:
+            is_valid, expires_at = cached
+            if time.monotonic() < expires_at:
+                self._cache.move_to_end(digest)
+                self.hits += 1
+                return is_valid
+            del self._cache[digest]
+
+        shared = get_shared_state()
+        if shared is not None:
+            # Another worker may have checked this key already
+            remembered = await asyncio.to_thread(shared.get, "valid_keys", digest)
+            if remembered is not None:
+                self.hits += 1
+                self._remember(digest, remembered == "1")
+                return remembered == "1"
+
+        inflight = self._inflight.get(digest)
+        if inflight is not None:
+            # Another login with the same key is already checking upstream
+            self.coalesced += 1
+            return await asyncio.shield(inflight)
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[digest] = future
+        try:
+            is_valid = await self._check_upstream(openai_api_key)
+            if is_valid is not None:
+                if shared is not None:
+                    await asyncio.to_thread(
+                        shared.put, "valid_keys", digest, "1" if is_valid else "0", ttl_seconds=self._ttl(is_valid)
+                    )
+                self._remember(digest, is_valid)
+            future.set_result(bool(is_valid))
+            return bool(is_valid)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            del self._inflight[digest]
+
+    async def _check_upstream(self, openai_api_key: str) -> bool | None:
+        """List models, which costs no tokens.
+
+        Returns None when the answer is inconclusive (network errors, 5xx) so it
+        is not cached.
+        """
+        self.upstream_checks += 1
+        try:
+            response = await http_clients.async_client().get(
+                f"{OPENAI_API_BASE}/models",
+                headers={"Authorization": f"Bearer {openai_api_key}"},
+                timeout=5
+            )
+        except Exception:
+            return None
+
+        if response.status_code in (200, 429):
+            # A rate-limited key is still a valid key
+            return True
+        if response.status_code in (401, 403):
+            return False
+        return None
+
+    @staticmethod
+    def _ttl(is_valid: bool) -> float:
+        return VALID_KEY_TTL_SECONDS if is_valid else INVALID_KEY_TTL_SECONDS
+
+    def _remember(self, digest: str, is_valid: bool):
+        self._cache[digest] = (is_valid, time.monotonic() + self._ttl(is_valid))
+        self._cache.move_to_end(digest)
+        while len(self._cache) > KEY_CACHE_SIZE:
+            self._cache.popitem(last=False)
+
+    async def forget(self, openai_api_key: str):
+        """Drop a key that stopped working, so the next login checks it upstream again."""
+        digest = self.key_digest(openai_api_key)
+        self._cache.pop(digest, None)
+        shared = get_shared_state()
+        if shared is not None:
+            await asyncio.to_thread(shared.delete, "valid_keys", digest)
+
+    def stats(self) -> dict:
+        return {
+            "size": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "upstream_checks": self.upstream_checks,
+        }
+
+
+key_validator = KeyValidator()
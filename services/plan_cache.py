@@ -0,0 +1,208 @@
+"""Cache of Portia plans for templated tasks.
+
+Templates describe a task whose variable parts are Portia plan inputs, so a plan
+produced for one set of values can be re-run with another. Cache keys are the
+template identity plus the normalized "shape" parameters that change what the
+plan looks like (e.g. whether URLs were given), never the input values.
+"""
+from __future__ import annotations
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+from services.metrics import stage_timer
+from services.shared_state import get_shared_state
+
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "128"))
+PLAN_CACHE_TTL_SECONDS = float(os.getenv("PLAN_CACHE_TTL_SECONDS", "86400"))
+PLAN_CACHE_PATH = os.getenv("PLAN_CACHE_PATH")
+
+if TYPE_CHECKING:
+    from portia import Plan, PlanInput
+
+
+@dataclass(frozen=True)
+class PlanTemplate:
+    id: str
+    task: str
+    inputs: tuple[tuple[str, str], ...]
+
+    @property
+    def version(self) -> str:
+        # Editing the template text or its inputs invalidates old plans
+        return hashlib.sha256(json.dumps([self.task, self.inputs]).encode()).hexdigest()[:12]
+
+    def plan_inputs(self) -> list[PlanInput]:
+        from portia import PlanInput
+
+        return [PlanInput(name=name, description=description) for name, description in self.inputs]
+
+    def run_inputs(self, values: dict[str, str]) -> list[PlanInput]:
+        from portia import PlanInput
+
+        return [PlanInput(name=name, description=description, value=values[name]) for name, description in self.inputs]
+
+
+def normalize_value(value):
+    if isinstance(value, str):
+        return " ".join(value.split()).lower()
+    if isinstance(value, (list, tuple)):
+        return [normalize_value(item) for item in value]
+    return value
+
+
+class PlanCache:
+    def __init__(self, max_size: int = PLAN_CACHE_SIZE, ttl_seconds: float = PLAN_CACHE_TTL_SECONDS, path: str | None = PLAN_CACHE_PATH):
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.path = Path(path) if path else None
+        self._lock = threading.Lock()
+        # key -> (created_at wall clock, plan)
+        self._entries: OrderedDict[str, tuple[float, Plan]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.planning_seconds = 0.0
+        # Persisted plans are read on first use, since parsing them imports Portia
+        self._loaded = False
+
+    @staticmethod
+    def make_key(template: PlanTemplate, shape: dict | None = None) -> str:
+        normalized = {name: normalize_value(value) for name, value in (shape or {}).items()}
+        return f"{template.id}:{template.version}:{json.dumps(normalized, sort_keys=True)}"
+
+    def get(self, key: str) -> Plan | None:
+        self.load()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                created_at, plan = entry
+                if time.time() - created_at <= self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    return plan
+                del self._entries[key]
+        return self._get_shared(key)
+
+    def _get_shared(self, key: str) -> Plan | None:
+        """Adopt a plan another worker made for the same template."""
+        shared = get_shared_state()
+        value = shared.get("plans", key) if shared is not None else None
+        if value is None:
+            return None
+        from portia import Plan
+
+        entry = json.loads(value)
+        plan = Plan.model_validate_json(entry["plan"])
+        self._store(key, plan, entry["created_at"])
+        return plan
+
+    def _store(self, key: str, plan: Plan, created_at: float):
+        with self._lock:
+            self._entries[key] = (created_at, plan)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def put(self, key: str, plan: Plan, created_at: float | None = None):
+        self.load()
+        created_at = created_at or time.time()
+        self._store(key, plan, created_at)
+        self._save()
+        shared = get_shared_state()
+        if shared is not None:
+            shared.put(
+                "plans", key, json.dumps({"created_at": created_at, "plan": plan.model_dump_json()}),
+                ttl_seconds=self.ttl_seconds - (time.time() - created_at),
+            )
+
+    def get_or_plan(self, portia, template: PlanTemplate, shape: dict | None = None) -> Plan:
+        """Return a cached plan for the template, planning with ``portia`` on a miss."""
+        key = self.make_key(template, shape)
+        plan = self.get(key)
+        if plan is not None:
+            with self._lock:
+                self.hits += 1
+            ensure_plan_stored(portia, plan)
+            return plan
+
+        started = time.perf_counter()
+        with stage_timer("plan"):
+            plan = portia.plan(template.task, plan_inputs=template.plan_inputs())
+        elapsed = time.perf_counter() - started
+        with self._lock:
+            self.misses += 1
+            self.planning_seconds += elapsed
+        self.put(key, plan)
+        return plan
+
+    def stats(self) -> dict:
+        with self._lock:
+            avg_planning_seconds = self.planning_seconds / self.misses if self.misses else 0.0
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "avg_planning_seconds": avg_planning_seconds,
+                "estimated_seconds_saved": self.hits * avg_planning_seconds,
+            }
+
+    def clear(self):
+        self.load()
+        with self._lock:
+            self._entries.clear()
+        self._save()
+
+    def load(self):
+        """Read the persisted plans, once."""
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            self._load()
+
+    def _load(self):
+        if self.path is None or not self.path.exists():
+            return
+        from portia import Plan
+
+        try:
+            data = json.loads(self.path.read_text(encoding="utf-8"))
+            for key, entry in data.items():
+                if time.time() - entry["created_at"] <= self.ttl_seconds:
+                    self._entries[key] = (entry["created_at"], Plan.model_validate_json(entry["plan"]))
+        except Exception as e:
+            print(f"Ignoring unreadable plan cache {self.path}: {e}")
+
+    def _save(self):
+        if self.path is None:
+            return
+        with self._lock:
+            data = {
+                key: {"created_at": created_at, "plan": plan.model_dump_json()}
+                for key, (created_at, plan) in self._entries.items()
+            }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(data), encoding="utf-8")
+        tmp_path.replace(self.path)
+
+
+def ensure_plan_stored(portia, plan: Plan):
+    """Make a plan created by another Portia instance known to this one's storage."""
+    try:
+        portia.storage.get_plan(plan.id)
+    except Exception:
+        portia.storage.save_plan(plan)
+
+
+plan_cache = PlanCache()
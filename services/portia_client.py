@@ -1,109 +1,130 @@
-from portia import (
-    ActionClarification,
-    InputClarification,
-    MultipleChoiceClarification,
-    PlanRunState,
-    Portia,
-    PortiaToolRegistry,
-    default_config,
-)
-import os
+from services.executor import QueueFullError, get_executor
+from services.key_validator import is_key_rejected, key_validator
+from services.metrics import clarifications, stage_timer
+from services.plan_cache import PlanTemplate, ensure_plan_stored, plan_cache
+from services.portia_factory import portia_factory
+from services.progress import ProgressChannel
 
 class PortiaClient:
     def __init__(self, openai_api_key: str, user_id: str):
         self.openai_api_key = openai_api_key
         self.user_id = user_id
-        os.environ["OPENAI_API_KEY"] = openai_api_key
-        if os.getenv("PORTIA_API_KEY"):
-            os.environ["PORTIA_API_KEY"] = os.getenv("PORTIA_API_KEY")
     
-    def create_portia_instance(self):
-        return Portia(tools=PortiaToolRegistry(default_config()))
+    def create_portia_instance(self, progress: ProgressChannel = None):
+        if progress is None:
+            return portia_factory.create_portia(self.openai_api_key)
+        return portia_factory.create_portia(self.openai_api_key, execution_hooks=progress.execution_hooks())
     
-    async def run_task(self, task: str):
+    async def run_task(self, task: str, is_disconnected=None):
+        result = await get_executor("email").submit(self._run_task_sync, task, is_disconnected=is_disconnected)
+        return await self._forget_rejected_key(result)
+    
+    async def run_template(self, template: PlanTemplate, inputs: dict[str, str], shape: dict = None, is_disconnected=None, progress: ProgressChannel = None, plan=None):
+        executor = get_executor("email")
+        if executor.kind == "process":
+            # Hooks push events back to this process, so they need a thread pool
+            progress = None
+        result = await executor.submit(
+            self._run_template_sync, template, inputs, shape, progress, plan, is_disconnected=is_disconnected
+        )
+        return await self._forget_rejected_key(result)
+
+    async def _forget_rejected_key(self, result: dict) -> dict:
+        if result.pop("key_rejected", False):
+            # The key stopped working after login; make the next login check it again
+            await key_validator.forget(self.openai_api_key)
+        return result
+    
+    async def prepare_template(self, template: PlanTemplate, shape: dict = None):
+        """Plan ``template`` once so a batch of runs can share the plan."""
+        return await get_executor("email").submit(self._prepare_template_sync, template, shape)
+    
+    def _prepare_template_sync(self, template: PlanTemplate, shape: dict = None):
+        return plan_cache.get_or_plan(self.create_portia_instance(), template, shape)
+    
+    def _run_task_sync(self, task: str):
         try:
             portia = self.create_portia_instance()
-            
-            plan = portia.plan(task)
+            with stage_timer("plan"):
+                plan = portia.plan(task)
             plan_run = portia.run_plan(plan, end_user=self.user_id)
-            
-            while plan_run.state == PlanRunState.NEED_CLARIFICATION:
-                for clarification in plan_run.get_outstanding_clarifications():
-                    if isinstance(clarification, ActionClarification):
-                        return {
-                            "success": False,
-                            "error": "OAuth authentication required",
-                            "result": f"OAuth required: {clarification.user_guidance}",
-                            "needs_oauth": True,
-                            "oauth_url": str(clarification.action_url),
-                            "user_id": self.user_id
-                        }
-                    
-                    elif isinstance(clarification, (InputClarification, MultipleChoiceClarification)):
-                        return {
-                            "success": False,
-                            "error": "User input required",
-                            "result": f"Input needed: {clarification.user_guidance}",
-                            "needs_input": True,
-                            "user_id": self.user_id
-                        }
-                
-                break
-            
-            return {
-                "success": True,
-                "result": plan_run.outputs.final_output,
-                "user_id": self.user_id
-            }
-            
+            return self._handle_plan_run(plan_run)
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
-                "user_id": self.user_id
+                "user_id": self.user_id,
+                "key_rejected": is_key_rejected(e)
             }
     
-    def _run_task_sync(self, task: str):
+    def _run_template_sync(self, template: PlanTemplate, inputs: dict[str, str], shape: dict = None, progress: ProgressChannel = None, plan=None):
         try:
-            portia = self.create_portia_instance()
-            plan = portia.plan(task)
-            plan_run = portia.run_plan(plan, end_user=self.user_id)
-            
-            while plan_run.state == PlanRunState.NEED_CLARIFICATION:
-                for clarification in plan_run.get_outstanding_clarifications():
-                    if isinstance(clarification, ActionClarification):
-                        return {
-                            "success": False,
-                            "error": "OAuth authentication required",
-                            "result": f"OAuth required: {clarification.user_guidance}",
-                            "needs_oauth": True,
-                            "oauth_url": str(clarification.action_url),
-                            "user_id": self.user_id
-                        }
-                break
-            
-            return {
-                "success": True,
-                "result": plan_run.outputs.final_output,
-                "user_id": self.user_id
-            }
+            portia = self.create_portia_instance(progress)
+            if plan is None:
+                plan = plan_cache.get_or_plan(portia, template, shape)
+            else:
+                ensure_plan_stored(portia, plan)
+            if progress is not None:
+                progress.plan_created(plan)
+            plan_run = portia.run_plan(plan, end_user=self.user_id, plan_run_inputs=template.run_inputs(inputs))
+            return self._handle_plan_run(plan_run, progress)
         except Exception as e:
             return {
                 "success": False,
                 "error": str(e),
-                "user_id": self.user_id
+                "user_id": self.user_id,
+                "key_rejected": is_key_rejected(e)
             }
     
+    def _handle_plan_run(self, plan_run, progress: ProgressChannel = None):
+        from portia import ActionClarification, InputClarification, MultipleChoiceClarification, PlanRunState
+
+        while plan_run.state == PlanRunState.NEED_CLARIFICATION:
+            for clarification in plan_run.get_outstanding_clarifications():
+                if isinstance(clarification, ActionClarification):
+                    clarifications.inc(kind="oauth")
+                    if progress is not None:
+                        progress.clarification("oauth", clarification.user_guidance, str(clarification.action_url))
+                    return {
+                        "success": False,
+                        "error": "OAuth authentication required",
+                        "result": f"OAuth required: {clarification.user_guidance}",
+                        "needs_oauth": True,
+                        "oauth_url": str(clarification.action_url),
+                        "user_id": self.user_id
+                    }
+                
+                elif isinstance(clarification, (InputClarification, MultipleChoiceClarification)):
+                    clarifications.inc(kind="input")
+                    if progress is not None:
+                        progress.clarification("input", clarification.user_guidance)
+                    return {
+                        "success": False,
+                        "error": "User input required",
+                        "result": f"Input needed: {clarification.user_guidance}",
+                        "needs_input": True,
+                        "user_id": self.user_id
+                    }
+            
+            break
+        
+        return {
+            "success": True,
+            "result": plan_run.outputs.final_output,
+            "user_id": self.user_id
+        }
+    
     async def plan_task(self, task: str):
         try:
-            portia = self.create_portia_instance()
-            plan = portia.plan(task)
+            plan = await get_executor("email").submit(self._plan_sync, task)
             
             return {
                 "success": True,
                 "result": plan.pretty_print(),
                 "user_id": self.user_id
             }
+        except QueueFullError:
+            raise
         except Exception as e:
             return {
                 "success": False,
@@ -111,11 +132,22 @@ class PortiaClient:
                 "user_id": self.user_id
             }
     
+    def _plan_sync(self, task: str):
+        portia = self.create_portia_instance()
+        with stage_timer("plan"):
+            return portia.plan(task)
+    
     @staticmethod
     async def test_openai_key(openai_api_key: str) -> bool:
         try:
-            os.environ["OPENAI_API_KEY"] = openai_api_key
-            portia = Portia(tools=PortiaToolRegistry(default_config()))
+            return await get_executor("email").submit(PortiaClient._test_openai_key_sync, openai_api_key)
+        except Exception:
+            return False
+    
+    @staticmethod
+    def _test_openai_key_sync(openai_api_key: str) -> bool:
+        try:
+            portia = portia_factory.create_portia(openai_api_key)
             plan = portia.plan("Say hello")
             plan_run = portia.run_plan(plan)
             return True
@@ -0,0 +1,233 @@
+"""Process-wide factory for tool registries and per-user Portia instances.
+
+Portia and the custom tools are imported on first use (or by the startup warm-up),
+so importing this module stays cheap.
+"""
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import cache
+from typing import TYPE_CHECKING
+from pydantic import SecretStr
+from services.metrics import METRICS_ENABLED, stage_duration, tool_call_duration
+
+REGISTRY_TTL_SECONDS = float(os.getenv("PORTIA_REGISTRY_TTL_SECONDS", "3600"))
+MAX_CACHED_CONFIGS = 256
+
+if TYPE_CHECKING:
+    from portia import Config, Portia
+    from portia.execution_hooks import ExecutionHooks
+
+# Registry names handed out by the factory
+DEFAULT_TOOLS = "default"
+DOCUMENT_TOOLS = "documents"
+
+
+class _Timing:
+    def __init__(self):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.last_seconds = 0.0
+        self.max_seconds = 0.0
+
+    def record(self, seconds: float):
+        self.count += 1
+        self.total_seconds += seconds
+        self.last_seconds = seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "total_seconds": self.total_seconds,
+            "last_seconds": self.last_seconds,
+            "max_seconds": self.max_seconds,
+            "avg_seconds": self.total_seconds / self.count if self.count else 0.0,
+        }
+
+
+HOOK_NAMES = (
+    "before_plan_run",
+    "after_plan_run",
+    "before_step_execution",
+    "after_step_execution",
+    "before_tool_call",
+    "after_tool_call",
+)
+
+
+def combine_execution_hooks(*hooks: ExecutionHooks) -> ExecutionHooks:
+    """Run several hook sets in order; the first outcome that changes the run wins."""
+    from portia.execution_hooks import BeforeStepExecutionOutcome, ExecutionHooks
+
+    combined = {}
+    for name in HOOK_NAMES:
+        callbacks = [getattr(hook, name) for hook in hooks if getattr(hook, name, None) is not None]
+        if len(callbacks) == 1:
+            combined[name] = callbacks[0]
+        elif callbacks:
+            def call_all(*args, _callbacks=callbacks):
+                outcome = None
+                for callback in _callbacks:
+                    result = callback(*args)
+                    if outcome is None or outcome == BeforeStepExecutionOutcome.CONTINUE:
+                        outcome = result
+                return outcome
+            combined[name] = call_all
+    return ExecutionHooks(**combined)
+
+
+# Steps and tool calls run one at a time on a worker thread
+_hook_timings = threading.local()
+
+
+def _metrics_before_step(plan, plan_run, step):
+    from portia.execution_hooks import BeforeStepExecutionOutcome
+
+    _hook_timings.step_started = time.perf_counter()
+    return BeforeStepExecutionOutcome.CONTINUE
+
+
+def _metrics_after_step(plan, plan_run, step, output):
+    started = getattr(_hook_timings, "step_started", None)
+    if started is not None:
+        stage_duration.observe(time.perf_counter() - started, stage="plan_step")
+
+
+def _metrics_before_tool_call(tool, args, plan_run, step):
+    _hook_timings.tool_started = time.perf_counter()
+    return None
+
+
+def _metrics_after_tool_call(tool, output, plan_run, step):
+    started = getattr(_hook_timings, "tool_started", None)
+    if started is not None:
+        tool_call_duration.observe(time.perf_counter() - started, tool=tool.id)
+    return None
+
+
+@cache
+def metrics_hooks() -> ExecutionHooks:
+    from portia.execution_hooks import ExecutionHooks
+
+    return ExecutionHooks(
+        before_step_execution=_metrics_before_step,
+        after_step_execution=_metrics_after_step,
+        before_tool_call=_metrics_before_tool_call,
+        after_tool_call=_metrics_after_tool_call,
+    )
+
+
+class PortiaFactory:
+    def __init__(self, ttl_seconds: float = REGISTRY_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        # Guards the fields below and is only held briefly, so stats() never waits on a build
+        self._lock = threading.Lock()
+        # Serializes the first registry build; held while Portia and the tools load
+        self._build_lock = threading.Lock()
+        self._registries: dict[str, object] = {}
+        self._built_at = 0.0
+        self._refreshing = False
+        self._configs: OrderedDict[str, Config] = OrderedDict()
+        self._registry_builds = _Timing()
+        self._handle_setup = _Timing()
+
+    @staticmethod
+    def _registry_config() -> Config:
+        """Config for loading the Portia tool definitions, which use the Portia key and no user's key."""
+        from portia import Config, LLMProvider
+
+        # Never used to call a model: the registry only talks to the Portia API
+        return Config.from_default(llm_provider=LLMProvider.OPENAI, openai_api_key=SecretStr("unused"))
+
+    def _build_registries(self) -> dict[str, object]:
+        from portia import PortiaToolRegistry
+        from custom_tools import custom_tool_registry
+
+        started = time.perf_counter()
+        default_tools = PortiaToolRegistry(self._registry_config())
+        registries = {
+            DEFAULT_TOOLS: default_tools,
+            DOCUMENT_TOOLS: default_tools + custom_tool_registry,
+        }
+        with self._lock:
+            self._registry_builds.record(time.perf_counter() - started)
+        return registries
+
+    def _refresh_in_background(self):
+        try:
+            registries = self._build_registries()
+            with self._lock:
+                self._registries = registries
+                self._built_at = time.monotonic()
+        except Exception as e:
+            # Keep serving the previous registries; the next lookup retries
+            print(f"Tool registry refresh failed: {e}")
+        finally:
+            with self._lock:
+                self._refreshing = False
+
+    def get_registry(self, name: str = DEFAULT_TOOLS):
+        with self._lock:
+            if self._registries:
+                if time.monotonic() - self._built_at > self.ttl_seconds and not self._refreshing:
+                    self._refreshing = True
+                    threading.Thread(target=self._refresh_in_background, name="portia-registry-refresh", daemon=True).start()
+                return self._registries[name]
+
+        # First use builds synchronously; concurrent callers wait for that one build
+        with self._build_lock:
+            with self._lock:
+                if self._registries:
+                    return self._registries[name]
+            registries = self._build_registries()
+            with self._lock:
+                self._registries = registries
+                self._built_at = time.monotonic()
+            return registries[name]
+
+    def _get_config(self, openai_api_key: str) -> Config:
+        key = hashlib.sha256(openai_api_key.encode()).hexdigest()
+        with self._lock:
+            config = self._configs.get(key)
+            if config is not None:
+                self._configs.move_to_end(key)
+                return config
+
+        from portia import Config
+
+        config = Config.from_default(openai_api_key=SecretStr(openai_api_key))
+        with self._lock:
+            self._configs[key] = config
+            if len(self._configs) > MAX_CACHED_CONFIGS:
+                self._configs.popitem(last=False)
+        return config
+
+    def create_portia(self, openai_api_key: str, tools: str = DEFAULT_TOOLS, **kwargs) -> Portia:
+        """Return a Portia handle using the shared registry and the user's credentials."""
+        from portia import Portia
+
+        tool_registry = self.get_registry(tools)
+        if METRICS_ENABLED:
+            hooks = kwargs.get("execution_hooks")
+            kwargs["execution_hooks"] = combine_execution_hooks(metrics_hooks(), hooks) if hooks is not None else metrics_hooks()
+        started = time.perf_counter()
+        portia = Portia(config=self._get_config(openai_api_key), tools=tool_registry, **kwargs)
+        with self._lock:
+            self._handle_setup.record(time.perf_counter() - started)
+        return portia
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "registry_age_seconds": time.monotonic() - self._built_at if self._registries else None,
+                "registry_builds": self._registry_builds.as_dict(),
+                "handle_setup": self._handle_setup.as_dict(),
+                "cached_configs": len(self._configs),
+            }
+
+
+portia_factory = PortiaFactory()
@@ -0,0 +1,282 @@
+"""On-demand per-request profiling, written as cProfile stats and flamegraph-ready folded stacks.
+
+A request is profiled when it carries ``X-Profile-Token`` matching PROFILING_TOKEN, or
+is picked by PROFILING_SAMPLE_RATE. Nothing is installed unless PROFILING_ENABLED is set.
+"""
+import asyncio
+import contextvars
+import cProfile
+import hmac
+import os
+import random
+import re
+import secrets
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from functools import lru_cache, wraps
+from pathlib import Path
+from typing import Any, Callable
+
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_SAMPLE_RATE = float(os.getenv("PROFILING_SAMPLE_RATE", "0"))
+PROFILING_PATH_PREFIX = os.getenv("PROFILING_PATH_PREFIX", "/api/")
+PROFILING_INTERVAL_SECONDS = float(os.getenv("PROFILING_INTERVAL_SECONDS", "0.005"))
+PROFILING_MAX_SECONDS = float(os.getenv("PROFILING_MAX_SECONDS", "300"))
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".cache/profiles")
+PROFILE_MAX_PROFILES = int(os.getenv("PROFILE_MAX_PROFILES", "50"))
+
+PROFILE_TOKEN_HEADER = b"x-profile-token"
+PROFILE_ID_HEADER = b"x-profile-id"
+MAX_STACK_DEPTH = 200
+_STDLIB_DIR = sysconfig.get_paths()["stdlib"] + os.sep
+
+_current_profile: contextvars.ContextVar["RequestProfile | None"] = contextvars.ContextVar("current_profile", default=None)
+
+
+@lru_cache(maxsize=4096)
+def _short_path(filename: str) -> str:
+    for marker in ("site-packages/", "dist-packages/"):
+        if marker in filename:
+            return filename.split(marker, 1)[1]
+    if filename.startswith(_STDLIB_DIR):
+        return filename[len(_STDLIB_DIR):]
+    try:
+        return str(Path(filename).relative_to(Path.cwd()))
+    except ValueError:
+        return filename
+
+
+def fold_stack(frame) -> str:
+    """Render a frame and its callers as one folded-stack line, outermost first."""
+    names = []
+    while frame is not None and len(names) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        names.append(f"{code.co_qualname} ({_short_path(code.co_filename)})")
+        frame = frame.f_back
+    return ";".join(reversed(names))
+
+
+def _thread_cpu_seconds(ident: int) -> float | None:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None
+
+
+class RequestProfile:
+    """Profile data for one request: cProfile stats plus stacks sampled from its threads."""
+
+    def __init__(self, profile_id: str, label: str):
+        self.id = profile_id
+        self.label = label
+        self.started = time.perf_counter()
+        self.cpu_profile: cProfile.Profile | None = None
+        # Stack -> sample count (wall clock) and CPU microseconds
+        self.wall: Counter[str] = Counter()
+        self.cpu: Counter[str] = Counter()
+        self._threads: Counter[int] = Counter()
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name=f"profile-sampler-{profile_id}", daemon=True)
+
+    def attach_thread(self):
+        with self._threads_lock:
+            self._threads[threading.get_ident()] += 1
+
+    def detach_thread(self):
+        ident = threading.get_ident()
+        with self._threads_lock:
+            self._threads[ident] -= 1
+            if not self._threads[ident]:
+                del self._threads[ident]
+
+    def start(self):
+        try:
+            self.cpu_profile = cProfile.Profile()
+            self.cpu_profile.enable()
+        except ValueError as e:
+            # Another profiler (e.g. a debugger) holds the interpreter's profiling hook
+            print(f"CPU profiling unavailable: {e}")
+            self.cpu_profile = None
+        self._sampler.start()
+
+    def stop(self):
+        self._stop.set()
+        self._sampler.join()
+        if self.cpu_profile is not None:
+            self.cpu_profile.disable()
+
+    def _sample(self):
+        own_ident = threading.get_ident()
+        last_cpu: dict[int, float] = {}
+        deadline = time.monotonic() + PROFILING_MAX_SECONDS
+        while not self._stop.wait(PROFILING_INTERVAL_SECONDS) and time.monotonic() < deadline:
+            with self._threads_lock:
+                idents = [ident for ident in self._threads if ident != own_ident]
+            frames = sys._current_frames()
+            for ident in idents:
+                frame = frames.get(ident)
+                if frame is None:
+                    continue
+                stack = fold_stack(frame)
+                self.wall[stack] += 1
+                cpu = _thread_cpu_seconds(ident)
+                if cpu is not None:
+                    previous = last_cpu.get(ident)
+                    last_cpu[ident] = cpu
+                    if previous is not None and cpu > previous:
+                        self.cpu[stack] += round((cpu - previous) * 1e6)
+            del frames
+
+    def write(self, directory: Path) -> list[Path]:
+        stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+        base = directory / f"{stamp}-{self.label}-{self.id}"
+        written = []
+        if self.cpu_profile is not None:
+            path = base.with_name(base.name + ".prof")
+            self.cpu_profile.dump_stats(path)
+            written.append(path)
+        for suffix, samples in ((".wall.folded", self.wall), (".cpu.folded", self.cpu)):
+            if samples:
+                path = base.with_name(base.name + suffix)
+                path.write_text("".join(f"{stack} {count}\n" for stack, count in samples.most_common()), encoding="utf-8")
+                written.append(path)
+        return written
+
+
+class Profiler:
+    """Profiles at most one request at a time; others run unprofiled."""
+
+    def __init__(self, directory: str = PROFILE_DIR, max_profiles: int = PROFILE_MAX_PROFILES,
+                 token: str = PROFILING_TOKEN, sample_rate: float = PROFILING_SAMPLE_RATE):
+        self.directory = Path(directory)
+        self.max_profiles = max_profiles
+        self.token = token
+        self.sample_rate = sample_rate
+        self._busy = threading.Lock()
+        self.captured = 0
+        self.skipped_busy = 0
+        self.failures = 0
+        self.last_profile: str | None = None
+
+    def wants(self, scope) -> bool:
+        if not scope["path"].startswith(PROFILING_PATH_PREFIX):
+            return False
+        if self.token:
+            for name, value in scope["headers"]:
+                if name == PROFILE_TOKEN_HEADER:
+                    return hmac.compare_digest(value, self.token.encode())
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, path: str) -> RequestProfile | None:
+        if not self._busy.acquire(blocking=False):
+            self.skipped_busy += 1
+            return None
+        label = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_")[:60] or "root"
+        profile = RequestProfile(secrets.token_hex(6), label)
+        try:
+            profile.start()
+        except BaseException:
+            self._busy.release()
+            raise
+        # The event loop thread serves this request between awaits
+        profile.attach_thread()
+        return profile
+
+    def finish(self, profile: RequestProfile):
+        try:
+            profile.stop()
+        finally:
+            self._busy.release()
+
+    def save(self, profile: RequestProfile):
+        """Write the profile files and prune the oldest profiles beyond ``max_profiles``."""
+        try:
+            self.directory.mkdir(parents=True, exist_ok=True)
+            written = profile.write(self.directory)
+            self._prune()
+        except Exception as e:
+            self.failures += 1
+            print(f"Failed to write profile {profile.id}: {e}")
+            return
+        self.captured += 1
+        self.last_profile = str(written[0]) if written else None
+        print(f"Profiled {profile.label} in {time.perf_counter() - profile.started:.2f}s: {', '.join(str(p) for p in written)}")
+
+    def _prune(self):
+        # Each profile is a few files sharing one "<time>-<label>-<id>" stem
+        profiles: dict[str, list[Path]] = {}
+        for path in self.directory.glob("*"):
+            profiles.setdefault(path.name.split(".", 1)[0], []).append(path)
+        oldest_first = sorted(profiles.values(), key=lambda paths: max(path.stat().st_mtime for path in paths))
+        for paths in oldest_first[:max(0, len(oldest_first) - self.max_profiles)]:
+            for path in paths:
+                path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": PROFILING_ENABLED,
+            "sample_rate": self.sample_rate,
+            "token_configured": bool(self.token),
+            "directory": str(self.directory),
+            "captured": self.captured,
+            "skipped_busy": self.skipped_busy,
+            "failures": self.failures,
+            "last_profile": self.last_profile,
+        }
+
+
+profiler = Profiler()
+
+
+def bind_profile(fn: Callable[..., Any]) -> Callable[..., Any]:
+    """Wrap ``fn`` so the worker thread running it is sampled for the current request's profile."""
+    profile = _current_profile.get()
+    if profile is None:
+        return fn
+
+    @wraps(fn)
+    def run(*args, **kwargs):
+        profile.attach_thread()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            profile.detach_thread()
+
+    return run
+
+
+class ProfilingMiddleware:
+    """ASGI middleware profiling selected requests; the response carries ``X-Profile-Id``."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not profiler.wants(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = profiler.start(scope["path"])
+        if profile is None:
+            await self.app(scope, receive, send)
+            return
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", []), (PROFILE_ID_HEADER, profile.id.encode())]
+            await send(message)
+
+        token = _current_profile.set(profile)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            _current_profile.reset(token)
+            profiler.finish(profile)
+            # The response has been sent; writing only delays the end of this task
+            await asyncio.to_thread(profiler.save, profile)
@@ -0,0 +1,125 @@
+"""Plan run progress events, pushed from worker threads to Server-Sent Events streams."""
+import asyncio
+import json
+import os
+from typing import TYPE_CHECKING, Any, AsyncIterator, Awaitable, Callable
+from services.executor import ClientDisconnectedError, QueueFullError
+
+PROGRESS_SUMMARY_CHARS = int(os.getenv("PROGRESS_SUMMARY_CHARS", "280"))
+SSE_KEEPALIVE_SECONDS = float(os.getenv("SSE_KEEPALIVE_SECONDS", "15"))
+FILE_WRITING_TOOLS = {"file_writer_tool", "pdf_generator_tool"}
+# Disable proxy buffering so events reach the client as they are produced
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+if TYPE_CHECKING:
+    from portia.execution_hooks import ExecutionHooks
+
+
+def summarize(value: Any, limit: int = PROGRESS_SUMMARY_CHARS) -> str:
+    text = str(value) if value is not None else ""
+    return text if len(text) <= limit else text[:limit - 1] + "…"
+
+
+def format_sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+class ProgressChannel:
+    """Collects events for one request.
+
+    ``emit`` may be called from any thread; events are handed to the event
+    loop that created the channel. Once the client goes away the channel is
+    closed and the next hook call aborts the plan run.
+    """
+
+    def __init__(self):
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue[tuple[str, dict]] = asyncio.Queue()
+        self._tool_args: dict[int, dict] = {}
+        self.closed = False
+
+    def emit(self, event: str, **data):
+        if self.closed:
+            return
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, (event, data))
+
+    def close(self):
+        self.closed = True
+
+    def _check_open(self):
+        if self.closed:
+            raise ClientDisconnectedError("Client disconnected, stopping the plan run")
+
+    def execution_hooks(self) -> "ExecutionHooks":
+        from portia.execution_hooks import ExecutionHooks
+
+        return ExecutionHooks(
+            before_step_execution=self._before_step,
+            after_step_execution=self._after_step,
+            before_tool_call=self._before_tool_call,
+            after_tool_call=self._after_tool_call,
+        )
+
+    def _before_step(self, plan, plan_run, step):
+        from portia.execution_hooks import BeforeStepExecutionOutcome
+
+        self._check_open()
+        self.emit("step_started", index=plan_run.current_step_index, task=step.task, tool=step.tool_id)
+        return BeforeStepExecutionOutcome.CONTINUE
+
+    def _after_step(self, plan, plan_run, step, output):
+        summary = getattr(output, "summary", None) or output.get_value()
+        self.emit("step_finished", index=plan_run.current_step_index, output=summarize(summary))
+
+    def _before_tool_call(self, tool, args, plan_run, step):
+        self._check_open()
+        self._tool_args[plan_run.current_step_index] = args
+        self.emit("tool_called", index=plan_run.current_step_index, tool=tool.id)
+        return None
+
+    def _after_tool_call(self, tool, output, plan_run, step):
+        args = self._tool_args.pop(plan_run.current_step_index, {})
+        self.emit("tool_output", index=plan_run.current_step_index, tool=tool.id, output=summarize(output))
+        if tool.id in FILE_WRITING_TOOLS:
+            self.emit("file_written", path=args.get("filename"), tool=tool.id)
+        return None
+
+    def plan_created(self, plan):
+        self.emit("plan_created", plan_id=str(plan.id), steps=[step.task for step in plan.steps])
+
+    def clarification(self, kind: str, guidance: str, url: str = None):
+        self.emit("clarification", type=kind, guidance=guidance, url=url)
+
+    async def stream(self, job: Awaitable[Any], to_payload: Callable[[Any], dict]) -> AsyncIterator[str]:
+        """Run ``job`` and yield its events as SSE frames, ending with its result."""
+        task = asyncio.ensure_future(job)
+        try:
+            yield format_sse("accepted", {})
+            while True:
+                getter = asyncio.ensure_future(self._queue.get())
+                done, _ = await asyncio.wait({getter, task}, timeout=SSE_KEEPALIVE_SECONDS, return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    event, data = getter.result()
+                    yield format_sse(event, data)
+                    continue
+                getter.cancel()
+                if task in done:
+                    break
+                # Comment lines keep proxies from closing an idle stream
+                yield ": keepalive\n\n"
+
+            # Events emitted just before the job finished
+            while not self._queue.empty():
+                event, data = self._queue.get_nowait()
+                yield format_sse(event, data)
+
+            try:
+                yield format_sse("completed", to_payload(task.result()))
+            except QueueFullError as e:
+                yield format_sse("error", {"status": 503, "detail": str(e)})
+            except Exception as e:
+                yield format_sse("error", {"status": 500, "detail": str(e)})
+        finally:
+            # The client went away (or the stream ended); stop the plan run too
+            self.close()
+            task.cancel()
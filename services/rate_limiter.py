@@ -0,0 +1,101 @@
+"""Token buckets that pace outbound sends to stay inside provider quotas."""
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.shared_state import get_shared_state
+
+# Gmail allows roughly 2.5 messages.send calls per second per user (250 quota
+# units/s at 100 units each); stay a little under that by default
+GMAIL_SEND_RATE_PER_SECOND = float(os.getenv("GMAIL_SEND_RATE_PER_SECOND", "2"))
+GMAIL_SEND_BURST = int(os.getenv("GMAIL_SEND_BURST", "5"))
+RATE_LIMITER_MAX_BUCKETS = int(os.getenv("RATE_LIMITER_MAX_BUCKETS", "10000"))
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: int):
+        self.rate = rate_per_second
+        self.capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _reserve(self) -> float:
+        """Take a token, returning how long the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            # A negative balance is a queue of callers waiting for refills
+            return 0.0 if self._tokens >= 0 else -self._tokens / self.rate
+
+    async def acquire(self) -> float:
+        wait = self._reserve()
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return wait
+
+    def available(self) -> float:
+        with self._lock:
+            return min(self.capacity, self._tokens + (time.monotonic() - self._updated) * self.rate)
+
+
+class RateLimiter:
+    """One bucket per key (e.g. per user, since Gmail quotas are per mailbox).
+
+    With several workers the buckets live in the shared state store, so the
+    rate holds across all of them.
+    """
+
+    def __init__(self, name: str, rate_per_second: float, capacity: int, max_buckets: int = RATE_LIMITER_MAX_BUCKETS):
+        self.name = name
+        self.rate_per_second = rate_per_second
+        self.capacity = capacity
+        self.max_buckets = max_buckets
+        self._buckets: OrderedDict[str, TokenBucket] = OrderedDict()
+        self._lock = threading.Lock()
+        self.acquired = 0
+        self.delayed = 0
+        self.waited_seconds = 0.0
+
+    def bucket(self, key: str) -> TokenBucket:
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = TokenBucket(self.rate_per_second, self.capacity)
+                while len(self._buckets) > self.max_buckets:
+                    self._buckets.popitem(last=False)
+            self._buckets.move_to_end(key)
+            return bucket
+
+    async def acquire(self, key: str) -> float:
+        shared = get_shared_state()
+        if shared is not None:
+            # The store's write transaction can wait on other workers; keep it off the event loop
+            wait = await asyncio.to_thread(shared.reserve_token, f"{self.name}:{key}", self.rate_per_second, self.capacity)
+            if wait > 0:
+                await asyncio.sleep(wait)
+        else:
+            wait = await self.bucket(key).acquire()
+        with self._lock:
+            self.acquired += 1
+            if wait > 0:
+                self.delayed += 1
+                self.waited_seconds += wait
+        return wait
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "rate_per_second": self.rate_per_second,
+                "burst": self.capacity,
+                "buckets": len(self._buckets),
+                "acquired": self.acquired,
+                "delayed": self.delayed,
+                "waited_seconds": self.waited_seconds,
+            }
+
+
+gmail_send_limiter = RateLimiter("gmail_send", GMAIL_SEND_RATE_PER_SECOND, GMAIL_SEND_BURST)
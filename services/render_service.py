@@ -0,0 +1,187 @@
+"""Render generated markdown to PDF/HTML in a process pool, cached by content hash."""
+import asyncio
+import hashlib
+import os
+import secrets
+import shutil
+import tempfile
+from pathlib import Path
+from services.executor import get_executor
+from services.metrics import stage_timer
+
+RENDER_CACHE_DIR = os.getenv("RENDER_CACHE_DIR", ".cache/render")
+RENDER_CACHE_MAX_FILES = int(os.getenv("RENDER_CACHE_MAX_FILES", "500"))
+# Bump when renderer output changes so stale cache entries are not reused
+RENDERER_VERSION = "1"
+RENDER_FORMATS = {"pdf": ".pdf", "html": ".html"}
+HTML_EXTENSIONS = ["fenced_code", "tables", "codehilite", "toc", "sane_lists"]
+
+HTML_PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+<meta charset="utf-8">
+<title>{title}</title>
+<style>
+body {{ font-family: -apple-system, "Segoe UI", Helvetica, Arial, sans-serif; max-width: 48rem; margin: 2rem auto; padding: 0 1rem; line-height: 1.6; color: #222; }}
+pre {{ padding: 0.75rem; overflow-x: auto; border-radius: 4px; }}
+table {{ border-collapse: collapse; }}
+th, td {{ border: 1px solid #ccc; padding: 0.3rem 0.6rem; }}
+{pygments_css}
+</style>
+</head>
+<body>
+{body}
+</body>
+</html>
+"""
+
+
+def render_title(markdown_path: str | Path) -> str:
+    return Path(markdown_path).stem.replace("_", " ").title()
+
+
+def render_cache_key(content: bytes, output_format: str, title: str) -> str:
+    digest = hashlib.sha256()
+    for part in (RENDERER_VERSION, output_format, title):
+        digest.update(part.encode())
+        digest.update(b"\0")
+    digest.update(content)
+    return digest.hexdigest()
+
+
+def _render_html(source: Path, destination: Path, title: str):
+    import html
+    import markdown
+    from pygments.formatters import HtmlFormatter
+
+    body = markdown.markdown(source.read_text(encoding="utf-8"), extensions=HTML_EXTENSIONS)
+    page = HTML_PAGE.format(
+        title=html.escape(title),
+        pygments_css=HtmlFormatter().get_style_defs(".codehilite"),
+        body=body,
+    )
+    # Unique per process and thread, so concurrent renders of one destination never share a temp file
+    with tempfile.NamedTemporaryFile(dir=destination.parent, suffix=".tmp", delete=False) as tmp:
+        tmp.write(page.encode("utf-8"))
+    os.replace(tmp.name, destination)
+
+
+def render_to_cache(source: str, output_format: str, destination: str, title: str) -> str:
+    """Render ``source`` into the cache file ``destination``.
+
+    Runs inside a worker process, so it only takes and returns plain strings.
+    """
+    source_path, destination_path = Path(source), Path(destination)
+    destination_path.parent.mkdir(parents=True, exist_ok=True)
+    if output_format == "pdf":
+        from custom_tools.markdown_pdf import render_markdown_file
+        render_markdown_file(source_path, destination_path, title)
+    elif output_format == "html":
+        _render_html(source_path, destination_path, title)
+    else:
+        raise ValueError(f"Unsupported output format: {output_format}")
+    return destination
+
+
+class RenderService:
+    def __init__(self, cache_dir: str = RENDER_CACHE_DIR, max_files: int = RENDER_CACHE_MAX_FILES):
+        self.cache_dir = Path(cache_dir)
+        self.max_files = max_files
+        self._inflight: dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.failures = 0
+
+    def _cache_path(self, key: str, output_format: str) -> Path:
+        return self.cache_dir / key[:2] / f"{key}{RENDER_FORMATS[output_format]}"
+
+    async def render(self, markdown_path: str, output_format: str, is_disconnected=None) -> str:
+        """Return the path of ``markdown_path`` rendered as ``output_format``.
+
+        The rendered file is placed next to the markdown. Identical markdown is
+        rendered once; later requests link the cached file into place.
+        """
+        if output_format not in RENDER_FORMATS:
+            return markdown_path
+
+        source = Path(markdown_path)
+        content = await asyncio.to_thread(source.read_bytes)
+        title = render_title(source)
+        key = render_cache_key(content, output_format, title)
+        cached = self._cache_path(key, output_format)
+
+        if cached.exists():
+            self.hits += 1
+            # Keep recently used renders at the back of the pruning order
+            os.utime(cached)
+        else:
+            await self._render_once(key, str(source), output_format, str(cached), title, is_disconnected)
+
+        destination = source.with_suffix(RENDER_FORMATS[output_format])
+        await asyncio.to_thread(self._publish, cached, destination)
+        return str(destination)
+
+    async def _render_once(self, key: str, source: str, output_format: str, cached: str, title: str, is_disconnected):
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            # The same document is already being rendered
+            self.coalesced += 1
+            await asyncio.shield(inflight)
+            return
+
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            with stage_timer("render"):
+                await get_executor("render", kind="process").submit(
+                    render_to_cache, source, output_format, cached, title, is_disconnected=is_disconnected
+                )
+            future.set_result(None)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            self.failures += 1
+            future.set_exception(e)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+        await asyncio.to_thread(self._prune)
+
+    @staticmethod
+    def _publish(cached: Path, destination: Path):
+        if destination.exists() and os.path.samefile(cached, destination):
+            return
+        # Hardlink when possible so cached renders cost no extra disk space
+        tmp_path = destination.with_suffix(f".{secrets.token_hex(4)}.link")
+        try:
+            os.link(cached, tmp_path)
+        except OSError:
+            shutil.copyfile(cached, tmp_path)
+        tmp_path.replace(destination)
+        # Renaming onto a link of the same file is a no-op that leaves the source
+        tmp_path.unlink(missing_ok=True)
+
+    def _prune(self):
+        files = [path for path in self.cache_dir.glob("*/*") if path.suffix in RENDER_FORMATS.values()]
+        if len(files) <= self.max_files:
+            return
+        files.sort(key=lambda path: path.stat().st_mtime)
+        for path in files[:len(files) - self.max_files]:
+            path.unlink(missing_ok=True)
+
+    def stats(self) -> dict:
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "failures": self.failures,
+            "inflight": len(self._inflight),
+        }
+
+
+render_service = RenderService()
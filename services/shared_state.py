@@ -0,0 +1,262 @@
+"""State shared by all worker processes on this host, kept in one SQLite database in WAL mode.
+
+With a single worker that state stays in memory. With several (WEB_CONCURRENCY > 1,
+or SHARED_STATE_ENABLED=true) the token revocations, API key validation cache, plan
+cache, send rate limits and admission slots also go through here, so every worker
+sees the same state. ``connect_sqlite`` is used by all on-disk stores, which workers
+share in any case.
+"""
+import os
+import secrets
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+
+
+def available_cpus() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+def worker_count(setting: str) -> int:
+    """Workers for a WEB_CONCURRENCY value; "auto" means one per core this process may use."""
+    return available_cpus() if setting.strip().lower() == "auto" else int(setting)
+
+
+WEB_CONCURRENCY = worker_count(os.getenv("WEB_CONCURRENCY") or "1")
+# "auto" shares state only when several workers are configured
+_SHARED_STATE_SETTING = os.getenv("SHARED_STATE_ENABLED", "auto").lower()
+SHARED_STATE_ENABLED = WEB_CONCURRENCY > 1 if _SHARED_STATE_SETTING == "auto" else _SHARED_STATE_SETTING == "true"
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH", "data/shared_state.sqlite3")
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+# Expired key/value rows are deleted every this many writes
+PURGE_EVERY_WRITES = 500
+
+
+def connect_sqlite(path: str | Path) -> sqlite3.Connection:
+    """Open a SQLite database that several processes may read and write at once."""
+    conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+    conn.execute(f"PRAGMA busy_timeout = {SQLITE_BUSY_TIMEOUT_MS}")
+    # Readers no longer block the writer, and commits skip the per-transaction fsync
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = NORMAL")
+    return conn
+
+
+def pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def process_token(pid: int) -> str | None:
+    """Identifies one run of process ``pid`` (boot id and start time), or None where /proc is unavailable."""
+    try:
+        stat = Path(f"/proc/{pid}/stat").read_bytes()
+        boot_id = Path("/proc/sys/kernel/random/boot_id").read_text().strip()
+    except OSError:
+        return None
+    # Fields after the parenthesised command name start at field 3; the start time is field 22
+    return f"{boot_id}:{stat.rsplit(b')', 1)[1].split()[19].decode()}"
+
+
+def owner_alive(pid: int, token: str | None) -> bool:
+    """Whether the process that recorded ``pid`` and ``token`` is still running.
+
+    A pid alone is not enough: after a restart (of a container especially) a
+    new process is often given the same pid as the one that died.
+    """
+    if pid == os.getpid():
+        return token is not None and token == process_token(pid)
+    if not pid_alive(pid):
+        return False
+    current = process_token(pid) if token is not None else None
+    return current is None or current == token
+
+
+class SharedState:
+    def __init__(self, path: str = SHARED_STATE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(self.path)
+        self._conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires_at REAL,
+                PRIMARY KEY (namespace, key)
+            );
+            CREATE INDEX IF NOT EXISTS kv_expires_at ON kv (expires_at);
+            CREATE TABLE IF NOT EXISTS buckets (
+                key TEXT PRIMARY KEY,
+                tokens REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS leases (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                user_id TEXT NOT NULL,
+                pid INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                token TEXT
+            );
+            CREATE INDEX IF NOT EXISTS leases_kind_user ON leases (kind, user_id);
+            """
+        )
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(leases)")}
+        if "token" not in columns:
+            self._conn.execute("ALTER TABLE leases ADD COLUMN token TEXT")
+        self._token = process_token(os.getpid())
+        # Slots still recorded under this pid were left by an earlier process that had it
+        self._conn.execute("DELETE FROM leases WHERE pid = ?", (os.getpid(),))
+        self._writes = 0
+
+    def _transaction(self, fn):
+        """Run ``fn(conn)`` in a write transaction, taken up front so concurrent writers queue."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def get(self, namespace: str, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value, expires_at FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+        if row is None or (row[1] is not None and row[1] <= time.time()):
+            return None
+        return row[0]
+
+    def put(self, namespace: str, key: str, value: str, ttl_seconds: float | None = None):
+        expires_at = time.time() + ttl_seconds if ttl_seconds is not None else None
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO kv (namespace, key, value, expires_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(namespace, key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at",
+                (namespace, key, value, expires_at),
+            )
+            self._writes += 1
+            if self._writes % PURGE_EVERY_WRITES == 0:
+                self._conn.execute("DELETE FROM kv WHERE expires_at <= ?", (time.time(),))
+
+    def delete(self, namespace: str, key: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key))
+
+    def secret(self, name: str) -> str:
+        """A random value created once and then shared by every worker."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR IGNORE INTO kv (namespace, key, value) VALUES ('secrets', ?, ?)", (name, secrets.token_hex(16))
+            )
+            return self._conn.execute("SELECT value FROM kv WHERE namespace = 'secrets' AND key = ?", (name,)).fetchone()[0]
+
+    def reserve_token(self, key: str, rate_per_second: float, capacity: int) -> float:
+        """Take a token from a shared bucket, returning how long to wait before using it."""
+        def reserve(conn):
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated_at FROM buckets WHERE key = ?", (key,)).fetchone()
+            tokens = float(capacity) if row is None else min(capacity, row[0] + (now - row[1]) * rate_per_second)
+            tokens -= 1
+            conn.execute(
+                "INSERT INTO buckets (key, tokens, updated_at) VALUES (?, ?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET tokens = excluded.tokens, updated_at = excluded.updated_at",
+                (key, tokens, now),
+            )
+            # A negative balance is a queue of callers waiting for refills
+            return 0.0 if tokens >= 0 else -tokens / rate_per_second
+
+        return self._transaction(reserve)
+
+    def _purge_dead_leases(self, conn):
+        owners = conn.execute("SELECT DISTINCT pid, token FROM leases").fetchall()
+        dead = [(pid, token) for pid, token in owners if not owner_alive(pid, token)]
+        if dead:
+            conn.executemany("DELETE FROM leases WHERE pid = ? AND token IS ?", dead)
+
+    def acquire_lease(self, kind: str, user_id: str, global_limit: int | None, per_user_limit: int | None) -> str | None:
+        """Take a slot if fewer than the limits are held across all workers.
+
+        Slots held by workers that died are reclaimed.
+        """
+        def acquire(conn):
+            self._purge_dead_leases(conn)
+            if global_limit is not None:
+                (total,) = conn.execute("SELECT COUNT(*) FROM leases WHERE kind = ?", (kind,)).fetchone()
+                if total >= global_limit:
+                    return None
+            if per_user_limit is not None:
+                (held,) = conn.execute(
+                    "SELECT COUNT(*) FROM leases WHERE kind = ? AND user_id = ?", (kind, user_id)
+                ).fetchone()
+                if held >= per_user_limit:
+                    return None
+            lease_id = str(uuid.uuid4())
+            conn.execute(
+                "INSERT INTO leases (id, kind, user_id, pid, created_at, token) VALUES (?, ?, ?, ?, ?, ?)",
+                (lease_id, kind, user_id, os.getpid(), time.time(), self._token),
+            )
+            return lease_id
+
+        return self._transaction(acquire)
+
+    def release_lease(self, lease_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM leases WHERE id = ?", (lease_id,))
+
+    def release_user_lease(self, kind: str, user_id: str):
+        """Release one of this process's slots of ``kind`` held for ``user_id``."""
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM leases WHERE id = (SELECT id FROM leases WHERE kind = ? AND user_id = ? AND pid = ? LIMIT 1)",
+                (kind, user_id, os.getpid()),
+            )
+
+    def lease_counts(self) -> dict[str, int]:
+        with self._lock:
+            return dict(self._conn.execute("SELECT kind, COUNT(*) FROM leases GROUP BY kind").fetchall())
+
+    def stats(self) -> dict:
+        with self._lock:
+            (kv_rows,) = self._conn.execute("SELECT COUNT(*) FROM kv").fetchone()
+            (buckets,) = self._conn.execute("SELECT COUNT(*) FROM buckets").fetchone()
+        return {
+            "enabled": True,
+            "path": str(self.path),
+            "workers": WEB_CONCURRENCY,
+            "pid": os.getpid(),
+            "kv_rows": kv_rows,
+            "buckets": buckets,
+            "leases": self.lease_counts(),
+        }
+
+
+_shared_state: SharedState | None = None
+_shared_state_lock = threading.Lock()
+
+
+def get_shared_state() -> SharedState | None:
+    """The shared store, or None when this process runs alone."""
+    global _shared_state
+    if not SHARED_STATE_ENABLED:
+        return None
+    with _shared_state_lock:
+        if _shared_state is None:
+            _shared_state = SharedState()
+        return _shared_state
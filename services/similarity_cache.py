@@ -0,0 +1,221 @@
+"""Near-duplicate text cache using character shingles, MinHash and LSH banding."""
+import hashlib
+import os
+import random
+import re
+import threading
+import time
+import unicodedata
+from collections import Counter, OrderedDict
+from dataclasses import dataclass, field
+from difflib import SequenceMatcher
+from typing import Any
+
+SIMILARITY_SHINGLE_SIZE = int(os.getenv("SIMILARITY_SHINGLE_SIZE", "3"))
+# bands * rows hash functions; candidates appear at roughly (1/bands) ** (1/rows) similarity
+SIMILARITY_LSH_BANDS = int(os.getenv("SIMILARITY_LSH_BANDS", "32"))
+SIMILARITY_LSH_ROWS = int(os.getenv("SIMILARITY_LSH_ROWS", "4"))
+# Only the candidates sharing the most bands are compared exactly
+SIMILARITY_MAX_CANDIDATES = int(os.getenv("SIMILARITY_MAX_CANDIDATES", "32"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_REPLY_PREFIX = re.compile(r"^((re|fw|fwd)\s*:\s*)+")
+_NON_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"\d+")
+# Words that carry no meaning of their own in a subject line; every other word must appear in both texts
+STOPWORDS = frozenset(
+    "a an the and or but to of for on in at by with from about as is are was were be been this that these "
+    "those it its your you our we my i me us their his her please hi hello dear".split()
+)
+# Flip the meaning of a text, so must match exactly ("don't" normalizes to "don t")
+NEGATIONS = frozenset("not no never none nor cannot without t".split())
+# Longer words may differ by a typo if they start the same ("tomorow"); "unapproved" still differs
+TYPO_MIN_LENGTH = 5
+TYPO_MIN_RATIO = 0.85
+
+
+def normalize_text(text: str) -> str:
+    """Case-fold, drop reply prefixes and collapse punctuation/dashes to single spaces."""
+    text = unicodedata.normalize("NFKC", text).casefold().strip()
+    text = _REPLY_PREFIX.sub("", text)
+    return _NON_WORD.sub(" ", text).strip()
+
+
+def shingles(text: str, size: int = SIMILARITY_SHINGLE_SIZE) -> frozenset[str]:
+    # Pad so short words still produce shingles that mark word boundaries
+    padded = f" {text} "
+    if len(padded) <= size:
+        return frozenset([padded])
+    return frozenset(padded[i:i + size] for i in range(len(padded) - size + 1))
+
+
+def content_words(text: str) -> frozenset[str]:
+    return frozenset(word for word in text.split() if word not in STOPWORDS)
+
+
+def _has_counterpart(word: str, others: frozenset[str]) -> bool:
+    if word in others:
+        return True
+    if word in NEGATIONS or len(word) < TYPO_MIN_LENGTH or any(char.isdigit() for char in word):
+        return False
+    return any(
+        other[:2] == word[:2] and SequenceMatcher(None, word, other).ratio() >= TYPO_MIN_RATIO
+        for other in others
+        if len(other) >= TYPO_MIN_LENGTH
+    )
+
+
+def same_content(a: frozenset[str], b: frozenset[str]) -> bool:
+    """Whether two texts use the same content words, allowing only small typos in longer ones."""
+    return all(_has_counterpart(word, b) for word in a - b) and all(_has_counterpart(word, a) for word in b - a)
+
+
+def jaccard(a: frozenset, b: frozenset) -> float:
+    if not a and not b:
+        return 1.0
+    return len(a & b) / len(a | b)
+
+
+class MinHasher:
+    def __init__(self, num_perm: int, seed: int = 1):
+        rng = random.Random(seed)
+        self._perms = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, items: frozenset[str]) -> tuple[int, ...]:
+        hashes = [int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "big") for item in items]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self._perms)
+
+
+@dataclass
+class _Entry:
+    key: tuple[str, str]
+    shingles: frozenset[str]
+    words: frozenset[str]
+    numbers: tuple[str, ...]
+    bands: list[tuple]
+    value: Any
+    expires_at: float
+    hits: int = field(default=0)
+
+
+class SimilarityCache:
+    """Maps texts to values; lookups also return values stored under near-identical texts.
+
+    Exact (normalized) matches are a dict lookup. Otherwise LSH buckets give
+    candidates, which are confirmed by exact Jaccard similarity of their shingles.
+    Shingles alone would match "was approved" to "was not approved", so a
+    candidate must also have the same content words, negations and numbers;
+    only stopwords, word order and small typos may differ.
+    Entries expire after ``ttl_seconds`` and the least recently used are evicted.
+    """
+
+    def __init__(self, threshold: float, max_size: int, ttl_seconds: float,
+                 bands: int = SIMILARITY_LSH_BANDS, rows: int = SIMILARITY_LSH_ROWS):
+        self.threshold = threshold
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self.bands = bands
+        self.rows = rows
+        self._hasher = MinHasher(bands * rows)
+        self._lock = threading.Lock()
+        self._entries: OrderedDict[tuple[str, str], _Entry] = OrderedDict()
+        self._buckets: dict[tuple, set[tuple[str, str]]] = {}
+        self.exact_hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _bands(self, namespace: str, items: frozenset[str]) -> list[tuple]:
+        signature = self._hasher.signature(items)
+        return [(namespace, band, signature[band * self.rows:(band + 1) * self.rows]) for band in range(self.bands)]
+
+    def _remove(self, key: tuple[str, str]):
+        entry = self._entries.pop(key)
+        for band in entry.bands:
+            bucket = self._buckets.get(band)
+            if bucket is not None:
+                bucket.discard(key)
+                if not bucket:
+                    del self._buckets[band]
+
+    def get(self, text: str, namespace: str = "") -> tuple[Any, float] | None:
+        """Return ``(value, similarity)`` for the closest stored text above the threshold."""
+        normalized = normalize_text(text)
+        key = (namespace, normalized)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at > now:
+                self._entries.move_to_end(key)
+                entry.hits += 1
+                self.exact_hits += 1
+                return entry.value, 1.0
+
+        items = shingles(normalized)
+        words = content_words(normalized)
+        numbers = tuple(_NUMBER.findall(normalized))
+        bands = self._bands(namespace, items)
+        best, best_score = None, 0.0
+        with self._lock:
+            candidates = Counter()
+            for band in bands:
+                candidates.update(self._buckets.get(band, ()))
+            for candidate, _ in candidates.most_common(SIMILARITY_MAX_CANDIDATES):
+                entry = self._entries[candidate]
+                # Dates, times and amounts must agree exactly, however similar the rest is
+                if entry.expires_at <= now or entry.numbers != numbers:
+                    continue
+                score = jaccard(items, entry.shingles)
+                if score >= self.threshold and score > best_score and same_content(words, entry.words):
+                    best, best_score = entry, score
+
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best.key)
+            best.hits += 1
+            self.similar_hits += 1
+            return best.value, best_score
+
+    def put(self, text: str, value: Any, namespace: str = ""):
+        normalized = normalize_text(text)
+        key = (namespace, normalized)
+        items = shingles(normalized)
+        bands = self._bands(namespace, items)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = _Entry(
+                key, items, content_words(normalized), tuple(_NUMBER.findall(normalized)), bands, value,
+                time.time() + self.ttl_seconds,
+            )
+            for band in bands:
+                self._buckets.setdefault(band, set()).add(key)
+            self._evict()
+
+    def _evict(self):
+        now = time.time()
+        while self._entries:
+            key, entry = next(iter(self._entries.items()))
+            if len(self._entries) <= self.max_size and entry.expires_at > now:
+                break
+            self._remove(key)
+            self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._buckets.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.exact_hits + self.similar_hits + self.misses
+            return {
+                "size": len(self._entries),
+                "threshold": self.threshold,
+                "exact_hits": self.exact_hits,
+                "similar_hits": self.similar_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.exact_hits + self.similar_hits) / lookups if lookups else 0.0,
+            }
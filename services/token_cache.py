@@ -0,0 +1,85 @@
+"""Bounded cache of verified JWT claims plus a token revocation set."""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from services.shared_state import get_shared_state
+
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", "10000"))
+
+
+def token_digest(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class TokenCache:
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        # digest -> (claims, exp as unix time)
+        self._claims: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        # digest -> exp; entries only need to outlive the token itself
+        self._revoked: dict[str, float] = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest: str) -> dict | None:
+        now = time.time()
+        with self._lock:
+            entry = self._claims.get(digest)
+            if entry is None or now >= entry[1]:
+                if entry is not None:
+                    del self._claims[digest]
+                self.misses += 1
+                return None
+            self._claims.move_to_end(digest)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, digest: str, claims: dict, exp: float):
+        with self._lock:
+            self._claims[digest] = (claims, exp)
+            self._claims.move_to_end(digest)
+            while len(self._claims) > self.max_size:
+                self._claims.popitem(last=False)
+
+    def revoke(self, digest: str, exp: float):
+        with self._lock:
+            self._claims.pop(digest, None)
+            self._revoked[digest] = exp
+            self._prune_revoked()
+        shared = get_shared_state()
+        if shared is not None:
+            shared.put("revoked", digest, "1", ttl_seconds=max(exp - time.time(), 0))
+
+    def is_revoked(self, digest: str) -> bool:
+        with self._lock:
+            if digest in self._revoked:
+                return True
+        # A token may have been revoked through another worker
+        shared = get_shared_state()
+        return shared is not None and shared.get("revoked", digest) is not None
+
+    def _prune_revoked(self):
+        now = time.time()
+        for digest in [digest for digest, exp in self._revoked.items() if exp <= now]:
+            del self._revoked[digest]
+
+    def clear(self):
+        with self._lock:
+            self._claims.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._claims),
+                "revoked": len(self._revoked),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+            }
+
+
+token_cache = TokenCache()
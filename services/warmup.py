@@ -0,0 +1,84 @@
+"""Background warm-up after startup: heavy imports, HTTP pools, persisted plans and tool registries.
+
+The app answers /health while this runs; a request that needs something still
+warming up simply waits for it (module import and registry locks are shared).
+"""
+import asyncio
+import importlib
+import os
+import time
+from services.http_client import http_clients
+from services.plan_cache import plan_cache
+from services.portia_factory import DOCUMENT_TOOLS, portia_factory
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Imported in order, so each time is the cost on top of the modules before it
+WARMUP_MODULES = ("httpx", "jose.jwt", "portia", "custom_tools.registry", "markdown", "pygments.formatters", "numpy")
+
+
+class Warmup:
+    def __init__(self, modules: tuple[str, ...] = WARMUP_MODULES):
+        self.modules = modules
+        self.state = "pending"
+        self.import_seconds: dict[str, float] = {}
+        self.step_seconds: dict[str, float] = {}
+        self.errors: dict[str, str] = {}
+        self.total_seconds: float | None = None
+        self._task: asyncio.Task | None = None
+
+    def _import_modules(self):
+        for name in self.modules:
+            started = time.perf_counter()
+            try:
+                importlib.import_module(name)
+            except Exception as e:
+                self.errors[name] = str(e)
+                continue
+            self.import_seconds[name] = time.perf_counter() - started
+
+    async def _step(self, name: str, awaitable):
+        started = time.perf_counter()
+        try:
+            await awaitable
+        except Exception as e:
+            # Whatever failed here is retried by the first request that needs it
+            self.errors[name] = str(e)
+            print(f"Warm-up step {name} failed: {e}")
+        self.step_seconds[name] = time.perf_counter() - started
+
+    async def run(self):
+        self.state = "running"
+        started = time.perf_counter()
+        await self._step("imports", asyncio.to_thread(self._import_modules))
+        await self._step("http_clients", http_clients.start())
+        await self._step("plan_cache", asyncio.to_thread(plan_cache.load))
+        # Builds the default registry too, since the document registry extends it
+        await self._step("tool_registries", asyncio.to_thread(portia_factory.get_registry, DOCUMENT_TOOLS))
+        self.total_seconds = time.perf_counter() - started
+        self.state = "failed" if self.errors else "done"
+        print(f"Warm-up {self.state} in {self.total_seconds:.2f}s")
+
+    def start(self):
+        if WARMUP_ENABLED and self._task is None:
+            self._task = asyncio.create_task(self.run())
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "enabled": WARMUP_ENABLED,
+            "state": self.state,
+            "total_seconds": self.total_seconds,
+            "import_seconds": dict(self.import_seconds),
+            "step_seconds": dict(self.step_seconds),
+            "errors": dict(self.errors),
+        }
+
+
+warmup = Warmup()
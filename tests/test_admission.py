@@ -0,0 +1,151 @@
+import asyncio
+import pytest
+from models.auth_models import LoginRequest
+from services import admission as admission_module
+from services import auth_service as auth_module
+from services.admission import AdmissionController, AdmissionRejected, admission_key
+from services.auth_service import AuthService
+from services.shared_state import SharedState
+
+
+@pytest.fixture(params=["local", "shared"])
+def controller(request, tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3")) if request.param == "shared" else None
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: shared)
+    monkeypatch.setattr(admission_module, "ADMISSION_SHARED_POLL_SECONDS", 0.02)
+    return AdmissionController(global_limit=2, per_user_limit=1, queue_depth=2, per_user_queue=1)
+
+
+def test_per_user_limit_queues_then_grants(controller):
+    async def scenario():
+        first = await controller.acquire("alice")
+        waiting = asyncio.create_task(controller.acquire("alice", max_wait=2))
+        await asyncio.sleep(0.05)
+        assert not waiting.done()
+        first.release()
+        second = await asyncio.wait_for(waiting, 2)
+        second.release()
+        await asyncio.sleep(0.05)
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["active"] == 0 and stats["admitted"] == 2 and stats["waited"] == 1
+
+
+def test_full_user_queue_is_rejected(controller):
+    async def scenario():
+        held = await controller.acquire("alice")
+        waiting = asyncio.create_task(controller.acquire("alice", max_wait=2))
+        await asyncio.sleep(0.01)
+        with pytest.raises(AdmissionRejected) as rejected:
+            await controller.acquire("alice")
+        held.release()
+        (await waiting).release()
+        await asyncio.sleep(0.05)
+        return rejected.value
+
+    assert asyncio.run(scenario()).retry_after >= 1
+    assert controller.rejected["user_queue_full"] == 1
+
+
+def test_wait_times_out(controller):
+    async def scenario():
+        held = await controller.acquire("alice")
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire("alice", max_wait=0.05)
+        held.release()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert controller.rejected["timeout"] == 1
+    assert controller.stats()["queued"] == 0
+
+
+def test_cancelled_waiter_leaves_no_slot_behind(controller):
+    async def scenario():
+        held = await controller.acquire("alice")
+        waiting = asyncio.create_task(controller.acquire("alice", max_wait=2))
+        await asyncio.sleep(0.01)
+        waiting.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiting
+        held.release()
+        await asyncio.sleep(0.05)
+        # Both of the user's slots are free again
+        (await controller.acquire("alice", max_wait=0.5)).release()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert controller.stats()["active"] == 0
+
+
+def test_release_from_another_thread(controller):
+    async def scenario():
+        ticket = await controller.acquire("alice")
+        await asyncio.to_thread(ticket.release)
+        await asyncio.sleep(0.05)
+        return controller.stats()
+
+    assert asyncio.run(scenario())["active"] == 0
+
+
+def test_shared_limits_span_controllers(tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: shared)
+    # Two controllers stand in for two workers sharing one store
+    first, second = (AdmissionController(global_limit=1, per_user_limit=1) for _ in range(2))
+
+    async def scenario():
+        held = await first.acquire("alice")
+        with pytest.raises(AdmissionRejected):
+            await second.acquire("bob", max_wait=0.05)
+        held.release()
+        await asyncio.sleep(0.05)
+        (await second.acquire("bob", max_wait=0.5)).release()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert shared.lease_counts() == {}
+
+
+def test_pending_job_limit(tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: shared)
+    monkeypatch.setattr(admission_module, "ADMISSION_MAX_PENDING_JOBS", 1)
+    controller = AdmissionController()
+
+    async def scenario():
+        await controller.reserve_job("alice")
+        with pytest.raises(AdmissionRejected):
+            await controller.reserve_job("alice")
+        await controller.finish_job("alice")
+        await controller.reserve_job("alice")
+
+    asyncio.run(scenario())
+    assert controller.stats()["pending_jobs"] == 1
+    assert shared.lease_counts() == {"job": 1}
+
+
+def test_logins_with_the_same_key_share_one_cap(monkeypatch):
+    async def valid(openai_api_key):
+        return True
+
+    monkeypatch.setattr(auth_module, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth_module.key_validator, "validate", valid)
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: None)
+    controller = AdmissionController(global_limit=4, per_user_limit=1, queue_depth=4, per_user_queue=1)
+
+    async def scenario():
+        logins = [await AuthService.login(LoginRequest(openai_api_key="sk-same")) for _ in range(2)]
+        first, second = (AuthService.verify_token_uncached(login.access_token) for login in logins)
+        assert first["user_id"] != second["user_id"]
+        held = await controller.acquire(admission_key(first["openai_api_key"]))
+        with pytest.raises(AdmissionRejected):
+            await controller.acquire(admission_key(second["openai_api_key"]), max_wait=0.05)
+        # Another key has its own cap
+        (await controller.acquire(admission_key("sk-other"), max_wait=0.05)).release()
+        held.release()
+        await asyncio.sleep(0.05)
+
+    asyncio.run(scenario())
+    assert controller.rejected["timeout"] == 1
@@ -0,0 +1,86 @@
+import json
+import time
+import pytest
+from custom_tools.content_cache import ContentCache
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return ContentCache(tmp_path / "cache", ttl_seconds=60, max_bytes=10_000)
+
+
+def stored_size(value) -> int:
+    return len(json.dumps(value, sort_keys=True).encode("utf-8"))
+
+
+def test_round_trip_and_stats(cache):
+    assert cache.get("a") is None
+    cache.put("a", {"url": "https://example.com", "raw_content": "hello"})
+    assert cache.get("a") == {"url": "https://example.com", "raw_content": "hello"}
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (1, 1)
+
+
+def test_identical_values_are_stored_once(cache):
+    value = {"raw_content": "same"}
+    cache.put("a", value)
+    cache.put("b", value)
+    assert cache.stats()["stored_bytes"] == stored_size(value)
+    assert len(list((cache.root / "objects").rglob("*.json"))) == 1
+
+
+def test_byte_total_follows_replacements_and_deletes(cache):
+    cache.put("a", {"v": "x" * 100})
+    cache.put("a", {"v": "y" * 50})
+    assert cache.stats()["stored_bytes"] == stored_size({"v": "y" * 50})
+    cache.ttl_seconds = 0.01
+    time.sleep(0.02)
+    assert cache.get("a") is None
+    assert cache.stats()["stored_bytes"] == 0
+    assert not list((cache.root / "objects").rglob("*.json"))
+
+
+def test_least_recently_used_are_evicted_over_budget(tmp_path):
+    cache = ContentCache(tmp_path, ttl_seconds=60, max_bytes=300)
+    for key in "abcd":
+        cache.put(key, {"v": key * 100})
+        time.sleep(0.001)
+    assert cache.stats()["stored_bytes"] <= 300
+    assert cache.get("a") is None
+    assert cache.get("d") == {"v": "d" * 100}
+
+
+def test_total_is_measured_for_an_existing_index(tmp_path):
+    ContentCache(tmp_path, ttl_seconds=60, max_bytes=10_000).put("a", {"v": 1})
+    conn = ContentCache(tmp_path, ttl_seconds=60, max_bytes=10_000)._connect()
+    conn.execute("DELETE FROM meta")
+    conn.close()
+    assert ContentCache(tmp_path, ttl_seconds=60, max_bytes=10_000).stats()["stored_bytes"] == stored_size({"v": 1})
+
+
+def test_no_temp_files_are_left_behind(cache):
+    for index in range(5):
+        cache.put(str(index), {"v": index})
+    assert not list(cache.root.rglob("*.tmp"))
+
+
+def write_entries(root: str, prefix: str):
+    cache = ContentCache(root, ttl_seconds=60, max_bytes=1_000_000)
+    for index in range(50):
+        cache.put(f"{prefix}{index}", {"v": index})
+
+
+def test_writers_in_several_processes_share_the_index(tmp_path):
+    import multiprocessing
+
+    context = multiprocessing.get_context("spawn")
+    processes = [context.Process(target=write_entries, args=(str(tmp_path), prefix)) for prefix in "ab"]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+    cache = ContentCache(tmp_path, ttl_seconds=60, max_bytes=1_000_000)
+    # Both processes stored the same 50 values, so each is kept once
+    assert cache.stats()["stored_bytes"] == sum(stored_size({"v": index}) for index in range(50))
+    assert cache.get("a7") == cache.get("b7") == {"v": 7}
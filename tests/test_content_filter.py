@@ -0,0 +1,90 @@
+import json
+import os
+import subprocess
+import sys
+from pathlib import Path
+from custom_tools.content_filter import (
+    ContentFilter, FilteredPages, allocate_budget, estimate_tokens, simhash, truncate_to_tokens,
+)
+
+NAVIGATION = "Home | Guides | API reference | Blog"
+FOOTER = "Copyright Example Inc. All rights reserved."
+
+
+def page(url: str, body: str) -> dict:
+    return {"url": url, "raw_content": f"{NAVIGATION}\n\n{body}\n\n{FOOTER}"}
+
+
+def body(topic: str) -> str:
+    return f"This guide explains {topic} step by step, with examples for each option and common mistakes to avoid."
+
+
+def test_simhash_is_closer_for_near_duplicates():
+    text = " ".join(f"word{i} term{i * 7 % 13}" for i in range(500))
+    unrelated = " ".join(f"other{i} thing{i * 5 % 11}" for i in range(500))
+    near = (simhash(text) ^ simhash(text + " More.")).bit_count()
+    far = (simhash(text) ^ simhash(unrelated)).bit_count()
+    assert near < far and far > 3
+
+
+ROOT = Path(__file__).resolve().parents[1]
+SEED_SCRIPT = """
+import json
+from custom_tools.content_filter import ContentFilter, simhash
+text = " ".join(f"step{i} covers option{i % 7}" for i in range(200))
+pages = [{"url": f"https://example.com/{i}", "raw_content": text.replace("step5 ", f"step5 variant{i} ")} for i in range(8)]
+filtered = ContentFilter(token_budget=100_000).filter(pages)
+print(json.dumps([simhash(page["raw_content"]) for page in pages] + [page["url"] for page in filtered.pages]))
+"""
+
+
+def test_near_duplicate_dropping_does_not_depend_on_the_hash_seed():
+    outputs = set()
+    for seed in ("0", "2", "8", "12345"):
+        env = {**os.environ, "PYTHONHASHSEED": seed}
+        result = subprocess.run(
+            [sys.executable, "-c", SEED_SCRIPT], env=env, cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        outputs.add(result.stdout)
+    assert len(outputs) == 1
+    kept = json.loads(outputs.pop())[8:]
+    # The pages differ by one word, so all but the first are near-duplicates
+    assert kept == ["https://example.com/0"]
+
+
+def test_boilerplate_is_kept_on_the_first_page_only():
+    pages = [page(f"https://example.com/{topic}", body(topic)) for topic in ("install", "routing", "testing", "deploy")]
+    filtered = ContentFilter(token_budget=10_000).filter(pages)
+    assert NAVIGATION in filtered.pages[0]["raw_content"]
+    assert all(NAVIGATION not in kept["raw_content"] and FOOTER not in kept["raw_content"] for kept in filtered.pages[1:])
+    assert filtered.boilerplate_paragraphs == 6
+
+
+def test_near_duplicate_pages_are_dropped():
+    text = body("caching")
+    pages = [page("https://example.com/v1/cache", text), page("https://example.com/v2/cache", text)]
+    filtered = ContentFilter(token_budget=10_000).filter(pages)
+    assert [kept["url"] for kept in filtered.pages] == ["https://example.com/v1/cache"]
+    assert filtered.duplicates == {"https://example.com/v2/cache": "https://example.com/v1/cache"}
+
+
+def test_fit_truncates_large_pages_and_omits_the_rest():
+    content_filter = ContentFilter(token_budget=100, min_page_tokens=40)
+    filtered = FilteredPages(pages=[{"url": f"https://example.com/{i}", "raw_content": "x " * 400} for i in range(3)])
+    content_filter.fit(filtered)
+    assert filtered.omitted == ["https://example.com/2"]
+    assert filtered.truncated == 2
+    assert filtered.tokens_out <= 100 + 2 * estimate_tokens("\n[truncated]")
+
+
+def test_allocate_budget_gives_small_items_what_they_need():
+    assert allocate_budget([10, 100, 100], 110) == [10, 50, 50]
+    assert allocate_budget([10, 20], 100) == [10, 20]
+
+
+def test_truncate_prefers_a_line_break():
+    text = "x" * 30 + "\n" + "y" * 50
+    assert truncate_to_tokens(text, 10) == "x" * 30 + "\n[truncated]"
+    # A break in the first half would waste too much of the budget
+    assert truncate_to_tokens("x\n" + "y" * 80, 10) == "x\n" + "y" * 38 + "\n[truncated]"
+    assert truncate_to_tokens("short", 10) == "short"
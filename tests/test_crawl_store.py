@@ -0,0 +1,64 @@
+import sqlite3
+import time
+from custom_tools.crawl_store import CrawlStore, crawl_key
+
+
+def pages(root: str, size: int, count: int = 2) -> list[dict]:
+    return [{"url": f"{root}/{index}", "raw_content": "x" * size} for index in range(count)]
+
+
+def store_crawl(store: CrawlStore, root: str, size: int) -> str:
+    payload = {"url": root}
+    key = crawl_key(payload)
+    store.replace_crawl(key, payload, pages(root, size))
+    return key
+
+
+def test_expired_crawls_are_dropped(tmp_path):
+    store = CrawlStore(tmp_path / "crawl.sqlite3", ttl_seconds=60)
+    key = store_crawl(store, "https://a.example.com", 10)
+    assert store.get_crawl(key) is not None
+
+    store._connect().execute("UPDATE crawls SET crawled_at = ?", (time.time() - 120,))
+    assert store.get_crawl(key) is None
+    assert store.get_pages(key) == []
+
+
+def test_least_recently_used_crawls_are_evicted_beyond_max_bytes(tmp_path):
+    store = CrawlStore(tmp_path / "crawl.sqlite3", ttl_seconds=3600, max_bytes=1000)
+    first = store_crawl(store, "https://a.example.com", 200)
+    second = store_crawl(store, "https://b.example.com", 200)
+    # Reading the first crawl makes the second the least recently used
+    store._connect().execute("UPDATE crawls SET accessed_at = accessed_at - 10 WHERE key = ?", (second,))
+    store.get_crawl(first)
+
+    third = store_crawl(store, "https://c.example.com", 200)
+    assert store.get_crawl(second) is None and store.get_pages(second) == []
+    assert store.get_crawl(first) is not None and store.get_crawl(third)["size"] == 400
+    assert store.evictions == 1
+
+
+def test_a_crawl_larger_than_max_bytes_is_kept_until_the_next_one(tmp_path):
+    store = CrawlStore(tmp_path / "crawl.sqlite3", ttl_seconds=3600, max_bytes=100)
+    key = store_crawl(store, "https://a.example.com", 500)
+    assert len(store.get_pages(key)) == 2
+
+
+def test_unbounded_stores_are_measured_on_open(tmp_path):
+    path = tmp_path / "crawl.sqlite3"
+    conn = sqlite3.connect(path)
+    conn.executescript(
+        """
+        CREATE TABLE crawls (key TEXT PRIMARY KEY, root_url TEXT NOT NULL, settings TEXT NOT NULL, crawled_at REAL NOT NULL);
+        CREATE TABLE pages (crawl_key TEXT NOT NULL, url TEXT NOT NULL, raw_content TEXT, content_hash TEXT NOT NULL,
+                            etag TEXT, last_modified TEXT, fetched_at REAL NOT NULL, position INTEGER NOT NULL,
+                            PRIMARY KEY (crawl_key, url));
+        INSERT INTO crawls VALUES ('k', 'https://a.example.com', '{}', 1000);
+        INSERT INTO pages VALUES ('k', 'https://a.example.com', 'héllo', 'h', NULL, NULL, 1000, 0);
+        """
+    )
+    conn.commit()
+    conn.close()
+
+    crawl = CrawlStore(path, ttl_seconds=float("inf")).get_crawl("k")
+    assert crawl["size"] == len("héllo".encode())
@@ -0,0 +1,191 @@
+"""CrawlTool output formatting and recrawls, run through both the sync and the async client."""
+import asyncio
+import json
+import httpx
+import pytest
+
+pytest.importorskip("portia")
+pytest.importorskip("numpy")
+from benchmarks.stubs import page
+from custom_tools import crawl_tool as crawl_module
+from custom_tools.crawl_store import CrawlStore, crawl_key
+from custom_tools.crawl_tool import CrawlTool, _public_host
+
+
+def crawl_results(count: int = 8) -> list[dict]:
+    return [page(f"https://docs.example.com/page-{index}") for index in range(count)]
+
+
+def test_matched_query_shows_relevant_passages():
+    output = CrawlTool()._format_results(crawl_results(), query="installation configuration")
+    assert "relevant to: installation configuration" in output
+    assert "Lorem ipsum" not in output
+
+
+def test_unmatched_query_falls_back_to_the_pages():
+    output = CrawlTool()._format_results(crawl_results(), query="kubernetes helm chart")
+    # The stub pages differ only in their title; the same one is a near-duplicate under every hash seed
+    assert output.startswith("Crawled 8 pages (1 near-duplicates left out)")
+    assert "relevant to" not in output
+    assert output.count("URL: https://docs.example.com/page-") == 7
+
+
+class Upstream:
+    """Tavily and the crawled site behind an httpx MockTransport, recording each call."""
+
+    def __init__(self):
+        self.calls: list[str] = []
+        self.site = {"https://docs.example.com": "Home v1", "https://docs.example.com/a": "Page a v1"}
+        self.etags = {url: '"v1"' for url in self.site}
+        self.extract_fails = False
+        self.extract_skips: set[str] = set()
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        if request.method == "HEAD":
+            self.calls.append(f"HEAD {request.url}")
+            url = str(request.url).rstrip("/")
+            if request.headers.get("if-none-match") == self.etags[url]:
+                return httpx.Response(304, headers={"etag": self.etags[url]})
+            return httpx.Response(200, headers={"etag": self.etags[url]})
+        endpoint = request.url.path.rsplit("/", 1)[-1]
+        self.calls.append(endpoint)
+        payload = json.loads(request.content)
+        if endpoint == "crawl":
+            return httpx.Response(200, json={"results": [{"url": url, "raw_content": text} for url, text in self.site.items()]})
+        if endpoint == "map":
+            return httpx.Response(200, json={"results": list(self.site)})
+        if self.extract_fails:
+            return httpx.Response(502, json={"error": "bad gateway"})
+        return httpx.Response(200, json={"results": [
+            {"url": url, "raw_content": self.site[url]} for url in payload["urls"] if url not in self.extract_skips
+        ]})
+
+
+@pytest.fixture(params=["sync", "async"])
+def crawl(request, tmp_path, monkeypatch):
+    upstream = Upstream()
+    transport = httpx.MockTransport(upstream.handle)
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    monkeypatch.setattr(crawl_module, "crawl_store", CrawlStore(tmp_path / "crawl.sqlite3"))
+    monkeypatch.setattr(crawl_module.http_clients, "sync_client", lambda: httpx.Client(transport=transport))
+    monkeypatch.setattr(crawl_module.http_clients, "async_client", lambda: httpx.AsyncClient(transport=transport))
+    # The mock site has no DNS; treat its host as public
+    monkeypatch.setattr(crawl_module, "_public_host", lambda host: True)
+    tool = CrawlTool()
+
+    def run(**kwargs) -> str:
+        if request.param == "sync":
+            return tool.run(None, url="https://docs.example.com", **kwargs)
+        return asyncio.run(tool.arun(None, url="https://docs.example.com", **kwargs))
+
+    run.upstream = upstream
+    return run
+
+
+def stored_pages() -> dict[str, dict]:
+    key = crawl_key({"url": "https://docs.example.com"})
+    return {page["url"]: page for page in crawl_module.crawl_store.get_pages(key)}
+
+
+def store_validators():
+    # Give the stored pages the ETags a real recrawl would have recorded
+    conn = crawl_module.crawl_store._connect()
+    conn.execute("UPDATE pages SET etag = '\"v1\"'")
+
+
+def test_fresh_crawls_are_answered_from_the_store(crawl):
+    first = crawl()
+    assert crawl() == first
+    assert crawl.upstream.calls == ["crawl"]
+
+
+def test_stale_crawl_refetches_only_changed_and_new_pages(crawl, monkeypatch):
+    crawl()
+    store_validators()
+    monkeypatch.setattr(crawl_module, "CRAWL_FRESHNESS_SECONDS", -1)
+    upstream = crawl.upstream
+    upstream.site["https://docs.example.com/a"] = "Page a v2"
+    upstream.etags["https://docs.example.com/a"] = '"v2"'
+    upstream.site["https://docs.example.com/b"] = "Page b v1"
+    upstream.etags["https://docs.example.com/b"] = '"v1"'
+    upstream.calls.clear()
+
+    output = crawl()
+    assert "crawl" not in upstream.calls and upstream.calls.count("extract") == 1
+    assert "Page a v2" in output and "Page b v1" in output and "Home v1" in output
+    assert stored_pages()["https://docs.example.com/a"]["etag"] == '"v2"'
+
+
+def test_failed_delta_extract_falls_back_to_a_full_crawl(crawl, monkeypatch):
+    crawl()
+    store_validators()
+    monkeypatch.setattr(crawl_module, "CRAWL_FRESHNESS_SECONDS", -1)
+    upstream = crawl.upstream
+    upstream.site["https://docs.example.com/a"] = "Page a v2"
+    upstream.etags["https://docs.example.com/a"] = '"v2"'
+    upstream.extract_fails = True
+    upstream.calls.clear()
+
+    output = crawl()
+    assert upstream.calls[-1] == "crawl"
+    assert "Page a v2" in output
+
+
+def test_changed_page_missing_from_extract_is_checked_again(crawl, monkeypatch):
+    crawl()
+    store_validators()
+    monkeypatch.setattr(crawl_module, "CRAWL_FRESHNESS_SECONDS", -1)
+    upstream = crawl.upstream
+    upstream.site["https://docs.example.com/a"] = "Page a v2"
+    upstream.etags["https://docs.example.com/a"] = '"v2"'
+    upstream.extract_skips.add("https://docs.example.com/a")
+
+    crawl()
+    page = stored_pages()["https://docs.example.com/a"]
+    # Still the old copy, under the old ETag, so the next HEAD reports it changed again
+    assert (page["raw_content"], page["etag"]) == ("Page a v1", '"v1"')
+
+
+def test_recrawl_checks_only_pages_on_the_crawled_host(crawl, monkeypatch):
+    upstream = crawl.upstream
+    upstream.site["http://169.254.169.254/latest"] = "Metadata"
+    upstream.etags["http://169.254.169.254/latest"] = '"v1"'
+    crawl()
+    store_validators()
+    monkeypatch.setattr(crawl_module, "CRAWL_FRESHNESS_SECONDS", -1)
+    upstream.calls.clear()
+
+    crawl()
+    heads = [call for call in upstream.calls if call.startswith("HEAD")]
+    assert heads and not any("169.254.169.254" in call for call in heads)
+
+
+def test_recrawl_skips_checks_to_non_public_addresses(crawl, monkeypatch):
+    crawl()
+    store_validators()
+    monkeypatch.setattr(crawl_module, "CRAWL_FRESHNESS_SECONDS", -1)
+    monkeypatch.setattr(crawl_module, "_public_host", lambda host: False)
+    crawl.upstream.calls.clear()
+
+    crawl()
+    assert not any(call.startswith("HEAD") for call in crawl.upstream.calls)
+
+
+def test_check_requests_stay_on_allowed_hosts():
+    tool = CrawlTool()
+    payload = {"url": "docs.example.com", "select_domains": [r"^api\.example\.com$", "("]}
+    assert tool._may_check("https://docs.example.com/a", payload)
+    assert tool._may_check("https://api.example.com/v1", payload)
+    assert not tool._may_check("https://evil.example.net/a", payload)
+    assert not tool._may_check("file:///etc/passwd", payload)
+    request = tool._check_request({"url": "https://docs.example.com/a", "etag": '"v1"'})
+    assert request.public_only and request.options["follow_redirects"] is False
+
+
+@pytest.mark.parametrize("host", ["127.0.0.1", "localhost", "10.0.0.8", "169.254.169.254", "::1", "::ffff:127.0.0.1"])
+def test_private_hosts_are_not_public(host):
+    assert not _public_host(host)
+
+
+def test_public_addresses_are_public():
+    assert _public_host("93.184.215.14")
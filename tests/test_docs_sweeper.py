@@ -0,0 +1,52 @@
+import pytest
+from services import docs_sweeper as docs_sweeper_module
+from services.docs_sweeper import DocsSweeper, safe_filename, user_file_path
+
+
+@pytest.mark.parametrize(
+    ("name", "safe"),
+    [
+        ("react_hooks_guide", "react_hooks_guide"),
+        ("../../etc/passwd", "passwd"),
+        ("/tmp/report", "report"),
+        ("Q3 report: final!", "Q3_report__final"),
+        ("..", "document"),
+        ("", "document"),
+    ],
+)
+def test_safe_filename(name, safe):
+    assert safe_filename(name) == safe
+
+
+@pytest.fixture
+def docs_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(docs_sweeper_module, "DOCS_DIR", str(tmp_path / "docs"))
+    return tmp_path / "docs"
+
+
+def test_user_file_path_stays_in_the_users_directory(docs_dir):
+    alice = docs_dir / "alice"
+    assert user_file_path("alice", "guide.markdown") == alice / "guide.markdown"
+    assert user_file_path("alice", str(alice / "react hooks.md")) == alice / "react_hooks.md"
+    assert user_file_path("alice", str(docs_dir) + "/alice/notes") == alice / "notes"
+
+
+@pytest.mark.parametrize("filename", ["docs/bob/guide.markdown", "../guide.markdown", "/etc/cron.d/job", "{docs}/alice/../bob/x.md"])
+def test_user_file_path_rejects_other_directories(docs_dir, filename):
+    with pytest.raises(ValueError):
+        user_file_path("alice", filename.format(docs=docs_dir))
+
+
+def test_expired_files_and_their_variants_are_swept(tmp_path):
+    docs = tmp_path / "docs"
+    (docs / "alice").mkdir(parents=True)
+    old, fresh = docs / "alice" / "old.markdown", docs / "alice" / "fresh.markdown"
+    for path in (old, fresh, docs / "alice" / "old.markdown.gz"):
+        path.write_text("x")
+    sweeper = DocsSweeper(path=str(tmp_path / "index.sqlite3"), docs_dir=str(docs), ttl_seconds=60)
+    sweeper.register(old, now=0)
+    sweeper.register(fresh)
+
+    assert sweeper.sweep() == 1
+    assert not old.exists() and not (docs / "alice" / "old.markdown.gz").exists()
+    assert fresh.exists()
@@ -0,0 +1,69 @@
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+from services import docs_sweeper
+from services.download_service import DownloadService
+
+BODY = "# Guide\n\n" + "Some generated documentation text. " * 200
+
+
+@pytest.fixture
+def docs(tmp_path, monkeypatch):
+    monkeypatch.setattr(docs_sweeper, "DOCS_DIR", str(tmp_path))
+    (tmp_path / "alice").mkdir()
+    (tmp_path / "alice" / "guide.markdown").write_text(BODY, encoding="utf-8")
+    (tmp_path / "legacy.pdf").write_bytes(b"%PDF-1.4 shared root file")
+    return tmp_path
+
+
+@pytest.fixture
+def client(docs):
+    service = DownloadService()
+    app = FastAPI()
+
+    @app.get("/{user_id}/{filename}")
+    async def download(user_id: str, filename: str, request: Request):
+        file_path = service.resolve(user_id, filename)
+        if file_path is None:
+            raise HTTPException(status_code=404)
+        return await service.file_response(file_path, request)
+
+    return TestClient(app)
+
+
+def test_users_only_see_their_own_files(client):
+    assert client.get("/alice/guide.markdown").status_code == 200
+    assert client.get("/bob/guide.markdown").status_code == 404
+
+
+def test_files_in_the_shared_root_are_not_served(client):
+    assert client.get("/alice/legacy.pdf").status_code == 404
+    assert client.get("/bob/legacy.pdf").status_code == 404
+
+
+@pytest.mark.parametrize("filename", ["../alice/guide.markdown", "guide.markdown.gz", ""])
+def test_paths_and_variants_are_refused(docs, filename):
+    assert DownloadService.resolve("alice", filename) is None
+
+
+def test_etag_revalidation(client):
+    first = client.get("/alice/guide.markdown", headers={"accept-encoding": "identity"})
+    etag = first.headers["etag"]
+    again = client.get("/alice/guide.markdown", headers={"accept-encoding": "identity", "if-none-match": etag})
+    assert again.status_code == 304
+    assert again.headers["etag"] == etag
+
+
+def test_range_requests(client):
+    response = client.get("/alice/guide.markdown", headers={"accept-encoding": "identity", "range": "bytes=0-6"})
+    assert response.status_code == 206
+    assert response.content == BODY.encode()[:7]
+
+
+def test_gzip_variant_has_its_own_etag(client, docs):
+    plain = client.get("/alice/guide.markdown", headers={"accept-encoding": "identity"})
+    gzipped = client.get("/alice/guide.markdown", headers={"accept-encoding": "gzip"})
+    assert gzipped.headers["content-encoding"] == "gzip"
+    assert gzipped.text == BODY
+    assert gzipped.headers["etag"] != plain.headers["etag"]
+    assert (docs / "alice" / "guide.markdown.gz").exists()
@@ -0,0 +1,37 @@
+import asyncio
+import os
+import threading
+import pytest
+from services.executor import PlanExecutor, QueueFullError
+
+
+def test_process_pool_spawns_its_workers():
+    executor = PlanExecutor("test", kind="process", max_workers=1)
+
+    async def scenario():
+        return await executor.submit(os.getpid)
+
+    try:
+        assert asyncio.run(scenario()) != os.getpid()
+        assert executor._get_pool()._mp_context.get_start_method() == "spawn"
+    finally:
+        executor.shutdown(wait=True)
+
+
+def test_full_pool_rejects_new_work():
+    executor = PlanExecutor("test", max_workers=1, max_queue=0)
+    release = threading.Event()
+
+    async def scenario():
+        running = asyncio.create_task(executor.submit(release.wait, 5))
+        await asyncio.sleep(0.05)
+        with pytest.raises(QueueFullError):
+            await executor.submit(release.wait, 5)
+        release.set()
+        return await running
+
+    try:
+        assert asyncio.run(scenario()) is True
+        assert executor.stats()["rejected"] == 1
+    finally:
+        executor.shutdown(wait=True)
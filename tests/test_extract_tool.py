@@ -0,0 +1,54 @@
+"""ExtractTool against the local Tavily stand-in from benchmarks/stubs.py."""
+import pytest
+
+pytest.importorskip("portia")
+from fastapi.testclient import TestClient
+from benchmarks.stubs import create_app
+from custom_tools import extract_tool as extract_module
+from custom_tools.content_cache import ContentCache
+from custom_tools.extract_tool import ExtractTool
+
+
+@pytest.fixture
+def tavily(tmp_path, monkeypatch):
+    client = TestClient(create_app())
+    monkeypatch.setenv("TAVILY_API_KEY", "test-key")
+    monkeypatch.setattr(extract_module, "TAVILY_API_URL", "http://tavily.test/tavily")
+    monkeypatch.setattr(extract_module.http_clients, "sync_client", lambda: client)
+    monkeypatch.setattr(extract_module, "extract_cache", ContentCache(tmp_path, ttl_seconds=60, max_bytes=1_000_000))
+    return client
+
+
+def upstream_requests(client: TestClient) -> int:
+    return client.get("/stats").json()["requests"].get("tavily", 0)
+
+
+def test_repeat_extracts_are_served_from_the_cache(tavily):
+    tool = ExtractTool()
+    first = tool.run(None, urls=["https://docs.example.com/a", "https://docs.example.com/b"])
+    assert upstream_requests(tavily) == 1
+    # Same pages spelled differently: canonical URLs hit the cache
+    second = tool.run(None, urls=["HTTPS://DOCS.example.com:443/a", "https://docs.example.com/b#intro"])
+    assert upstream_requests(tavily) == 1
+    assert [page["raw_content"] for page in first] == [page["raw_content"] for page in second]
+
+
+def test_only_uncached_urls_go_upstream(tavily):
+    tool = ExtractTool()
+    tool.run(None, urls=["https://docs.example.com/a"])
+    results = tool.run(None, urls=["https://docs.example.com/a", "https://docs.example.com/c"])
+    assert upstream_requests(tavily) == 2
+    assert [page["url"] for page in results] == ["https://docs.example.com/a", "https://docs.example.com/c"]
+
+
+def test_unmatched_query_returns_the_pages_unranked(tavily):
+    urls = [f"https://docs.example.com/page-{index}" for index in range(6)]
+    results = ExtractTool().run(None, urls=urls, query="kubernetes helm chart")
+    assert [page["url"] for page in results] == urls
+    assert all("Lorem ipsum" in page["raw_content"] for page in results)
+
+
+def test_matched_query_returns_selected_passages(tavily):
+    urls = [f"https://docs.example.com/page-{index}" for index in range(6)]
+    results = ExtractTool().run(None, urls=urls, query="installation configuration")
+    assert results and all("Lorem ipsum" not in page["raw_content"] for page in results)
@@ -0,0 +1,40 @@
+import asyncio
+import pytest
+
+pytest.importorskip("email_validator")
+from models.gmail_models import BatchEmailRequest, SendEmailResponse
+from services import gmail_service as gmail_module
+from services.gmail_service import GmailService, batch_concurrency
+
+
+def test_batch_concurrency_leaves_room_in_the_pool(monkeypatch):
+    monkeypatch.setattr(gmail_module, "BULK_EMAIL_CONCURRENCY", 8)
+    monkeypatch.setattr(gmail_module, "ADMISSION_PER_USER_LIMIT", 2)
+    assert batch_concurrency(pool_workers=4) == 2
+    assert batch_concurrency(pool_workers=2) == 1
+    assert batch_concurrency(pool_workers=1) == 1
+
+
+def test_batch_sends_stay_under_the_cap(monkeypatch):
+    monkeypatch.setattr(gmail_module, "BULK_EMAIL_CONCURRENCY", 8)
+    service = GmailService("sk-test", "alice")
+    in_flight, peak = 0, 0
+
+    async def prepare_template(template):
+        return None
+
+    async def send(message, is_disconnected=None, plan=None):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return SendEmailResponse(success=True, user_id="alice")
+
+    monkeypatch.setattr(service.client, "prepare_template", prepare_template)
+    monkeypatch.setattr(service, "send_automated_email", send)
+    request = BatchEmailRequest(recipients=[f"user{i}@example.com" for i in range(10)], subject="Hello")
+    response = asyncio.run(service.send_batch(request))
+
+    assert response.sent == 10
+    assert peak == batch_concurrency(gmail_module.get_executor("email").max_workers) < gmail_module.get_executor("email").max_workers
@@ -0,0 +1,114 @@
+import asyncio
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+import pytest
+from models.document_models import GenerateDocumentRequest
+from services import admission as admission_module
+from services import job_service as job_service_module
+from services.admission import AdmissionController
+from services.document_service import DocumentService
+from services.job_service import JobService, recover_jobs
+from services.job_store import JobStore
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"), retention_seconds=3600)
+    monkeypatch.setattr(job_service_module, "get_job_store", lambda: store)
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: None)
+    monkeypatch.setattr(job_service_module, "admission", AdmissionController(global_limit=2, per_user_limit=1))
+    return store
+
+
+def fake_generate(outcome):
+    async def generate_documentation(self, topic, urls=None, output_format="markdown", **kwargs):
+        await asyncio.sleep(0.01)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return {**outcome, "user_id": self.user_id}
+    return generate_documentation
+
+
+async def poll(job_id: str, user_id: str) -> dict:
+    for _ in range(200):
+        job = await JobService.get_job(job_id, user_id)
+        if job["status"] not in ("queued", "running"):
+            return job
+        await asyncio.sleep(0.01)
+    raise AssertionError("job did not finish")
+
+
+def test_submitted_job_runs_and_can_be_polled(store, monkeypatch):
+    result = {"success": True, "result": "Done", "file_path": "docs/alice/guide.markdown"}
+    monkeypatch.setattr(DocumentService, "generate_documentation", fake_generate(result))
+
+    async def scenario():
+        job = await JobService.submit_documentation_job(GenerateDocumentRequest(topic="Guide"), "sk-test", "alice")
+        assert job["status"] == "queued" and job["request"]["topic"] == "Guide"
+        return await poll(job["id"], "alice")
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "succeeded"
+    assert job["result"] == {**result, "user_id": "alice"}
+    assert job_service_module.admission.stats()["active"] == 0
+
+
+def test_failed_generation_marks_the_job_failed(store, monkeypatch):
+    monkeypatch.setattr(DocumentService, "generate_documentation", fake_generate(RuntimeError("boom")))
+
+    async def scenario():
+        job = await JobService.submit_documentation_job(GenerateDocumentRequest(topic="Guide"), "sk-test", "alice")
+        return await poll(job["id"], "alice")
+
+    job = asyncio.run(scenario())
+    assert job["status"] == "failed" and job["error"] == "boom"
+
+
+def test_jobs_are_only_visible_to_their_owner(store):
+    job_id = store.create("alice", "generate_documentation", {})["id"]
+
+    async def scenario():
+        return await JobService.get_job(job_id, "alice"), await JobService.get_job(job_id, "bob")
+
+    own, other = asyncio.run(scenario())
+    assert own["id"] == job_id
+    assert other is None
+    assert asyncio.run(JobService.get_job("missing", "alice")) is None
+
+
+def test_restart_fails_jobs_of_exited_processes(store):
+    exited = subprocess.run([sys.executable, "-c", "import os; print(os.getpid())"], capture_output=True, text=True)
+    dead_pid = int(exited.stdout)
+    ours = store.create("alice", "generate_documentation", {})["id"]
+    dead = store.create("alice", "generate_documentation", {})["id"]
+    legacy = store.create("alice", "generate_documentation", {})["id"]
+    finished = store.create("alice", "generate_documentation", {})["id"]
+    store.mark_running(dead)
+    store._conn.execute("UPDATE jobs SET owner_pid = ?, owner_token = 'boot:1' WHERE id = ?", (dead_pid, dead))
+    # Rows written before jobs recorded their owner
+    store._conn.execute("UPDATE jobs SET owner_pid = NULL, owner_token = NULL WHERE id = ?", (legacy,))
+    store.mark_finished(finished, {"success": True, "user_id": "alice"})
+
+    recover_jobs()
+    statuses = {job_id: store.get(job_id) for job_id in (ours, dead, legacy, finished)}
+    assert [job["status"] for job in statuses.values()] == ["queued", "failed", "failed", "succeeded"]
+    assert statuses[dead]["error"] == "Interrupted by server restart"
+
+
+def test_prune_deletes_old_finished_jobs_only(store):
+    old_done = store.create("alice", "generate_documentation", {})["id"]
+    old_failed = store.create("alice", "generate_documentation", {})["id"]
+    old_queued = store.create("alice", "generate_documentation", {})["id"]
+    recent = store.create("alice", "generate_documentation", {})["id"]
+    store.mark_finished(old_done, {"success": True, "user_id": "alice"})
+    store.mark_failed(old_failed, "boom")
+    store.mark_finished(recent, {"success": True, "user_id": "alice"})
+    stale = (datetime.now(timezone.utc) - timedelta(hours=2)).isoformat()
+    store._conn.execute("UPDATE jobs SET updated_at = ? WHERE id IN (?, ?, ?)", (stale, old_done, old_failed, old_queued))
+
+    assert store.prune() == 2
+    assert store.get(old_done) is None and store.get(old_failed) is None
+    assert store.get(old_queued)["status"] == "queued"
+    assert store.get(recent)["status"] == "succeeded"
+    assert store.get(recent)["updated_at"].endswith("+00:00")
@@ -0,0 +1,78 @@
+import asyncio
+import httpx
+import pytest
+from services import key_validator as key_validator_module
+from services.key_validator import KeyValidator, is_key_rejected
+from services.portia_client import PortiaClient
+
+
+class AuthenticationError(Exception):
+    """Stands in for openai.AuthenticationError, which is matched by name."""
+
+
+@pytest.fixture
+def openai(monkeypatch):
+    calls = []
+
+    async def handle(request: httpx.Request) -> httpx.Response:
+        calls.append(request.headers["authorization"])
+        await asyncio.sleep(0.01)
+        return httpx.Response(200 if request.headers["authorization"] == "Bearer sk-good" else 401, json={})
+
+    client = httpx.AsyncClient(transport=httpx.MockTransport(handle))
+    monkeypatch.setattr(key_validator_module.http_clients, "async_client", lambda: client)
+    monkeypatch.setattr(key_validator_module, "get_shared_state", lambda: None)
+    return calls
+
+
+def test_results_are_cached_until_forgotten(openai):
+    validator = KeyValidator()
+
+    async def scenario():
+        results = [await validator.validate("sk-good"), await validator.validate("sk-good"), await validator.validate("sk-bad")]
+        await validator.forget("sk-good")
+        results.append(await validator.validate("sk-good"))
+        return results
+
+    assert asyncio.run(scenario()) == [True, True, False, True]
+    assert len(openai) == 3
+
+
+def test_concurrent_checks_of_one_key_are_coalesced(openai):
+    validator = KeyValidator()
+
+    async def scenario():
+        return await asyncio.gather(*(validator.validate("sk-good") for _ in range(5)))
+
+    assert asyncio.run(scenario()) == [True] * 5
+    assert len(openai) == 1 and validator.coalesced == 4
+
+
+def test_is_key_rejected_follows_the_cause_chain():
+    try:
+        try:
+            raise AuthenticationError("Incorrect API key provided")
+        except AuthenticationError as e:
+            raise RuntimeError("planning failed") from e
+    except RuntimeError as wrapped:
+        assert is_key_rejected(wrapped)
+    assert not is_key_rejected(RuntimeError("rate limited"))
+
+
+def test_failed_runs_with_a_rejected_key_forget_it(monkeypatch):
+    forgotten = []
+
+    async def forget(key):
+        forgotten.append(key)
+
+    monkeypatch.setattr(key_validator_module.key_validator, "forget", forget)
+    client = PortiaClient("sk-revoked", "alice")
+
+    async def scenario():
+        kept = await client._forget_rejected_key({"success": False, "error": "timeout", "key_rejected": False})
+        rejected = await client._forget_rejected_key({"success": False, "error": "401", "key_rejected": True})
+        return kept, rejected
+
+    kept, rejected = asyncio.run(scenario())
+    assert forgotten == ["sk-revoked"]
+    assert "key_rejected" not in kept and "key_rejected" not in rejected
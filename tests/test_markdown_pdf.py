@@ -0,0 +1,68 @@
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+
+pytest.importorskip("fpdf")
+from custom_tools.markdown_pdf import MarkdownPDF, inline_runs, render_markdown, tokenize_markdown
+
+LONG_URL = "https://docs.example.com/" + "very-long-path-segment/" * 12 + "index.html"
+
+
+@pytest.fixture
+def pdf(monkeypatch):
+    pdf = MarkdownPDF("Test")
+    pdf.add_page()
+    cells = []
+    original_cell = pdf.cell
+
+    def record(width, height, text="", *args, **kwargs):
+        cells.append((pdf.get_x(), width, text))
+        return original_cell(width, height, text, *args, **kwargs)
+
+    monkeypatch.setattr(pdf, "cell", record)
+    pdf.cells = cells
+    return pdf
+
+
+@pytest.mark.parametrize("text", [f"[Guide]({LONG_URL})", f"See {LONG_URL} for details", "x" * 400, f"`{LONG_URL}`"])
+def test_runs_stay_inside_the_right_margin(pdf, text):
+    pdf.write_runs(text)
+    right = pdf.w - pdf.r_margin
+    assert pdf.cells
+    assert all(x + width <= right + 0.01 for x, width, _ in pdf.cells)
+    assert all(x >= pdf.l_margin - 0.01 for x, _, _ in pdf.cells)
+
+
+def test_hard_breaks_keep_every_character(pdf):
+    pdf.write_runs("x" * 400)
+    assert "".join(text for _, _, text in pdf.cells) == "x" * 400
+
+
+def test_short_words_wrap_between_words(pdf):
+    pdf.write_runs("word " * 100)
+    assert all(not text.startswith(" ") for _, _, text in pdf.cells)
+    assert len(pdf.cells) > 1
+
+
+def test_tokenizer_blocks():
+    blocks = list(tokenize_markdown(["# Title", "", "Text", "- item", "```", "code", "```", "---"]))
+    assert [block.kind for block in blocks] == ["heading", "paragraph", "bullet", "code", "rule"]
+
+
+def test_inline_runs_resolve_markup():
+    assert list(inline_runs("**bold** and `code`")) == [("B", "bold"), ("", " and "), ("code", "code")]
+
+
+def test_render_writes_a_pdf(tmp_path):
+    destination = render_markdown(f"# Resources\n\n- [Guide]({LONG_URL})\n", tmp_path / "out.pdf", "Doc")
+    assert destination.read_bytes().startswith(b"%PDF")
+
+
+def test_threads_rendering_one_destination_do_not_share_a_temp_file(tmp_path):
+    destination = tmp_path / "guide.pdf"
+    markdown = "# Guide\n\n" + "Some text for the page.\n\n" * 10
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(lambda _: render_markdown(markdown, destination, "Guide"), range(4)))
+
+    data = destination.read_bytes()
+    assert data.startswith(b"%PDF") and data.rstrip().endswith(b"%%EOF")
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,13 @@
+from services.metrics import metrics_authorized
+
+
+def test_metrics_are_open_without_a_token():
+    assert metrics_authorized("", token="")
+
+
+def test_metrics_need_the_matching_bearer_token():
+    assert metrics_authorized("Bearer s3cret", token="s3cret")
+    assert metrics_authorized("bearer s3cret", token="s3cret")
+    assert not metrics_authorized("", token="s3cret")
+    assert not metrics_authorized("Bearer wrong", token="s3cret")
+    assert not metrics_authorized("Basic s3cret", token="s3cret")
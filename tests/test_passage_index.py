@@ -0,0 +1,65 @@
+import pytest
+
+pytest.importorskip("numpy")
+from custom_tools.passage_index import PassageIndex, chunk_page, index_pages, parse_query, relevant_pages
+
+
+def docs_page(url: str, sections: dict[str, str]) -> dict:
+    return {"url": url, "raw_content": "\n\n".join(f"## {heading}\n\n{text}" for heading, text in sections.items())}
+
+
+PAGES = [
+    docs_page("https://docs.example.com/install", {
+        "Installation": "Install the package with pip and create a virtual environment first.",
+        "Upgrading": "Upgrade by reinstalling the newest release from the package index.",
+    }),
+    docs_page("https://docs.example.com/auth", {
+        "Authentication": "Tokens are sent in the Authorization header with every request.",
+        "Rotating tokens": "Rotate tokens from the dashboard; old tokens expire after a day.",
+    }),
+]
+
+
+def test_chunk_page_starts_passages_at_headings():
+    passages = chunk_page("u", PAGES[1]["raw_content"], page_index=3)
+    assert [passage.heading for passage in passages] == ["Authentication", "Rotating tokens"]
+    assert [passage.order for passage in passages] == [(3, 0), (3, 1)]
+
+
+def test_chunk_page_splits_oversized_paragraphs():
+    passages = chunk_page("u", " ".join(["word"] * 25), max_words=10)
+    assert [len(passage.text.split()) for passage in passages] == [10, 10, 5]
+
+
+def test_parse_query_pairs_the_topic_with_each_heading():
+    assert parse_query("tokens; Setup; ;Rotation") == ["tokens", "tokens Setup", "tokens Rotation"]
+
+
+def test_search_ranks_matching_passages_first():
+    index = index_pages(PAGES)
+    best = index.search("rotate tokens", k=4)
+    assert index.passages[best[0]].heading == "Rotating tokens"
+    # Passages without any of the query's words are left out
+    assert all(index.passages[i].url.endswith("/auth") for i in best)
+
+
+def test_select_keeps_crawl_order_and_budget():
+    index = index_pages(PAGES)
+    selected = index.select("package; Upgrading; Installation", k=4)
+    assert [passage.order for passage in selected] == sorted(passage.order for passage in selected)
+    assert index.select("package tokens", k=4, token_budget=1) and len(index.select("package tokens", k=4, token_budget=1)) == 1
+
+
+def test_empty_index_scores_nothing():
+    assert PassageIndex([]).search("anything", k=3) == []
+
+
+def test_relevant_pages_cut_content_to_selected_passages():
+    pages = relevant_pages(PAGES, "rotate tokens dashboard", k=1)
+    assert [page["url"] for page in pages] == ["https://docs.example.com/auth"]
+    assert pages[0]["raw_content"].startswith("## Rotating tokens")
+    assert "Authorization header" not in pages[0]["raw_content"]
+
+
+def test_relevant_pages_is_empty_when_nothing_matches():
+    assert relevant_pages(PAGES, "kubernetes helm chart") == []
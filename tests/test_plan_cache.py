@@ -0,0 +1,132 @@
+import json
+import sys
+import time
+import types
+import pytest
+from services import plan_cache as plan_cache_module
+from services.plan_cache import PlanCache, PlanTemplate, normalize_value
+
+TEMPLATE = PlanTemplate(id="docs", task="Write docs about $topic", inputs=(("$topic", "Topic"),))
+
+
+class FakePlan:
+    """Stands in for portia.Plan: a pydantic-style JSON round trip."""
+
+    def __init__(self, id: str, task: str = ""):
+        self.id = id
+        self.task = task
+
+    def model_dump_json(self) -> str:
+        return json.dumps({"id": self.id, "task": self.task})
+
+    @classmethod
+    def model_validate_json(cls, data: str) -> "FakePlan":
+        return cls(**json.loads(data))
+
+
+class FakeStorage:
+    def __init__(self):
+        self.plans = {}
+
+    def get_plan(self, plan_id):
+        return self.plans[plan_id]
+
+    def save_plan(self, plan):
+        self.plans[plan.id] = plan
+
+
+class FakePortia:
+    def __init__(self):
+        self.storage = FakeStorage()
+        self.planned = []
+
+    def plan(self, task, plan_inputs=None):
+        plan = FakePlan(f"plan-{len(self.planned)}", task)
+        self.planned.append(plan)
+        self.storage.save_plan(plan)
+        return plan
+
+
+@pytest.fixture(autouse=True)
+def local_only(monkeypatch):
+    monkeypatch.setattr(plan_cache_module, "get_shared_state", lambda: None)
+    # Persisted plans are parsed with portia.Plan
+    portia = types.ModuleType("portia")
+    portia.Plan = FakePlan
+    portia.PlanInput = lambda **fields: fields
+    monkeypatch.setitem(sys.modules, "portia", portia)
+
+
+def test_keys_ignore_case_whitespace_and_shape_order():
+    key = PlanCache.make_key(TEMPLATE, {"has_urls": True, "style": "  Formal   Tone "})
+    assert key == PlanCache.make_key(TEMPLATE, {"style": "formal tone", "has_urls": True})
+    assert key != PlanCache.make_key(TEMPLATE, {"style": "formal tone", "has_urls": False})
+    edited = PlanTemplate(id="docs", task="Write short docs about $topic", inputs=TEMPLATE.inputs)
+    assert PlanCache.make_key(edited, {"style": "formal tone", "has_urls": True}) != key
+
+
+def test_normalize_value():
+    assert normalize_value("  React\tHooks\n") == "react hooks"
+    assert normalize_value(["A  B", ("C",)]) == ["a b", ["c"]]
+    assert normalize_value(3) == 3
+
+
+def test_run_inputs_carry_the_values():
+    assert TEMPLATE.run_inputs({"$topic": "React"}) == [{"name": "$topic", "description": "Topic", "value": "React"}]
+
+
+def test_least_recently_used_plans_are_evicted():
+    cache = PlanCache(max_size=2, ttl_seconds=60)
+    for key in ("a", "b"):
+        cache.put(key, FakePlan(key))
+    cache.get("a")
+    cache.put("c", FakePlan("c"))
+
+    assert cache.get("b") is None
+    assert cache.get("a").id == "a" and cache.get("c").id == "c"
+    assert cache.stats()["evictions"] == 1 and cache.stats()["size"] == 2
+
+
+def test_expired_plans_are_dropped():
+    cache = PlanCache(ttl_seconds=60)
+    cache.put("old", FakePlan("old"), created_at=time.time() - 120)
+    cache.put("new", FakePlan("new"))
+    assert cache.get("old") is None
+    assert cache.get("new").id == "new"
+    assert cache.stats()["size"] == 1
+
+
+def test_plans_persist_across_instances(tmp_path):
+    path = tmp_path / "plans.json"
+    cache = PlanCache(ttl_seconds=60, path=str(path))
+    cache.put("fresh", FakePlan("fresh", "Write docs"))
+    cache.put("stale", FakePlan("stale"), created_at=time.time() - 120)
+
+    reloaded = PlanCache(ttl_seconds=60, path=str(path))
+    plan = reloaded.get("fresh")
+    assert (plan.id, plan.task) == ("fresh", "Write docs")
+    assert reloaded.get("stale") is None
+    assert list(tmp_path.glob("*.tmp")) == []
+
+
+def test_unreadable_persisted_plans_are_ignored(tmp_path):
+    path = tmp_path / "plans.json"
+    path.write_text("{not json", encoding="utf-8")
+    cache = PlanCache(ttl_seconds=60, path=str(path))
+    assert cache.get("anything") is None
+    cache.put("a", FakePlan("a"))
+    assert json.loads(path.read_text(encoding="utf-8")).keys() == {"a"}
+
+
+def test_hits_and_misses_are_counted():
+    cache = PlanCache(ttl_seconds=60)
+    planner, runner = FakePortia(), FakePortia()
+    first = cache.get_or_plan(planner, TEMPLATE, {"has_urls": True})
+    second = cache.get_or_plan(runner, TEMPLATE, {"has_urls": True})
+
+    assert second is first and len(planner.planned) == 1 and runner.planned == []
+    # The cached plan is saved to the storage of the Portia instance that runs it
+    assert runner.storage.get_plan(first.id) is first
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 0.5)
+    assert stats["estimated_seconds_saved"] == stats["avg_planning_seconds"]
@@ -0,0 +1,57 @@
+import os
+import threading
+from services.portia_factory import DEFAULT_TOOLS, PortiaFactory
+
+
+def slow_factory():
+    factory = PortiaFactory(ttl_seconds=3600)
+    started, release = threading.Event(), threading.Event()
+    builds = []
+
+    def build():
+        builds.append(1)
+        started.set()
+        release.wait(5)
+        return {DEFAULT_TOOLS: "registry"}
+
+    factory._build_registries = build
+    return factory, started, release, builds
+
+
+def test_stats_does_not_wait_for_the_first_build():
+    factory, started, release, _ = slow_factory()
+    thread = threading.Thread(target=factory.get_registry)
+    thread.start()
+    assert started.wait(5)
+
+    result = []
+    reader = threading.Thread(target=lambda: result.append(factory.stats()))
+    reader.start()
+    reader.join(1)
+    release.set()
+    thread.join(5)
+    assert result and result[0]["registry_age_seconds"] is None
+
+
+def test_concurrent_first_use_builds_once():
+    factory, started, release, builds = slow_factory()
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(factory.get_registry())) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    assert started.wait(5)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert results == ["registry"] * 4
+    assert len(builds) == 1
+
+
+def test_user_keys_stay_out_of_the_environment(monkeypatch):
+    from services.document_service import DocumentService
+    from services.portia_client import PortiaClient
+
+    monkeypatch.delenv("OPENAI_API_KEY", raising=False)
+    PortiaClient("sk-alice", "alice")
+    DocumentService("sk-bob", "bob")
+    assert "OPENAI_API_KEY" not in os.environ
@@ -0,0 +1,49 @@
+import os
+import subprocess
+import sys
+import pytest
+from services.job_store import JobStore
+from services.shared_state import SharedState, owner_alive, process_token
+
+pytestmark = pytest.mark.skipif(process_token(os.getpid()) is None, reason="needs /proc")
+
+
+@pytest.fixture
+def other_process():
+    process = subprocess.Popen([sys.executable, "-c", "import time; time.sleep(30)"])
+    yield process.pid
+    process.kill()
+    process.wait()
+
+
+def test_owner_alive(other_process):
+    assert owner_alive(other_process, process_token(other_process))
+    # Same pid, different start: a later process was given the dead owner's pid
+    assert not owner_alive(other_process, "boot:1")
+    assert owner_alive(os.getpid(), process_token(os.getpid()))
+    assert not owner_alive(os.getpid(), None)
+
+
+def test_interrupted_jobs_of_reused_pids_are_failed(tmp_path, other_process):
+    store = JobStore(str(tmp_path / "jobs.sqlite3"))
+    ours = store.create("alice", "test", {})["id"]
+    live = store.create("alice", "test", {})["id"]
+    reused = store.create("alice", "test", {})["id"]
+    store._conn.execute("UPDATE jobs SET owner_pid = ?, owner_token = ? WHERE id = ?",
+                        (other_process, process_token(other_process), live))
+    store._conn.execute("UPDATE jobs SET owner_pid = ?, owner_token = 'boot:1' WHERE id = ?", (other_process, reused))
+
+    assert store.fail_interrupted() == 1
+    assert [store.get(job)["status"] for job in (ours, live, reused)] == ["queued", "queued", "failed"]
+
+
+def test_leases_of_reused_pids_are_reclaimed(tmp_path, other_process):
+    state = SharedState(str(tmp_path / "state.sqlite3"))
+    for lease_id, token in (("live", process_token(other_process)), ("reused", "boot:1")):
+        state._conn.execute(
+            "INSERT INTO leases (id, kind, user_id, pid, created_at, token) VALUES (?, 'run', 'alice', ?, 0, ?)",
+            (lease_id, other_process, token),
+        )
+    assert state.acquire_lease("run", "bob", None, None) is not None
+    ids = {lease_id for (lease_id,) in state._conn.execute("SELECT id FROM leases")}
+    assert "live" in ids and "reused" not in ids
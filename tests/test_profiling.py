@@ -0,0 +1,90 @@
+import asyncio
+import os
+import time
+import httpx
+import pytest
+from fastapi import FastAPI
+from services import profiling as profiling_module
+from services.profiling import Profiler, ProfilingMiddleware
+
+
+def busy(seconds: float) -> int:
+    total, deadline = 0, time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(200))
+    return total
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    profiler = Profiler(directory=str(tmp_path / "profiles"), max_profiles=10, token="secret")
+    monkeypatch.setattr(profiling_module, "profiler", profiler)
+    return profiler
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.add_middleware(ProfilingMiddleware)
+
+    @app.get("/api/work")
+    async def work(seconds: float = 0.1):
+        busy(seconds)
+        return {"ok": True}
+
+    @app.get("/api/wait")
+    async def wait(seconds: float = 0.2):
+        await asyncio.sleep(seconds)
+        return {"ok": True}
+
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+
+def test_requests_with_the_token_are_profiled(profiler, client):
+    async def scenario():
+        async with client:
+            profiled = await client.get("/api/work", headers={"X-Profile-Token": "secret"})
+            wrong = await client.get("/api/work", headers={"X-Profile-Token": "guess"})
+            plain = await client.get("/api/work")
+        return profiled, wrong, plain
+
+    profiled, wrong, plain = asyncio.run(scenario())
+    profile_id = profiled.headers["x-profile-id"]
+    assert "x-profile-id" not in wrong.headers and "x-profile-id" not in plain.headers
+    names = sorted(path.name for path in profiler.directory.iterdir())
+    # CPU samples need per-thread CPU clocks, which not every platform has
+    assert {"prof", "wall.folded"} <= {name.split(".", 1)[1] for name in names}
+    assert all(profile_id in name and "api_work" in name for name in names)
+    assert profiler.stats()["captured"] == 1
+    assert "busy" in (profiler.directory / next(name for name in names if name.endswith("wall.folded"))).read_text()
+
+
+def test_concurrent_requests_are_skipped_while_one_is_profiled(profiler, client):
+    async def scenario():
+        async with client:
+            headers = {"X-Profile-Token": "secret"}
+            first = asyncio.create_task(client.get("/api/wait", headers=headers))
+            await asyncio.sleep(0.05)
+            second = await client.get("/api/wait", params={"seconds": 0}, headers=headers)
+            return await first, second
+
+    first, second = asyncio.run(scenario())
+    assert "x-profile-id" in first.headers and "x-profile-id" not in second.headers
+    stats = profiler.stats()
+    assert (stats["captured"], stats["skipped_busy"]) == (1, 1)
+
+
+def test_prune_keeps_the_newest_profiles(tmp_path):
+    profiler = Profiler(directory=str(tmp_path), max_profiles=2)
+    now = time.time()
+    for age in range(5):
+        for suffix in (".prof", ".wall.folded"):
+            path = tmp_path / f"20260101T00000{age}Z-api_work-id{age}{suffix}"
+            path.write_text("x")
+            os.utime(path, (now - age * 60, now - age * 60))
+
+    profiler._prune()
+    assert sorted(path.name for path in tmp_path.iterdir()) == [
+        "20260101T000000Z-api_work-id0.prof", "20260101T000000Z-api_work-id0.wall.folded",
+        "20260101T000001Z-api_work-id1.prof", "20260101T000001Z-api_work-id1.wall.folded",
+    ]
@@ -0,0 +1,102 @@
+import asyncio
+import json
+import pytest
+from services import admission as admission_module
+from services import progress as progress_module
+from services.admission import AdmissionController
+from services.executor import ClientDisconnectedError, QueueFullError
+from services.progress import ProgressChannel
+
+
+def parse(frame: str) -> tuple[str, dict]:
+    event, data = frame.strip().split("\n")
+    return event.removeprefix("event: "), json.loads(data.removeprefix("data: "))
+
+
+async def collect(channel: ProgressChannel, job) -> list[tuple[str, dict]]:
+    return [parse(frame) async for frame in channel.stream(job, lambda result: {"result": result})]
+
+
+def test_events_arrive_in_order_and_completed_is_last():
+    async def scenario():
+        channel = ProgressChannel()
+
+        async def job():
+            # Hooks emit from the worker thread running the plan
+            await asyncio.to_thread(channel.emit, "plan_created", plan_id="p1", steps=["Search", "Write"])
+            await asyncio.sleep(0.01)
+            await asyncio.to_thread(channel.emit, "step_started", index=0, task="Search", tool="search")
+            channel.emit("step_finished", index=0, output="found")
+            return "done"
+
+        return await collect(channel, job())
+
+    frames = asyncio.run(scenario())
+    assert [event for event, _ in frames] == ["accepted", "plan_created", "step_started", "step_finished", "completed"]
+    assert frames[1][1] == {"plan_id": "p1", "steps": ["Search", "Write"]}
+    assert frames[-1] == ("completed", {"result": "done"})
+
+
+def test_idle_streams_get_keepalives(monkeypatch):
+    monkeypatch.setattr(progress_module, "SSE_KEEPALIVE_SECONDS", 0.01)
+
+    async def scenario():
+        channel = ProgressChannel()
+
+        async def job():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        return [frame async for frame in channel.stream(job(), lambda result: {"result": result})]
+
+    frames = asyncio.run(scenario())
+    assert ": keepalive\n\n" in frames
+    assert parse(frames[-1]) == ("completed", {"result": "done"})
+
+
+@pytest.mark.parametrize(("error", "status"), [(QueueFullError("pool full"), 503), (RuntimeError("boom"), 500)])
+def test_failed_jobs_end_with_an_error_frame(error, status):
+    async def scenario():
+        channel = ProgressChannel()
+
+        async def job():
+            channel.emit("step_started", index=0, task="Search", tool="search")
+            raise error
+
+        return await collect(channel, job())
+
+    frames = asyncio.run(scenario())
+    assert [event for event, _ in frames] == ["accepted", "step_started", "error"]
+    assert frames[-1][1] == {"status": status, "detail": str(error)}
+
+
+def test_closing_the_stream_cancels_the_job_and_frees_the_slot(monkeypatch):
+    monkeypatch.setattr(admission_module, "get_shared_state", lambda: None)
+    controller = AdmissionController(global_limit=1, per_user_limit=1)
+    cancelled = []
+
+    async def scenario():
+        channel = ProgressChannel()
+        ticket = await controller.acquire("alice")
+
+        async def job():
+            try:
+                await asyncio.sleep(30)
+            except asyncio.CancelledError:
+                cancelled.append(True)
+                raise
+
+        stream = channel.stream(controller.hold(ticket, job()), lambda result: {})
+        assert parse(await stream.__anext__())[0] == "accepted"
+        await asyncio.sleep(0.01)
+        assert controller.stats()["active"] == 1
+        # The client disconnected: the server closes the response generator
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        with pytest.raises(ClientDisconnectedError):
+            channel._check_open()
+        return controller.stats()
+
+    stats = asyncio.run(scenario())
+    assert cancelled == [True]
+    assert stats["active"] == 0
@@ -0,0 +1,50 @@
+import asyncio
+import pytest
+from services import rate_limiter as rate_limiter_module
+from services.rate_limiter import RateLimiter, TokenBucket
+from services.shared_state import SharedState
+
+
+def test_bucket_allows_a_burst_then_paces():
+    bucket = TokenBucket(rate_per_second=10, capacity=3)
+    waits = [bucket._reserve() for _ in range(5)]
+    assert waits[:3] == [0.0, 0.0, 0.0]
+    assert waits[3] == pytest.approx(0.1, abs=0.01)
+    assert waits[4] == pytest.approx(0.2, abs=0.01)
+
+
+@pytest.mark.parametrize("mode", ["local", "shared"])
+def test_limiter_paces_per_key(mode, tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3")) if mode == "shared" else None
+    monkeypatch.setattr(rate_limiter_module, "get_shared_state", lambda: shared)
+    limiter = RateLimiter("test", rate_per_second=50, capacity=2)
+
+    async def scenario():
+        alice = [await limiter.acquire("alice") for _ in range(3)]
+        bob = await limiter.acquire("bob")
+        return alice, bob
+
+    alice, bob = asyncio.run(scenario())
+    assert alice[:2] == [0.0, 0.0] and alice[2] > 0
+    assert bob == 0.0
+    stats = limiter.stats()
+    assert stats["acquired"] == 4 and stats["delayed"] == 1
+
+
+def test_shared_buckets_span_limiters(tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(rate_limiter_module, "get_shared_state", lambda: shared)
+    first, second = RateLimiter("test", 50, 1), RateLimiter("test", 50, 1)
+
+    async def scenario():
+        return await first.acquire("alice"), await second.acquire("alice")
+
+    assert asyncio.run(scenario())[1] > 0
+
+
+def test_limiter_keeps_at_most_max_buckets(monkeypatch):
+    monkeypatch.setattr(rate_limiter_module, "get_shared_state", lambda: None)
+    limiter = RateLimiter("test", 10, 1, max_buckets=2)
+    for key in ("a", "b", "c"):
+        limiter.bucket(key)
+    assert limiter.stats()["buckets"] == 2
@@ -0,0 +1,70 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import pytest
+from services import render_service as render_module
+from services.render_service import RenderService, _render_html
+
+pytest.importorskip("markdown")
+MARKDOWN = "# Guide\n\nSome **bold** text.\n\n```python\nprint('hi')\n```\n"
+
+
+class InlineExecutor:
+    """Runs render jobs in this process after a short delay, counting them."""
+
+    def __init__(self):
+        self.calls = 0
+
+    async def submit(self, fn, *args, is_disconnected=None):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return await asyncio.to_thread(fn, *args)
+
+
+@pytest.fixture
+def executor(monkeypatch):
+    executor = InlineExecutor()
+    monkeypatch.setattr(render_module, "get_executor", lambda name, kind=None: executor)
+    return executor
+
+
+def write_markdown(directory, name="react_guide.markdown"):
+    directory.mkdir(parents=True, exist_ok=True)
+    path = directory / name
+    path.write_text(MARKDOWN, encoding="utf-8")
+    return str(path)
+
+
+def test_repeat_renders_are_served_from_the_cache(tmp_path, executor):
+    service = RenderService(cache_dir=str(tmp_path / "cache"))
+    first = asyncio.run(service.render(write_markdown(tmp_path / "alice"), "html"))
+    second = asyncio.run(service.render(write_markdown(tmp_path / "bob"), "html"))
+
+    assert executor.calls == 1
+    assert (service.hits, service.misses) == (1, 1)
+    assert first.endswith("alice/react_guide.html") and second.endswith("bob/react_guide.html")
+    assert open(first, encoding="utf-8").read() == open(second, encoding="utf-8").read()
+
+
+def test_concurrent_renders_of_one_document_are_coalesced(tmp_path, executor):
+    service = RenderService(cache_dir=str(tmp_path / "cache"))
+    sources = [write_markdown(tmp_path / user) for user in ("alice", "bob", "carol")]
+
+    async def scenario():
+        return await asyncio.gather(*(service.render(source, "html") for source in sources))
+
+    outputs = asyncio.run(scenario())
+    assert executor.calls == 1
+    assert service.stats() == {"hits": 0, "misses": 1, "coalesced": 2, "failures": 0, "inflight": 0}
+    assert all("<strong>bold</strong>" in open(output, encoding="utf-8").read() for output in outputs)
+
+
+def test_threads_rendering_one_destination_do_not_share_a_temp_file(tmp_path):
+    source = tmp_path / "guide.markdown"
+    source.write_text(MARKDOWN * 20, encoding="utf-8")
+    destination = tmp_path / "guide.html"
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(lambda _: _render_html(source, destination, "Guide"), range(16)))
+
+    page = destination.read_text(encoding="utf-8")
+    assert page.startswith("<!DOCTYPE html>") and page.rstrip().endswith("</html>")
+    assert list(tmp_path.glob("*.tmp")) == []
@@ -0,0 +1,6 @@
+from services.shared_state import available_cpus, worker_count
+
+
+def test_worker_count_defaults_to_the_available_cores():
+    assert worker_count("auto") == worker_count(" AUTO ") == available_cpus() >= 1
+    assert worker_count("3") == 3
@@ -0,0 +1,67 @@
+import pytest
+from services.email_writer import EMAIL_BODY_SIMILARITY_THRESHOLD
+from services.similarity_cache import SimilarityCache, normalize_text
+
+
+@pytest.fixture
+def cache():
+    # The threshold the email writer runs with
+    return SimilarityCache(threshold=EMAIL_BODY_SIMILARITY_THRESHOLD, max_size=100, ttl_seconds=60)
+
+
+@pytest.mark.parametrize(
+    ("stored", "asked"),
+    [
+        ("Your application was approved", "Your application was not approved"),
+        ("Your application was approved", "Your loan application was approved"),
+        ("Your application was approved", "Your application was unapproved"),
+        ("We can attend the meeting", "We can't attend the meeting"),
+        ("Invoice 1042 is due", "Invoice 1043 is due"),
+        ("Meeting on Monday", "Meeting on Tuesday"),
+    ],
+)
+def test_different_meanings_are_not_reused(cache, stored, asked):
+    cache.put(stored, "body")
+    assert cache.get(asked) is None
+
+
+@pytest.mark.parametrize(
+    ("stored", "asked"),
+    [
+        ("Quarterly review meeting tomorrow", "Re: quarterly review meeting tomorrow!"),
+        ("Quarterly review meeting tomorrow", "Quarterly review meeting tomorow"),
+        ("Welcome to the engineering team", "Welcome to our engineering team"),
+    ],
+)
+def test_near_identical_subjects_are_reused(cache, stored, asked):
+    cache.put(stored, "body")
+    hit = cache.get(asked)
+    assert hit is not None and hit[0] == "body"
+
+
+def test_exact_hits_after_normalization(cache):
+    cache.put("Team Lunch", "body")
+    assert cache.get("  team lunch ") == ("body", 1.0)
+
+
+def test_namespaces_are_separate(cache):
+    cache.put("Team lunch on Friday", "alice's body", namespace="alice")
+    assert cache.get("Team lunch on Friday", namespace="bob") is None
+
+
+def test_expired_entries_are_not_returned():
+    cache = SimilarityCache(threshold=0.65, max_size=100, ttl_seconds=-1)
+    cache.put("Team lunch", "body")
+    assert cache.get("Team lunch") is None
+
+
+def test_least_recently_used_are_evicted():
+    cache = SimilarityCache(threshold=0.65, max_size=2, ttl_seconds=60)
+    for subject in ("alpha launch", "bravo launch", "charlie launch"):
+        cache.put(subject, subject)
+    assert cache.get("alpha launch") is None
+    assert cache.stats()["size"] == 2
+
+
+def test_normalize_text():
+    assert normalize_text("RE: Fwd: Hello — World!!") == "hello world"
@@ -0,0 +1,70 @@
+import time
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from routes import auth_routes
+from services import auth_service as auth_module
+from services import token_cache as token_cache_module
+from services.auth_service import AuthService
+from services.shared_state import SharedState
+from services.token_cache import TokenCache, token_digest
+
+CLAIMS = {"openai_api_key": "sk-test", "user_id": "alice"}
+
+
+@pytest.fixture
+def auth(monkeypatch):
+    """AuthService with a fresh token cache and no shared state."""
+    cache = TokenCache(max_size=10)
+    monkeypatch.setattr(auth_module, "SECRET_KEY", "test-secret")
+    monkeypatch.setattr(auth_module, "token_cache", cache)
+    monkeypatch.setattr(token_cache_module, "get_shared_state", lambda: None)
+    return cache
+
+
+def test_claims_expire_at_exp():
+    cache = TokenCache()
+    cache.put("live", CLAIMS, time.time() + 60)
+    cache.put("expired", CLAIMS, time.time() - 1)
+    assert cache.get("live") == CLAIMS
+    assert cache.get("expired") is None
+    assert cache.stats()["size"] == 1 and (cache.hits, cache.misses) == (1, 1)
+
+
+def test_cache_keeps_the_most_recently_used_tokens():
+    cache = TokenCache(max_size=2)
+    exp = time.time() + 60
+    cache.put("a", CLAIMS, exp)
+    cache.put("b", CLAIMS, exp)
+    cache.get("a")
+    cache.put("c", CLAIMS, exp)
+    assert cache.get("b") is None
+    assert cache.get("a") == CLAIMS and cache.get("c") == CLAIMS
+    assert cache.stats()["size"] == 2
+
+
+def test_logout_revokes_the_token(auth):
+    app = FastAPI()
+    app.include_router(auth_routes.router, prefix="/auth")
+    token = AuthService.create_access_token(CLAIMS)
+    assert AuthService.verify_token(token) == CLAIMS
+    assert auth.get(token_digest(token)) == CLAIMS
+
+    response = TestClient(app).post("/auth/logout", headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    assert AuthService.verify_token(token) is None
+    assert auth.stats()["revoked"] == 1
+
+
+def test_revocation_reaches_other_workers(auth, tmp_path, monkeypatch):
+    shared = SharedState(str(tmp_path / "state.sqlite3"))
+    monkeypatch.setattr(token_cache_module, "get_shared_state", lambda: shared)
+    token = AuthService.create_access_token(CLAIMS)
+    # Another worker has already verified and cached the token
+    other_worker = TokenCache()
+    other_worker.put(token_digest(token), CLAIMS, time.time() + 60)
+
+    assert AuthService.revoke_token(token)
+    monkeypatch.setattr(auth_module, "token_cache", other_worker)
+    assert AuthService.verify_token(token) is None
+    assert not AuthService.revoke_token("not-a-token")
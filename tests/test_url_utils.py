@@ -0,0 +1,22 @@
+import pytest
+from custom_tools.url_utils import canonicalize_url
+
+
+@pytest.mark.parametrize(
+    ("url", "canonical"),
+    [
+        ("HTTPS://Docs.Example.com/Guide", "https://docs.example.com/Guide"),
+        ("https://docs.example.com:443/a", "https://docs.example.com/a"),
+        ("http://docs.example.com:8080/a", "http://docs.example.com:8080/a"),
+        ("https://docs.example.com/a#section", "https://docs.example.com/a"),
+        ("https://docs.example.com/a?b=2&a=1", "https://docs.example.com/a?a=1&b=2"),
+        ("https://docs.example.com", "https://docs.example.com/"),
+        ("  docs.example.com/a ", "https://docs.example.com/a"),
+    ],
+)
+def test_canonical_forms(url, canonical):
+    assert canonicalize_url(url) == canonical
+
+
+def test_paths_keep_their_case_and_trailing_slash():
+    assert canonicalize_url("https://example.com/A/") != canonicalize_url("https://example.com/a")
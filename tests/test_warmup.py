@@ -0,0 +1,76 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+import main
+from services import warmup as warmup_module
+from services.warmup import Warmup
+
+STEPS = {"imports", "http_clients", "plan_cache", "tool_registries"}
+
+
+@pytest.fixture
+def steps(monkeypatch):
+    """Replace the heavy warm-up work with fast stand-ins; returns the calls made."""
+    calls = []
+
+    async def start_clients():
+        calls.append("http_clients")
+
+    monkeypatch.setattr(warmup_module, "WARMUP_ENABLED", True)
+    monkeypatch.setattr(warmup_module.http_clients, "start", start_clients)
+    monkeypatch.setattr(warmup_module.plan_cache, "load", lambda: calls.append("plan_cache"))
+    monkeypatch.setattr(warmup_module.portia_factory, "get_registry", lambda tools: calls.append("tool_registries"))
+    return calls
+
+
+def test_warmup_records_each_step(steps):
+    warmup = Warmup(modules=("json", "email.message"))
+
+    async def scenario():
+        warmup.start()
+        await warmup._task
+        await warmup.stop()
+
+    asyncio.run(scenario())
+    stats = warmup.stats()
+    assert steps == ["http_clients", "plan_cache", "tool_registries"]
+    assert stats["state"] == "done" and stats["errors"] == {}
+    assert set(stats["step_seconds"]) == STEPS and all(seconds >= 0 for seconds in stats["step_seconds"].values())
+    assert set(stats["import_seconds"]) == {"json", "email.message"}
+    assert stats["total_seconds"] >= sum(stats["step_seconds"].values())
+
+
+def test_failed_steps_are_recorded_and_startup_continues(steps, monkeypatch):
+    def broken_registry(tools):
+        raise RuntimeError("registry unavailable")
+
+    class Sweeper:
+        async def start(self):
+            pass
+
+        async def stop(self):
+            pass
+
+        def stats(self):
+            return {}
+
+    monkeypatch.setattr(warmup_module.portia_factory, "get_registry", broken_registry)
+    warmup = Warmup(modules=("json", "no_such_module_for_warmup"))
+    monkeypatch.setattr(main, "warmup", warmup)
+    monkeypatch.setattr(main, "recover_jobs", lambda: None)
+    sweeper = Sweeper()
+    monkeypatch.setattr(main, "get_docs_sweeper", lambda: sweeper)
+
+    async def finished():
+        await warmup._task
+
+    with TestClient(main.app) as client:
+        assert client.get("/health").status_code == 200
+        client.portal.call(finished)
+        health = client.get("/health").json()
+
+    stats = health["warmup"]
+    assert health["status"] == "healthy" and stats["state"] == "failed"
+    assert stats["errors"]["tool_registries"] == "registry unavailable"
+    assert "no_such_module_for_warmup" in stats["errors"]
+    assert set(stats["step_seconds"]) == STEPS